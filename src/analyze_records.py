@@ -0,0 +1,332 @@
+# src/analyze_records.py
+# 棋譜ファイル（game_record.py の形式）をプロセスプールでまとめて集計する
+# 使い方: python analyze_records.py ../records/games.usr
+#         python analyze_records.py --synthetic 1000000   （合成した100万局の棋譜で処理速度を測る）
+
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from settings import UNIVERSITY_DATA, DB_PATH, RECORDS_PATH
+from rules import Board, CAPTURED, SNAPSHOT_HEADER, load_piece_definitions
+from bitboard import NUM_SQUARES
+from game_record import RecordWriter, iter_records, record_files, NO_MOVE, RESULTS
+from text_format import pad_text
+
+try:
+    import numpy as np
+except ImportError:  # NumPy がなければ1局ずつPythonで再生する（結果は同じ）
+    np = None
+
+RESULT_NAMES = tuple(name or "不明" for name in RESULTS)
+BATCH_SIZE = 4096  # NumPy でまとめて再生する対局数（配列の大きさは 対局数 x 最長の手数）
+
+_letters = None       # 駒の文字の一覧（集計の列の並び）
+_letter_index = None  # 文字 -> 列番号
+_orders = {}          # (player1の大学, player2の大学) -> (駒IDごとの文字の列番号, 駒IDごとのチーム)
+
+
+def _init_worker(db_path):
+    """ワーカーごとに一度だけ駒の定義を読み込む"""
+    global _letters, _letter_index
+    _letters = sorted(load_piece_definitions(db_path))
+    _letter_index = {letter: i for i, letter in enumerate(_letters)}
+
+
+def _pieces_of(record):
+    """棋譜の駒IDごとの (文字の列番号, チーム) を、Game.setup_game と同じ駒編成から求める"""
+    key = (record.p1_university, record.p2_university)
+    if key not in _orders:
+        definitions = dict.fromkeys(_letters, ("", ""))
+        board = Board.from_orders(UNIVERSITY_DATA.get(key[0], []), UNIVERSITY_DATA.get(key[1], []), definitions)
+        _orders[key] = ([_letter_index[p.name] for p in board.pieces], [p.team for p in board.pieces])
+    return _orders[key]
+
+
+def new_summary(letter_count):
+    """集計結果の入れ物"""
+    return {
+        "games": 0,
+        "skipped": 0,  # 駒の数が今の駒編成と合わず、集計できなかった対局
+        "results": dict.fromkeys(RESULT_NAMES, 0),
+        "turns": 0,
+        "third_capture_games": 0,
+        "third_capture_turns": 0,
+        "appearances": [0] * letter_count,   # 文字ごとの、対局に出てきた駒の数
+        "captures_made": [0] * letter_count,  # 文字ごとの、相手の駒を取った回数
+        "captured": [0] * letter_count,       # 文字ごとの、取られた回数
+    }
+
+
+def merge_summary(total, part):
+    for key in ("games", "skipped", "turns", "third_capture_games", "third_capture_turns"):
+        total[key] += part[key]
+    for key, value in part["results"].items():
+        total["results"][key] += value
+    for key in ("appearances", "captures_made", "captured"):
+        total[key] = [a + b for a, b in zip(total[key], part[key])]
+
+
+def _replay(record, letters, teams, summary):
+    """1局を頭から再生して集計に加える（同期の印がある棋譜や、NumPy がないとき用）"""
+    snapshot = record.snapshot_at(0)
+    _turn, captures_p1, captures_p2, turn_count = SNAPSHOT_HEADER.unpack_from(snapshot)
+    squares = list(snapshot[SNAPSHOT_HEADER.size:])
+    captures = [captures_p1, captures_p2]
+    third_capture = None
+    resync = False
+    for index in range(record.entry_count):
+        if index % record.interval == 0 and resync:
+            # 同期の印のあとは、次のグループの局面からやり直す
+            snapshot = record.snapshot_at(index // record.interval)
+            _turn, captures[0], captures[1], turn_count = SNAPSHOT_HEADER.unpack_from(snapshot)
+            squares = list(snapshot[SNAPSHOT_HEADER.size:])
+            resync = False
+        piece_id, to_sq = record.entry(index)
+        if piece_id == NO_MOVE:
+            resync = True
+            continue
+        turn_count += 1
+        if to_sq in squares:
+            victim = squares.index(to_sq)
+            squares[victim] = CAPTURED
+            team = teams[piece_id]
+            summary["captures_made"][letters[piece_id]] += 1
+            summary["captured"][letters[victim]] += 1
+            captures[team] += 1
+            if captures[team] == 3 and third_capture is None:
+                third_capture = turn_count
+        squares[piece_id] = to_sq
+    summary["turns"] += turn_count
+    if third_capture is not None:
+        summary["third_capture_games"] += 1
+        summary["third_capture_turns"] += third_capture
+
+
+def _replay_batch(games, summary):
+    """同期の印のない棋譜をまとめて、全局を同時に1手ずつ進めて集計する（NumPy）。
+    games は (文字の列番号, チーム, 最初の局面, 手の配列) のリスト"""
+    games.sort(key=lambda game: len(game[3]), reverse=True)  # 長い対局から並べ、t手目まで続く対局を先頭k局にする
+    count = len(games)
+    max_pieces = max(len(game[0]) for game in games)
+    lengths = np.array([len(game[3]) for game in games])
+    letters = np.full((count, max_pieces), -1, dtype=np.intp)
+    teams = np.zeros((count, max_pieces), dtype=np.intp)
+    pos = np.full((count, max_pieces), NUM_SQUARES, dtype=np.intp)  # 盤外の駒は NUM_SQUARES 列（捨て場）に置く
+    moves = np.zeros((count, lengths[0], 2), dtype=np.intp)
+    captures = np.zeros((count, 2), dtype=np.intp)
+    base_turns = np.zeros(count, dtype=np.intp)
+    for g, (game_letters, game_teams, snapshot, game_moves) in enumerate(games):
+        pieces = len(game_letters)
+        letters[g, :pieces] = game_letters
+        teams[g, :pieces] = game_teams
+        _turn, captures[g, 0], captures[g, 1], base_turns[g] = SNAPSHOT_HEADER.unpack_from(snapshot)
+        squares = np.frombuffer(snapshot, dtype=np.uint8, offset=SNAPSHOT_HEADER.size).astype(np.intp)
+        pos[g, :pieces] = np.where(squares == CAPTURED, NUM_SQUARES, squares)
+        moves[g, :len(game_moves)] = game_moves
+
+    board = np.full((count, NUM_SQUARES + 1), -1, dtype=np.intp)  # マス -> 駒ID
+    rows = np.arange(count)
+    for piece_id in range(max_pieces):
+        board[rows, pos[:, piece_id]] = np.where(letters[:, piece_id] >= 0, piece_id, -1)
+    board[:, NUM_SQUARES] = -1
+    third_capture = np.full(count, -1, dtype=np.intp)
+    attackers, victims = [], []
+    active = count
+    for t in range(lengths[0]):
+        while lengths[active - 1] <= t:
+            active -= 1
+        rows = np.arange(active)
+        piece = moves[:active, t, 0]
+        dest = moves[:active, t, 1]
+        victim = board[rows, dest]
+        hit = np.nonzero(victim >= 0)[0]
+        if hit.size:
+            attacker = piece[hit]
+            attackers.append(letters[hit, attacker])
+            victims.append(letters[hit, victim[hit]])
+            team = teams[hit, attacker]
+            pos[hit, victim[hit]] = NUM_SQUARES
+            captures[hit, team] += 1
+            reached = hit[(captures[hit, team] == 3) & (third_capture[hit] < 0)]
+            third_capture[reached] = base_turns[reached] + t + 1
+        board[rows, pos[rows, piece]] = -1
+        board[rows, dest] = piece
+        pos[rows, piece] = dest
+
+    letter_count = len(summary["captures_made"])
+    if attackers:
+        made = np.bincount(np.concatenate(attackers), minlength=letter_count)
+        lost = np.bincount(np.concatenate(victims), minlength=letter_count)
+        summary["captures_made"] = [a + int(b) for a, b in zip(summary["captures_made"], made)]
+        summary["captured"] = [a + int(b) for a, b in zip(summary["captured"], lost)]
+    summary["turns"] += int((base_turns + lengths).sum())
+    reached = third_capture >= 0
+    summary["third_capture_games"] += int(reached.sum())
+    summary["third_capture_turns"] += int(third_capture[reached].sum())
+
+
+def analyze_range(task):
+    """棋譜ファイルの start から end までの対局を集計する（プロセスプールの1タスク）"""
+    path, start, end, use_numpy = task
+    summary = new_summary(len(_letters))
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        batch = []
+        for record in iter_records(data, start, end):
+            letters, teams = _pieces_of(record)
+            if record.piece_count != len(letters):
+                summary["skipped"] += 1
+                continue
+            summary["games"] += 1
+            summary["results"][RESULT_NAMES[RESULTS.index(record.result)]] += 1
+            for letter in letters:
+                summary["appearances"][letter] += 1
+            if use_numpy:
+                entries = np.frombuffer(record.entry_bytes(), dtype=np.uint8).reshape(-1, 2)
+                if not (entries[:, 0] == NO_MOVE).any():
+                    batch.append((letters, teams, record.snapshot_at(0), entries))
+                    if len(batch) >= BATCH_SIZE:
+                        _replay_batch(batch, summary)
+                        batch = []
+                    continue
+            _replay(record, letters, teams, summary)
+        if batch:
+            _replay_batch(batch, summary)
+    finally:
+        data.close()
+    return summary
+
+
+def make_tasks(path, games_per_task):
+    """ファイルを、対局の切れ目で games_per_task 局ずつの範囲に分ける（ヘッダーをたどるだけで中身は読まない）"""
+    tasks = []
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        start = end = 0
+        for i, record in enumerate(iter_records(data), 1):
+            end = record.offset + record.byte_size()
+            if i % games_per_task == 0:
+                tasks.append((start, end))
+                start = end
+        if end > start:
+            tasks.append((start, end))
+    finally:
+        data.close()
+    return tasks
+
+
+def run_analysis(paths, workers=None, games_per_task=20000, use_numpy=None, db_path=DB_PATH):
+    """棋譜ファイルをプロセスプールで集計し、集計結果と処理速度を返す"""
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    start = time.perf_counter()
+    tasks = [(path, begin, end, use_numpy) for path in paths for begin, end in make_tasks(path, games_per_task)]
+    letters = sorted(load_piece_definitions(db_path))
+    total = new_summary(len(letters))
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        for part in pool.imap_unordered(analyze_range, tasks):
+            merge_summary(total, part)
+    elapsed = time.perf_counter() - start
+    definitions = load_piece_definitions(db_path)
+    total.update(
+        letters=letters,
+        move_lists=[definitions[letter][0] for letter in letters],
+        seconds=elapsed,
+        bytes=sum(os.path.getsize(path) for path in paths),
+        games_per_second=total["games"] / elapsed if elapsed > 0 else 0.0,
+        workers=workers or os.cpu_count(),
+        numpy=use_numpy,
+    )
+    return total
+
+
+def write_synthetic_corpus(path, games, distinct=2000, seed=0, db_path=DB_PATH):
+    """ランダムな対局を distinct 局だけ実際に指して棋譜にし、それを繰り返して games 局の棋譜ファイルを作る"""
+    rng = random.Random(seed)
+    definitions = load_piece_definitions(db_path)
+    universities = list(UNIVERSITY_DATA)
+    sample_path = path + ".sample"
+    if os.path.exists(sample_path):
+        os.remove(sample_path)
+    for _ in range(min(games, distinct)):
+        p1, p2 = rng.choice(universities), rng.choice(universities)
+        board = Board.from_orders(UNIVERSITY_DATA[p1], UNIVERSITY_DATA[p2], definitions)
+        writer = RecordWriter(sample_path, p1, p2, board)
+        while board.winner is None:
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.move_piece(*rng.choice(moves))
+            writer.update(board)
+        writer.finish(board.winner)
+    with open(sample_path, "rb") as f:
+        sample = f.read()
+    os.remove(sample_path)
+    sample_games = min(games, distinct)
+    with open(path, "wb") as f:
+        for _ in range(games // sample_games):
+            f.write(sample)
+        rest = games % sample_games
+        if rest:
+            records = list(iter_records(sample))
+            f.write(sample[:records[rest].offset])
+
+
+def print_report(report):
+    """集計結果を表形式で出力する"""
+    games = report["games"]
+    print(f"{games} 局（集計できなかった対局 {report['skipped']}）/ 平均 {report['turns'] / max(games, 1):.1f} 手")
+    print("終局の内訳: " + " / ".join(f"{name} {count / max(games, 1):.1%}" for name, count in report["results"].items() if count))
+    if report["third_capture_games"]:
+        print(f"3枚目を取るまでの平均手数: {report['third_capture_turns'] / report['third_capture_games']:.1f} 手"
+              f"（{report['third_capture_games'] / max(games, 1):.1%} の対局）")
+    headers = [("文字", 6, False), ("動き", 10, False), ("登場", 10, True), ("取った", 10, True), ("取られた", 10, True), ("差/1枚", 9, True)]
+    print()
+    print("".join(pad_text(text, width, right) for text, width, right in headers))
+    rows = zip(report["letters"], report["move_lists"], report["appearances"], report["captures_made"], report["captured"])
+    for letter, move_list, appearances, made, lost in sorted(rows, key=lambda row: -(row[3] - row[4]) / max(row[2], 1)):
+        if appearances:
+            print(f"{letter:<6}{move_list:<10}{appearances:>10}{made:>10}{lost:>10}{(made - lost) / appearances:>+9.3f}")
+    print(f"\n{report['seconds']:.1f} 秒 ({report['games_per_second']:,.0f} 局/秒, {report['bytes'] / 1e6:.0f} MB, "
+          f"{report['workers']} プロセス, NumPy: {'あり' if report['numpy'] else 'なし'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="棋譜ファイルをまとめて集計する（駒ごとの取った・取られた回数、終局の内訳など）")
+    parser.add_argument("paths", nargs="*", help="棋譜ファイル（省略時はゲームが保存した全ての棋譜）")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPUのコア数）")
+    parser.add_argument("--games-per-task", type=int, default=20000, help="1タスクあたりの対局数")
+    parser.add_argument("--no-numpy", action="store_true", help="NumPy を使わずに集計する")
+    parser.add_argument("--synthetic", type=int, metavar="GAMES", help="ランダムな対局の棋譜をこの局数だけ作って集計する（処理速度の計測用）")
+    parser.add_argument("--seed", type=int, default=0, help="合成する棋譜の乱数の種")
+    parser.add_argument("--json", metavar="PATH", help="集計結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    paths = args.paths or record_files(RECORDS_PATH)
+    corpus_dir = None
+    if args.synthetic:
+        corpus_dir = tempfile.TemporaryDirectory()
+        paths = [os.path.join(corpus_dir.name, "synthetic.usr")]
+        started = time.perf_counter()
+        write_synthetic_corpus(paths[0], args.synthetic, seed=args.seed)
+        print(f"{args.synthetic} 局の棋譜を作りました（{time.perf_counter() - started:.1f} 秒）")
+    try:
+        report = run_analysis(paths, args.workers, args.games_per_task, use_numpy=False if args.no_numpy else None)
+    finally:
+        if corpus_dir is not None:
+            corpus_dir.cleanup()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# src/assets.py
+
+import os
+
+import pygame
+
+from settings import PROJECT_ROOT, WIDTH, HEIGHT, INFO_PANEL_WIDTH
+
+BACKGROUND_PATH = os.path.join('images', 'wood_background.jpg')
+
+
+class AssetManager:
+    """画像を一度だけ読み込み・変換・拡大縮小し、全シーンで同じSurfaceを使い回す"""
+
+    def __init__(self):
+        self.surfaces = {}
+
+    def get_image(self, relative_path, size=None, alpha=False):
+        """画像を返す（sizeを指定するとその大きさに縮小済みのもの）。読み込めない場合はNone"""
+        key = (relative_path, size, alpha)
+        if key in self.surfaces:
+            return self.surfaces[key]
+        try:
+            full_path = os.path.join(PROJECT_ROOT, relative_path)
+            image = pygame.image.load(full_path)
+            image = image.convert_alpha() if alpha else image.convert()
+            if size is not None:
+                image = pygame.transform.scale(image, size)
+        except pygame.error as e:
+            print(f"画像の読み込みに失敗しました: {relative_path} ({e})")
+            image = None
+        self.surfaces[key] = image
+        return image
+
+    def background(self):
+        """画面サイズに合わせた木目の背景画像を返す。
+        全シーンで同じSurfaceを共有するので、シーンを作り直しても読み込み直さない"""
+        return self.get_image(BACKGROUND_PATH, (WIDTH + INFO_PANEL_WIDTH, HEIGHT))
+
+    def memory_usage(self):
+        """保持しているSurfaceのおおよそのメモリ使用量（バイト）を {キー: バイト数} で返す"""
+        return {key: surface.get_pitch() * surface.get_height()
+                for key, surface in self.surfaces.items() if surface is not None}
+
+    def total_bytes(self):
+        """保持しているSurfaceの合計メモリ使用量（バイト）"""
+        return sum(self.memory_usage().values())
+
+    def clear(self):
+        """キャッシュを捨てる（画面モードを変えたときなど）"""
+        self.surfaces.clear()
+
+
+# プロセス全体で共有するインスタンス
+asset_manager = AssetManager()
@@ -0,0 +1,177 @@
+# src/benchmark.py
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+
+from settings import UNIVERSITY_DATA, DB_PATH, TEAMS
+from rules import Board, load_piece_definitions
+from bitboard import Position, build_attack_tables, square_of
+
+
+def perft(position, depth):
+    """深さdepthまでの末端局面の数を数える（決着した局面はそこで末端とする）"""
+    if depth == 0 or position.winner() is not None:
+        return 1
+    nodes = 0
+    for move in position.generate_moves():
+        captured = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move, captured)
+    return nodes
+
+
+def perft_board(board, depth):
+    """rules.Board で同じ数を数える（ビットボード実装の検算用）"""
+    if depth == 0 or board.winner is not None:
+        return 1
+    nodes = 0
+    for piece_index, target in board.legal_moves():
+        child = board.copy()
+        child.move_piece(piece_index, target)
+        nodes += perft_board(child, depth - 1)
+    return nodes
+
+
+def bench_perft(piece_definitions, tables, depth, verify_depth):
+    """全ての大学の組み合わせの初期局面でperftを計測する"""
+    results = []
+    for p1_university, p2_university in itertools.product(UNIVERSITY_DATA, repeat=2):
+        board = Board.from_orders(UNIVERSITY_DATA[p1_university], UNIVERSITY_DATA[p2_university], piece_definitions)
+        position = Position.from_board(board, tables)
+        counts = []
+        start = time.perf_counter()
+        for d in range(1, depth + 1):
+            counts.append(perft(position, d))
+        elapsed = time.perf_counter() - start
+        entry = {
+            "player1": p1_university,
+            "player2": p2_university,
+            "counts": counts,
+            "seconds": elapsed,
+            "nodes_per_second": sum(counts) / elapsed if elapsed > 0 else 0.0,
+        }
+        if verify_depth:
+            expected = [perft_board(board, d) for d in range(1, verify_depth + 1)]
+            entry["verified"] = expected == counts[:verify_depth]
+        results.append(entry)
+    return results
+
+
+def _random_games(piece_definitions, tables, games, rng):
+    """計測に使う初期局面を大学の組み合わせからランダムに選ぶ"""
+    universities = list(UNIVERSITY_DATA)
+    for _ in range(games):
+        board = Board.from_orders(UNIVERSITY_DATA[rng.choice(universities)], UNIVERSITY_DATA[rng.choice(universities)], piece_definitions)
+        yield board, Position.from_board(board, tables)
+
+
+def bench_make_move(piece_definitions, tables, games, rng):
+    """手を指す処理（駒取り・千日手・手数制限の判定込み）の1手あたりの時間を計測する"""
+    board_moves = []
+    for board, _position in _random_games(piece_definitions, tables, games, rng):
+        game = []
+        replay = board.copy()
+        while replay.winner is None:
+            move = rng.choice(replay.legal_moves())
+            game.append(move)
+            replay.move_piece(*move)
+        board_moves.append((board, game))
+
+    total_moves = sum(len(game) for _board, game in board_moves)
+
+    start = time.perf_counter()
+    for board, game in board_moves:
+        board = board.copy()
+        for piece_index, target in game:
+            board.move_piece(piece_index, target)
+    board_seconds = time.perf_counter() - start
+
+    position_games = []
+    for board, game in board_moves:
+        replay = board.copy()
+        moves = []
+        for piece_index, target in game:
+            moves.append((replay.pieces[piece_index].sq, square_of(*target)))
+            replay.move_piece(piece_index, target)
+        position_games.append((Position.from_board(board, tables), moves))
+
+    start = time.perf_counter()
+    for position, moves in position_games:
+        for move in moves:
+            position.make_move(move)
+            position.winner()
+    position_seconds = time.perf_counter() - start
+
+    return {
+        "moves": total_moves,
+        "board_ns_per_move": board_seconds / total_moves * 1e9,
+        "position_ns_per_move": position_seconds / total_moves * 1e9,
+    }
+
+
+def bench_playouts(piece_definitions, tables, games, rng):
+    """終局（最大MAX_TURNS手）までのランダム対局の速さを計測する"""
+    positions = [position for _board, position in _random_games(piece_definitions, tables, games, rng)]
+    results = dict.fromkeys(TEAMS + ("Draw (Repetition)", "Draw (Turn Limit)"), 0)
+    total_moves = 0
+    start = time.perf_counter()
+    for position in positions:
+        while position.winner() is None:
+            position.make_move(rng.choice(position.generate_moves()))
+        results[position.winner()] += 1
+        total_moves += position.turn_count
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "moves": total_moves,
+        "seconds": elapsed,
+        "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+        "results": results,
+    }
+
+
+def run_benchmarks(depth=3, verify_depth=2, games=500, seed=0, db_path=DB_PATH):
+    """全ての計測を行い、JSONに書き出せる辞書で返す"""
+    piece_definitions = load_piece_definitions(db_path)
+    tables = build_attack_tables(piece_definitions)
+    rng = random.Random(seed)
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": seed,
+        "perft": bench_perft(piece_definitions, tables, depth, verify_depth),
+        "make_move": bench_make_move(piece_definitions, tables, games, rng),
+        "playouts": bench_playouts(piece_definitions, tables, games, rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="手の生成とルール処理の速さを計測する")
+    parser.add_argument("--depth", type=int, default=3, help="perftの深さ")
+    parser.add_argument("--verify-depth", type=int, default=2, help="rules.Boardでperftを検算する深さ（0で検算しない）")
+    parser.add_argument("--games", type=int, default=500, help="手を指す処理とランダム対局の計測に使う対局数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--output", metavar="PATH", help="結果のJSONを書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.depth, args.verify_depth, args.games, args.seed)
+    mismatched = [entry for entry in report["perft"] if entry.get("verified") is False]
+    for entry in mismatched:
+        print(f"perftの検算が一致しませんでした: {entry['player1']} vs {entry['player2']}", file=sys.stderr)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
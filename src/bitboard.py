@@ -0,0 +1,226 @@
+# src/bitboard.py
+
+from functools import lru_cache
+
+from settings import ROWS, COLS, MAX_TURNS, DIRECTIONS, TEAMS
+from zobrist import SIDE_KEY, piece_keys, RepetitionTable
+
+# 7x8の盤面を56ビットの整数で表す（マス番号 = 行 * COLS + 列）
+NUM_SQUARES = ROWS * COLS
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+
+def square_of(r, c):
+    """(行, 列) をマス番号に変換する"""
+    return r * COLS + c
+
+
+def pos_of(sq):
+    """マス番号を (行, 列) に変換する"""
+    return divmod(sq, COLS)
+
+
+def iter_bits(bb):
+    """ビットボードの立っているビットのマス番号を順に返す"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def parse_move_mask(move_str):
+    """pieces.db の move_list 文字列（例: '10110101'）を、i文字目をビットiとするビットマスクに変換する"""
+    return sum(1 << i for i, c in enumerate(move_str) if c == "1")
+
+
+@lru_cache(maxsize=None)
+def attack_table(move_mask, team_index):
+    """動ける方向のビットマスクとチームから、マスごとの移動先ビットマスクの表を作る（トーラスとplayer2の反転込み）"""
+    sign = -1 if team_index == 1 else 1
+    table = []
+    for sq in range(NUM_SQUARES):
+        r0, c0 = pos_of(sq)
+        mask = 0
+        for i in range(len(DIRECTIONS)):
+            if move_mask >> i & 1:
+                dr, dc = DIRECTIONS[i]
+                mask |= 1 << square_of((r0 + sign * dr) % ROWS, (c0 + sign * dc) % COLS)
+        table.append(mask)
+    return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def _neighbors_of(table):
+    return tuple(tuple(iter_bits(mask)) for mask in table)
+
+
+def neighbor_table(move_mask, team_index):
+    """attack_table と同じ移動先を、マスごとにマス番号のタプルで引く表。
+    ビットを1つずつ取り出す代わりにタプルをなめるだけで済むので、手の列挙と画面の強調表示で使う。
+    ROWS/COLS から実行時に作るので、盤の大きさを変えても古い表が残ることはない"""
+    return _neighbors_of(attack_table(move_mask, team_index))
+
+
+def neighbor_tables(tables):
+    """build_attack_tables の形の表から、{文字: (player1用の移動先の表, player2用の移動先の表)} を作る"""
+    return {name: (_neighbors_of(p1_table), _neighbors_of(p2_table)) for name, (p1_table, p2_table) in tables.items()}
+
+
+def build_attack_tables(piece_definitions):
+    """駒の定義から {文字: (player1用の表, player2用の表)} を作る"""
+    tables = {}
+    for name, (move_str, _image_path) in piece_definitions.items():
+        move_mask = parse_move_mask(move_str)
+        tables[name] = (attack_table(move_mask, 0), attack_table(move_mask, 1))
+    return tables
+
+
+class Position:
+    """探索・大量シミュレーション用のビットボード盤面。手番は0(player1)/1(player2)で表す"""
+
+    __slots__ = ("letters", "occupancy", "side", "captures", "turn_count", "key", "history", "tables", "neighbors")
+
+    def __init__(self, tables, neighbors=None):
+        """空の盤面を作る（neighbors を省略すると tables から作る）"""
+        self.letters = [None] * NUM_SQUARES
+        self.occupancy = [0, 0]
+        self.side = 0
+        self.captures = [0, 0]
+        self.turn_count = 0
+        self.key = 0
+        self.history = RepetitionTable()
+        self.tables = tables
+        self.neighbors = neighbors if neighbors is not None else neighbor_tables(tables)
+
+    @classmethod
+    def from_board(cls, board, tables=None):
+        """rules.Board から同じ局面のビットボード盤面を作る（tablesを省略すると盤上の駒から作る）"""
+        if tables is None:
+            tables = {}
+            for _piece_id, piece in board.active_pieces():
+                tables[piece.name] = (attack_table(piece.move_mask, 0), attack_table(piece.move_mask, 1))
+        position = cls(tables)
+        for _piece_id, piece in board.active_pieces():
+            position.put(piece.name, piece.team, piece.sq)
+        position.side = TEAMS.index(board.turn)
+        position.captures = [board.capture_count["player1"], board.capture_count["player2"]]
+        position.turn_count = board.turn_count
+        position.key = board.zobrist_key
+        position.history = board.position_history.copy()
+        return position
+
+    def copy(self):
+        """盤面を複製する"""
+        position = Position(self.tables, self.neighbors)
+        position.letters = self.letters[:]
+        position.occupancy = self.occupancy[:]
+        position.side = self.side
+        position.captures = self.captures[:]
+        position.turn_count = self.turn_count
+        position.key = self.key
+        position.history = self.history.copy()
+        return position
+
+    def put(self, letter, team_index, sq):
+        """駒を置く"""
+        self.letters[sq] = letter
+        self.occupancy[team_index] |= 1 << sq
+        self.key ^= piece_keys(letter, team_index)[sq]
+
+    def targets_from(self, sq):
+        """マスにある駒の移動先をビットマスクで返す"""
+        team_index = 0 if self.occupancy[0] >> sq & 1 else 1
+        return self.tables[self.letters[sq]][team_index][sq] & ~self.occupancy[team_index]
+
+    def generate_moves(self):
+        """手番側の合法手を (移動元, 移動先) のリストで返す"""
+        side = self.side
+        own = self.occupancy[side]
+        neighbors = self.neighbors
+        letters = self.letters
+        moves = []
+        bb = own
+        while bb:
+            low = bb & -bb
+            sq = low.bit_length() - 1
+            bb ^= low
+            for target in neighbors[letters[sq]][side][sq]:
+                if not own >> target & 1:
+                    moves.append((sq, target))
+        return moves
+
+    def has_moves(self):
+        """手番側に動かせる駒があるかどうか"""
+        side = self.side
+        own = self.occupancy[side]
+        tables = self.tables
+        letters = self.letters
+        bb = own
+        while bb:
+            low = bb & -bb
+            sq = low.bit_length() - 1
+            bb ^= low
+            if tables[letters[sq]][side][sq] & ~own:
+                return True
+        return False
+
+    def is_capture(self, move):
+        """その手が相手の駒を取る手かどうか"""
+        return self.occupancy[1 - self.side] >> move[1] & 1 == 1
+
+    def make_move(self, move):
+        """手を指す。取った駒の文字（なければNone）を返し、unmake_moveに渡して戻せる"""
+        from_sq, to_sq = move
+        side = self.side
+        enemy = 1 - side
+        to_bit = 1 << to_sq
+        letter = self.letters[from_sq]
+        key = self.key ^ SIDE_KEY
+        captured = None
+        if self.occupancy[enemy] & to_bit:
+            captured = self.letters[to_sq]
+            self.occupancy[enemy] ^= to_bit
+            self.captures[side] += 1
+            key ^= piece_keys(captured, enemy)[to_sq]
+        keys = piece_keys(letter, side)
+        self.key = key ^ keys[from_sq] ^ keys[to_sq]
+        self.occupancy[side] ^= (1 << from_sq) | to_bit
+        self.letters[to_sq] = letter
+        self.letters[from_sq] = None
+        self.side = enemy
+        self.turn_count += 1
+        self.history.push(self.key)
+        return captured
+
+    def unmake_move(self, move, captured):
+        """make_moveで指した手を取り消す"""
+        from_sq, to_sq = move
+        self.history.pop(self.key)
+        self.side = side = 1 - self.side
+        self.turn_count -= 1
+        to_bit = 1 << to_sq
+        letter = self.letters[to_sq]
+        keys = piece_keys(letter, side)
+        key = self.key ^ SIDE_KEY ^ keys[from_sq] ^ keys[to_sq]
+        self.occupancy[side] ^= (1 << from_sq) | to_bit
+        self.letters[from_sq] = letter
+        self.letters[to_sq] = None
+        if captured is not None:
+            self.letters[to_sq] = captured
+            self.occupancy[1 - side] |= to_bit
+            self.captures[side] -= 1
+            key ^= piece_keys(captured, 1 - side)[to_sq]
+        self.key = key
+
+    def winner(self):
+        """決着していれば勝者のチーム名か引き分け理由を、そうでなければNoneを返す（rules.Board.end_condition と同じ規則）"""
+        for team_index in (0, 1):
+            if self.captures[team_index] >= 3:
+                return TEAMS[team_index]
+        if not self.has_moves():
+            return TEAMS[1 - self.side]
+        if self.history.count(self.key) >= 3:
+            return "Draw (Repetition)"
+        if self.turn_count >= MAX_TURNS:
+            return "Draw (Turn Limit)"
+        return None
@@ -0,0 +1,233 @@
+# src/engine.py
+
+import time
+
+from settings import CPU_TIME_LIMIT, TEAMS, MAX_TURNS
+from bitboard import Position, pos_of
+
+WIN_SCORE = 100000
+CAPTURE_SCORE = 1000
+THREAT_SCORE = 40
+MOBILITY_SCORE = 2
+MAX_DEPTH = 32
+TT_MAX_ENTRIES = 1000000
+
+# 置換表のエントリの種類
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def _tt_key(position):
+    """置換表のキー。Zobrist キーは駒の配置と手番だけなので、評価に効く撃破数と手数（手数制限までの残り）も加える。
+    同じ配置でも、別の対局や千日手で戻ってきた局面の評価を取り違えないようにする"""
+    return position.key | position.turn_count << 64 | position.captures[0] << 72 | position.captures[1] << 76
+
+
+class SearchTimeout(Exception):
+    """持ち時間を使い切ったときに探索を打ち切るための例外"""
+
+
+class SearchResult:
+    """探索結果（最善手・評価値・到達した深さ・探索ノード数）"""
+
+    __slots__ = ("best_move", "score", "depth", "nodes")
+
+    def __init__(self, best_move, score, depth, nodes):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+
+
+class Engine:
+    """反復深化のαβ探索で手を選ぶCPU。置換表と取る手優先の手順付けを使う。
+    use_tablebase=True にすると、終盤データベース（tablebase.py）に載っている駒の少ない局面はそこで引いた結果を使う。
+    今の表は実際の対局では現れない駒数までしか解いていないので、既定では引かない"""
+
+    def __init__(self, time_limit=CPU_TIME_LIMIT, max_depth=MAX_DEPTH, use_tablebase=False):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.tablebase = None
+        if use_tablebase:
+            from tablebase import load_tablebase
+            self.tablebase = load_tablebase()
+        self.tt = {}
+        self.nodes = 0
+        self.deadline = None
+        self.should_stop = None
+
+    def choose_move(self, board):
+        """rules.Board の手番側の手を選び、(駒のインデックス, 移動先) で返す"""
+        result = self.search(Position.from_board(board))
+        if result.best_move is None:
+            return None
+        from_sq, to_sq = result.best_move
+        return board.piece_at(pos_of(from_sq)), pos_of(to_sq)
+
+    def search(self, position, time_limit=None, on_iteration=None, should_stop=None):
+        """持ち時間内で反復深化し、最後に読み切った深さの結果を返す。
+        on_iterationには深さごとの結果を渡す。should_stopがTrueを返すと探索を打ち切る"""
+        time_limit = self.time_limit if time_limit is None else time_limit
+        self.deadline = time.perf_counter() + time_limit
+        self.should_stop = should_stop
+        self.nodes = 0
+        if len(self.tt) > TT_MAX_ENTRIES:
+            self.tt.clear()
+        moves = position.generate_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0)
+        result = SearchResult(self._order_moves(position, moves, None)[0], 0, 0, 0)
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, move = self._root(position, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(move, score, depth, self.nodes)
+            if on_iteration is not None:
+                on_iteration(result)
+            if abs(score) >= WIN_SCORE - MAX_DEPTH:
+                break
+        return result
+
+    def _root(self, position, depth):
+        """ルート局面の探索"""
+        entry = self.tt.get(_tt_key(position))
+        tt_move = entry[3] if entry else None
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_move = None
+        for move in self._order_moves(position, position.generate_moves(), tt_move):
+            captured = position.make_move(move)
+            try:
+                score = -self._alphabeta(position, depth - 1, -beta, -alpha, 1)
+            finally:
+                position.unmake_move(move, captured)
+            if score > alpha or best_move is None:
+                alpha, best_move = score, move
+        self.tt[_tt_key(position)] = (depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _alphabeta(self, position, depth, alpha, beta, ply):
+        """ネガマックス形式のαβ探索"""
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            if time.perf_counter() > self.deadline or (self.should_stop is not None and self.should_stop()):
+                raise SearchTimeout()
+
+        terminal = self._terminal_score(position, ply)
+        if terminal is not None:
+            return terminal
+        if self.tablebase is not None and (position.occupancy[0] | position.occupancy[1]).bit_count() <= self.tablebase.max_pieces:
+            score = self._tablebase_score(position, ply)
+            if score is not None:
+                return score
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        key = _tt_key(position)
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            e_depth, e_score, e_flag, tt_move = entry
+            if e_depth >= depth:
+                if e_flag == EXACT:
+                    return e_score
+                if e_flag == LOWER and e_score >= beta:
+                    return e_score
+                if e_flag == UPPER and e_score <= alpha:
+                    return e_score
+
+        moves = position.generate_moves()
+        original_alpha = alpha
+        best_score, best_move = -WIN_SCORE - 1, None
+        for move in self._order_moves(position, moves, tt_move):
+            captured = position.make_move(move)
+            try:
+                score = -self._alphabeta(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move(move, captured)
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha: flag = UPPER
+        elif best_score >= beta: flag = LOWER
+        else: flag = EXACT
+        self.tt[key] = (depth, best_score, flag, best_move)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        """取る手だけを読み進めて、駒の取り合いの途中で評価しないようにする"""
+        stand_pat = self.evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        for move in position.generate_moves():
+            if not position.is_capture(move):
+                continue
+            self.nodes += 1
+            captured = position.make_move(move)
+            try:
+                terminal = self._terminal_score(position, ply + 1)
+                score = -terminal if terminal is not None else -self._quiesce(position, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move(move, captured)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _terminal_score(self, position, ply):
+        """決着していれば手番側から見た評価値を、そうでなければNoneを返す"""
+        winner = position.winner()
+        if winner is None:
+            return None
+        if winner in TEAMS:
+            # 直前に指した側（手番でない側）が3枚目を取ったか、手番側に動かせる駒がない
+            return -(WIN_SCORE - ply)
+        return 0
+
+    def _tablebase_score(self, position, ply):
+        """終盤データベースで引いた結果を評価値にする（表にない局面ならNone）。
+        手数制限までに決着しない勝ち負けは引き分けとして扱う"""
+        hit = self.tablebase.probe_position(position)
+        if hit is None:
+            return None
+        result, distance = hit
+        if result == "draw" or position.turn_count + distance > MAX_TURNS:
+            return 0
+        score = WIN_SCORE - (ply + distance)
+        return score if result == "win" else -score
+
+    def _order_moves(self, position, moves, tt_move):
+        """置換表の手、取る手、それ以外の順に並べる"""
+        enemy = position.occupancy[1 - position.side]
+        ordered = [m for m in moves if enemy >> m[1] & 1]
+        ordered += [m for m in moves if not enemy >> m[1] & 1]
+        if tt_move in moves:
+            ordered.remove(tt_move)
+            ordered.insert(0, tt_move)
+        return ordered
+
+    def evaluate(self, position):
+        """手番側から見た局面の評価値（撃破数の差、取れる駒の数、動ける範囲）"""
+        side, enemy = position.side, 1 - position.side
+        occ = position.occupancy
+        tables, letters = position.tables, position.letters
+        attacks = [0, 0]
+        mobility = [0, 0]
+        for team_index in (0, 1):
+            bb = occ[team_index]
+            own = occ[team_index]
+            while bb:
+                low = bb & -bb
+                sq = low.bit_length() - 1
+                bb ^= low
+                targets = tables[letters[sq]][team_index][sq] & ~own
+                attacks[team_index] |= targets
+                mobility[team_index] += targets.bit_count()
+        score = CAPTURE_SCORE * (position.captures[side] - position.captures[enemy])
+        score += THREAT_SCORE * ((attacks[side] & occ[enemy]).bit_count() - (attacks[enemy] & occ[side]).bit_count())
+        score += MOBILITY_SCORE * (mobility[side] - mobility[enemy])
+        return score
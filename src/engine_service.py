@@ -0,0 +1,98 @@
+# src/engine_service.py
+
+import multiprocessing
+import os
+import queue
+
+from settings import CPU_TIME_LIMIT, CPU_USE_TABLEBASE
+from engine import Engine
+
+# ワーカーから返すメッセージの種類
+INFO = "INFO"  # 反復深化の途中経過
+DONE = "DONE"  # 探索の最終結果
+
+
+def _worker_main(requests, results, cancel_id):
+    """ワーカープロセスの本体。探索要求を待ち、深さごとの途中経過と最終結果を送り返す"""
+    # 描画側のプロセスにCPUを譲るため、優先度を少し下げる
+    if hasattr(os, "nice"):
+        os.nice(5)
+    engine = Engine(use_tablebase=CPU_USE_TABLEBASE)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, position, time_limit = request
+        if cancel_id.value >= request_id:
+            continue
+
+        def should_stop():
+            return cancel_id.value >= request_id
+
+        def on_iteration(result):
+            results.put((INFO, request_id, result.best_move, result.score, result.depth, result.nodes))
+
+        result = engine.search(position, time_limit, on_iteration, should_stop)
+        results.put((DONE, request_id, result.best_move, result.score, result.depth, result.nodes))
+
+
+class EngineService:
+    """探索を別プロセスで動かし、描画ループを止めずに結果を受け取るための窓口"""
+
+    def __init__(self, time_limit=CPU_TIME_LIMIT):
+        """ワーカープロセスを起動する"""
+        ctx = multiprocessing.get_context("spawn")
+        self.time_limit = time_limit
+        self.requests = ctx.Queue()
+        self.results = ctx.Queue()
+        self.cancel_id = ctx.Value("i", 0)
+        self.process = ctx.Process(target=_worker_main, args=(self.requests, self.results, self.cancel_id), daemon=True)
+        self.process.start()
+        self.request_id = 0
+        self.pending_id = None
+        self.latest = None  # 探索中の途中経過 (最善手, 評価値, 深さ, ノード数)
+
+    def is_searching(self):
+        """結果待ちの探索があるかどうか"""
+        return self.pending_id is not None
+
+    def start_search(self, position, time_limit=None):
+        """探索を依頼する。実行中の探索があれば取り消す"""
+        self.cancel()
+        self.request_id += 1
+        self.pending_id = self.request_id
+        self.latest = None
+        self.requests.put((self.request_id, position, self.time_limit if time_limit is None else time_limit))
+
+    def cancel(self):
+        """実行中の探索を取り消す（結果は捨てられる）"""
+        if self.pending_id is not None:
+            self.cancel_id.value = self.pending_id
+            self.pending_id = None
+            self.latest = None
+
+    def poll(self):
+        """届いている結果をすべて読み、探索が終わっていれば最善手を返す（待たずにすぐ戻る）"""
+        best_move = None
+        while True:
+            try:
+                kind, request_id, move, score, depth, nodes = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if request_id != self.pending_id:
+                continue
+            self.latest = (move, score, depth, nodes)
+            if kind == DONE:
+                self.pending_id = None
+                best_move = move
+        return best_move
+
+    def shutdown(self):
+        """探索を取り消してワーカープロセスを終了する"""
+        self.cancel()
+        self.cancel_id.value = self.request_id
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=1.0)
+            if self.process.is_alive():
+                self.process.terminate()
@@ -0,0 +1,59 @@
+# src/font_cache.py
+
+import json
+import os
+import platform
+
+import pygame
+
+from settings import FONT_CACHE_PATH
+
+# OSごとの日本語フォントの候補（先頭から順に探す）
+FONT_CANDIDATES = {
+    "Windows": ["meiryo", "yugothic", "msgothic"],
+    "Darwin": ["hiraginosans", "hiraginokakugothicpron"],
+}
+DEFAULT_FONT_CANDIDATES = ["ipaexg", "notosanscjkjp"]
+
+
+def find_japanese_font():
+    """OSに応じた日本語フォントのファイルを探す（pygame.font.match_font はOSのフォント一覧を走査するので遅い）"""
+    for font in FONT_CANDIDATES.get(platform.system(), DEFAULT_FONT_CANDIDATES):
+        path = pygame.font.match_font(font)
+        if path:
+            return path
+    return None
+
+
+def resolve_japanese_font(cache_path=FONT_CACHE_PATH):
+    """日本語フォントのファイルパスを返す（見つからなければNone）。
+    結果はプラットフォームごとにディスクに保存し、次回の起動ではフォント一覧を走査しない。
+    フォントを追加した後に探し直すにはキャッシュファイルを削除する"""
+    key = platform.platform()
+    cache = _read_cache(cache_path)
+    if key in cache:
+        path = cache[key]
+        if path is None or os.path.exists(path):
+            return path
+    path = find_japanese_font()
+    cache[key] = path
+    _write_cache(cache_path, cache)
+    return path
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, cache):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"フォント情報のキャッシュを保存できませんでした: {e}")
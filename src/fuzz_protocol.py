@@ -0,0 +1,136 @@
+# src/fuzz_protocol.py
+# ロスと遅延のある localhost の回線でランダムな対局を流し、両者の局面が最後に必ず一致することを確かめる
+# 使い方: python fuzz_protocol.py --games 200 --loss 0.2 --corrupt 0.02
+
+import argparse
+import json
+import random
+import time
+
+from settings import UNIVERSITY_DATA, DB_PATH
+from rules import Board, CAPTURED, SNAPSHOT_HEADER, load_piece_definitions
+from transport import ReliableEndpoint
+from netsim import LossyLink
+import protocol
+
+
+class Peer:
+    """ゲームの片側（盤面・MatchSync・ソケット）"""
+
+    def __init__(self, board, team, authoritative):
+        self.endpoint = ReliableEndpoint(0, '127.0.0.1')
+        self.peer_address = None
+        self.bytes_per_move = []
+        self.match = protocol.MatchSync(board, team, self.send, authoritative)
+
+    def send(self, message):
+        data = protocol.encode(message)
+        if isinstance(message, protocol.Move):
+            self.bytes_per_move.append(len(data))
+        self.endpoint.send(data, self.peer_address)
+
+    def pump(self):
+        """届いているメッセージを全て処理し、再送を行う"""
+        for payload, _addr in self.endpoint.recv_ready():
+            self.match.receive(protocol.decode(payload))
+        self.endpoint.tick()
+
+    def idle(self):
+        """送ったメッセージが全て相手に届き、同期待ちでもない"""
+        return not self.match.awaiting_snapshot and all(not channel.unacked for channel in self.endpoint.channels.values())
+
+
+def corrupt(board, rng):
+    """通信を介さずに局面を書き換え、相手と食い違った状態を作る（盤上の駒を1つ消す）"""
+    snapshot = bytearray(board.snapshot())
+    on_board = [i for i, p in enumerate(board.pieces) if p.sq is not None]
+    if len(on_board) > 1:
+        snapshot[SNAPSHOT_HEADER.size + rng.choice(on_board)] = CAPTURED
+        board.restore(bytes(snapshot), board.position_history.counts)
+
+
+def play_game(link, definitions, rng, corrupt_rate, timeout):
+    """1局をランダムな手で指し、(両者の局面が一致したか, 同期の回数, 手数, 1手のバイト数のリスト) を返す"""
+    universities = list(UNIVERSITY_DATA)
+    p1, p2 = rng.choice(universities), rng.choice(universities)
+    host = Peer(Board.from_orders(UNIVERSITY_DATA[p1], UNIVERSITY_DATA[p2], definitions), "player1", True)
+    guest = Peer(Board.from_orders(UNIVERSITY_DATA[p1], UNIVERSITY_DATA[p2], definitions), "player2", False)
+    link.a_addr = host.endpoint.sock.getsockname()
+    link.b_addr = guest.endpoint.sock.getsockname()
+    host.peer_address = link.address_for_a()
+    guest.peer_address = link.address_for_b()
+
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            for peer in (host, guest):
+                peer.pump()
+                board = peer.match.board
+                if peer.match.can_play():
+                    if rng.random() < corrupt_rate:
+                        corrupt(board, rng)
+                    moves = board.legal_moves()
+                    if moves:
+                        peer.match.play(*rng.choice(moves))
+            finished = host.match.board.winner is not None and guest.match.board.winner is not None
+            if finished and host.idle() and guest.idle():
+                break
+            time.sleep(0.001)
+        in_sync = host.match.board.snapshot() == guest.match.board.snapshot() and host.match.board.winner == guest.match.board.winner
+        return in_sync, host.match.resyncs + guest.match.resyncs, host.match.board.turn_count, host.bytes_per_move + guest.bytes_per_move
+    finally:
+        host.endpoint.close()
+        guest.endpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ロスのある回線でランダムな対局を流し、局面の食い違いが解消されることを確かめる")
+    parser.add_argument("--games", type=int, default=50, help="対局数")
+    parser.add_argument("--loss", type=float, default=0.2, help="パケットロス率")
+    parser.add_argument("--delay", type=float, default=5.0, help="片道の遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=3.0, help="遅延の揺らぎ（ミリ秒）")
+    parser.add_argument("--corrupt", type=float, default=0.02, help="手を指す前に自分の局面をわざと壊す確率")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1局あたりの制限時間（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--json", default=None, help="結果を書き出すJSONファイル")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    definitions = load_piece_definitions(DB_PATH)
+    link = LossyLink(args.loss, args.delay / 1000, args.jitter / 1000, args.seed)
+    diverged, resyncs, plies, move_sizes = 0, 0, 0, []
+    start = time.perf_counter()
+    try:
+        for game_index in range(args.games):
+            in_sync, game_resyncs, game_plies, sizes = play_game(link, definitions, rng, args.corrupt, args.timeout)
+            diverged += not in_sync
+            resyncs += game_resyncs
+            plies += game_plies
+            move_sizes.extend(sizes)
+            if not in_sync:
+                print(f"対局 {game_index}: 局面が一致しませんでした")
+    finally:
+        link.close()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "games": args.games,
+        "diverged": diverged,
+        "resyncs": resyncs,
+        "plies": plies,
+        "max_move_bytes": max(move_sizes, default=0),
+        "loss": args.loss,
+        "corrupt_rate": args.corrupt,
+        "elapsed_s": elapsed,
+    }
+    print(f"{args.games}局 / {plies}手 / 同期 {resyncs}回 / 食い違ったまま {diverged}局 "
+          f"/ MOVEは最大{result['max_move_bytes']}バイト / {elapsed:.1f}秒")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if diverged:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,43 @@
 # src/game_logic.py
 
 import pygame
+import queue
 import sys
 import sqlite3
-import platform
-import queue
-import threading
-import os
+import time
 
 from settings import *
-from network import SharedData, Server, Client, broadcast_presence, listen_for_hosts
-
-class Game:
-    def __init__(self):
-        pygame.init()
-        font_name = self.get_japanese_font()
+from rules import Board
+from assets import asset_manager
+from piece_catalog import piece_catalog
+from text_cache import TextCache
+from font_cache import resolve_japanese_font
 
-        # ★★★ ここから修正 ★★★
-        # 1. フルスクリーンモードでディスプレイを初期化
-        self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
-        
-        # 2. 実際の画面サイズを取得
-        self.screen_width, self.screen_height = self.screen.get_size()
-        
-        # 3. ゲームコンテンツを描画するための「仮想スクリーン」を作成
-        #    このサイズはsettings.pyの値に基づいて決まる
-        self.game_surface = pygame.Surface((WIDTH + INFO_PANEL_WIDTH, HEIGHT))
-        # ★★★ 修正ここまで ★★★
+# 通信ループがメッセージを受け取ったときに、眠っているメインループを起こすためのイベント
+NETWORK_EVENT = pygame.USEREVENT + 1
 
-    def __init__(self):
-        """ゲーム全体の初期化処理"""
+class Game:
+    def __init__(self, start_time=None):
+        """ゲーム全体の初期化処理。start_timeにはプロセス開始時刻（perf_counter）を渡すと起動時間を計測する"""
+        # 起動にかかった時間を区間ごとに記録し、最初のメニュー画面を表示したときに出力する
+        self.startup_marks = [("start", time.perf_counter() if start_time is None else start_time)]
+        self.mark_startup("import")
         pygame.init()
-        font_name = self.get_japanese_font()
+        self.mark_startup("pygame.init")
+        # フォントのファイルはディスクにキャッシュしておき、OSのフォント一覧の走査を省く
+        font_path = resolve_japanese_font()
+        self.mark_startup("font_resolve")
         self.screen = pygame.display.set_mode((WIDTH + INFO_PANEL_WIDTH, HEIGHT))
         pygame.display.set_caption("大学将棋")
-        self.font_large = pygame.font.SysFont(font_name, 74)
-        self.font_medium = pygame.font.SysFont(font_name, 50)
-        self.font_game = pygame.font.SysFont(font_name, 36)
+        self.mark_startup("display")
+        self.font_large = pygame.font.Font(font_path, 74)
+        self.font_medium = pygame.font.Font(font_path, 50)
+        self.font_game = pygame.font.Font(font_path, 36)
+        self.mark_startup("fonts")
         self.clock = pygame.time.Clock()
+        self.assets = asset_manager
+        self.catalog = piece_catalog
+        self.text_cache = TextCache()
         
         self.reset_game_state()
 
@@ -46,126 +46,185 @@ class Game:
         self.local_play_button = pygame.Rect(button_x, 200, button_width, 80)
         self.host_button = pygame.Rect(button_x, 300, button_width, 80)
         self.join_button = pygame.Rect(button_x, 400, button_width, 80)
+        self.cpu_button = pygame.Rect(button_x, 500, button_width, 80)
+        self.replay_button = pygame.Rect(button_x, 600, button_width, 80)
         self.back_button = pygame.Rect(20, 20, 120, 50)
         
-        self.directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        
         from scenes.scene_menu import MenuScene
         self.current_scene = MenuScene(self)
+        # メニューを表示している間に駒の定義と画像を読み込んでおく
+        self.catalog.warm_up_async()
+        self.mark_startup("menu_scene")
+
+    def mark_startup(self, label):
+        """起動処理の区切りの時刻を記録する"""
+        if self.startup_marks is not None:
+            self.startup_marks.append((label, time.perf_counter()))
+
+    def report_startup(self):
+        """最初のメニュー画面を表示するまでの時間を出力し、区間ごとの時間（ミリ秒）を返す"""
+        self.mark_startup("first_frame")
+        marks, self.startup_marks = self.startup_marks, None
+        timings = {label: (t - prev) * 1000 for (_, prev), (label, t) in zip(marks, marks[1:])}
+        total = (marks[-1][1] - marks[0][1]) * 1000
+        details = ", ".join(f"{label} {ms:.0f}" for label, ms in timings.items())
+        print(f"起動時間: 最初のメニュー画面まで {total:.0f} ms ({details})")
+        self.startup_timings = dict(timings, total=total)
+        return self.startup_timings
         
     def reset_game_state(self):
-        """ゲームの状態をまとめて初期化/リセットする"""
-        self.shared_data = SharedData()
+        """ゲームの状態をまとめて初期化/リセットする（通信用の共有データはオンライン対戦を選んだときに作る）"""
+        self.shared_data = None
         self.player_role = None
         self.winner = None
         self.q = None
         self.client = None
         self.server = None
-        self.pieces = []
-        self.turn = "player1"
-        self.capture_count = {"player1": 0, "player2": 0}
+        self.board = Board()
+        self.sprite_cache = None
+        self.engine = None
+        self.match = None
+        self.dedicated_server = False  # 対戦サーバー（match_server.py）経由のオンライン対戦か
+        self.spectators = None  # 観戦者への配信（P2P対戦のホストだけが持つ）
+        self.recorder = None  # 対局中の棋譜の書き込み先
         self.game_mode = None
-        self.turn_count = 0
-        self.position_history = {}
 
     def go_to_menu(self):
         """現在の通信などを中断し、新しいメニューシーンのインスタンスを返す"""
-        if self.shared_data:
-            self.shared_data.is_running = False
-        
-        if self.server and self.server.sock:
-            self.server.sock.close()
+        self.finish_record()
+        self.stop_network()
+        self.stop_engine()
             
         from scenes.scene_menu import MenuScene
         return MenuScene(self)
 
+    def stop_network(self):
+        """通信ループを止め、ソケットを全て閉じる"""
+        if self.shared_data:
+            self.shared_data.stop()
+
+    def network_messages(self):
+        """届いている通信メッセージを届いた順に全て取り出す（シーンを切り替えるときは途中でやめてよい）"""
+        while self.q is not None:
+            try:
+                yield self.q.get_nowait()
+            except queue.Empty:
+                return
+
+    def finish_record(self):
+        """対局の棋譜に結果を書いて閉じる（決着前にやめた対局は結果が不明のまま残る）"""
+        if self.recorder:
+            self.recorder.finish(self.winner)
+            self.recorder = None
+
+    def stop_engine(self):
+        """CPUの探索プロセスを止める"""
+        if self.engine:
+            self.engine.shutdown()
+            self.engine = None
+
+    def wake(self):
+        """眠っているメインループを起こす（別スレッドから呼んでよい）"""
+        pygame.event.post(pygame.event.Event(NETWORK_EVENT))
+
+    def wait_events(self, scene):
+        """イベントを取り出す。画面に変化がなければ、イベントが届くまで眠って待つ"""
+        if scene.dirty or not scene.is_idle():
+            return pygame.event.get()
+        first = pygame.event.wait(IDLE_WAIT_MS)
+        events = pygame.event.get()
+        if first.type != pygame.NOEVENT:
+            events.insert(0, first)
+        return events
+
     def run(self):
         """ゲームのメインループ。シーン管理に徹する"""
         while self.current_scene is not None:
-            events = pygame.event.get()
+            scene = self.current_scene
+            events = self.wait_events(scene)
             pressed_keys = pygame.key.get_pressed()
             for event in events:
                 if event.type == pygame.QUIT:
-                    if self.shared_data:
-                        self.shared_data.is_running = False
-                    self.current_scene.switch_to_scene(None)
+                    self.finish_record()
+                    self.stop_network()
+                    self.stop_engine()
+                    scene.switch_to_scene(None)
+                elif event.type != pygame.MOUSEMOTION:
+                    # クリックやキー入力、ウィンドウの再表示などは画面全体を描き直す
+                    scene.mark_dirty()
             
-            if self.current_scene:
-                self.current_scene.process_input(events, pressed_keys)
-                self.current_scene.update()
-                self.current_scene.draw(self.screen)
-                self.current_scene = self.current_scene.next_scene
+            scene.process_input(events, pressed_keys)
+            scene.update()
+            # 変化があったときだけ描画し、変わった範囲だけを画面に反映する
+            if scene.dirty:
+                scene.draw(self.screen)
+                if scene.dirty_rects is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(scene.dirty_rects)
+                scene.clear_dirty()
+                if self.startup_marks is not None:
+                    self.report_startup()
+            self.current_scene = scene.next_scene
             
-            pygame.display.flip()
-            self.clock.tick(60)
+            self.clock.tick(FPS)
             
         pygame.quit()
         sys.exit()
 
-    def get_japanese_font(self):
-        """OSに応じた日本語フォントを探して返す"""
-        os_name = platform.system()
-        fonts = []
-        if os_name == "Windows": fonts = ["meiryo", "yugothic", "msgothic"]
-        elif os_name == "Darwin": fonts = ["hiraginosans", "hiraginokakugothicpron"]
-        else: fonts = ["ipaexg", "notosanscjkjp"]
-        for font in fonts:
-            if pygame.font.match_font(font): return font
-        return None
-        
     def load_pieces_from_db(self, order_p1, order_p2):
-        """データベースから駒の定義を読み込み、駒オブジェクトのリストを生成する"""
+        """駒の定義と画像（プロセス内でキャッシュ済み）から、初期配置の盤面を生成する"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cur = conn.cursor()
-            cur.execute("SELECT name, move_list, image_path FROM piece_definitions")
-            rows = cur.fetchall()
-            conn.close()
+            piece_definitions = self.catalog.definitions()
+            # 色付け・回転済みの駒画像は一度だけ作り、対局をまたいで使い回す
+            self.sprite_cache = self.catalog.sprite_cache()
         except sqlite3.OperationalError as e:
             print(f"データベースエラー: {e}")
             self.current_scene.switch_to_scene(None)
-            return []
+            return None
         
-        piece_definitions = {name: (move_list, image_path) for name, move_list, image_path in rows}
-        piece_size = CELL_SIZE - 2 * MARGIN
-        loaded_pieces = []
-
-        def load_image_with_full_path(relative_path):
-            full_path = os.path.join(PROJECT_ROOT, relative_path)
-            return pygame.image.load(full_path)
-
-        for i, name in enumerate(order_p1):
-            if name.strip() == "" or name not in piece_definitions:
-                continue
-            move_str, image_path = piece_definitions[name]
-            img = load_image_with_full_path(image_path)
-            loaded_pieces.append({"pos": (5, i), "move_list": [int(c) for c in move_str], "img": pygame.transform.scale(img, (piece_size, piece_size)), "team": "player1", "name": name})
-        
-        for i, name in enumerate(order_p2):
-            if name.strip() == "" or name not in piece_definitions:
-                continue
-            move_str, image_path = piece_definitions[name]
-            img = load_image_with_full_path(image_path)
-            col = COLS - 1 - i
-            loaded_pieces.append({"pos": (1, col), "move_list": [int(c) for c in move_str], "img": pygame.transform.scale(img, (piece_size, piece_size)), "team": "player2", "name": name})
-        return loaded_pieces
+        return Board.from_orders(order_p1, order_p2, piece_definitions)
 
     def setup_game(self, p1_university, p2_university):
         """指定された大学の駒編成でゲームを準備する"""
         order_p1 = UNIVERSITY_DATA.get(p1_university, [])
         order_p2 = UNIVERSITY_DATA.get(p2_university, [])
         
-        self.pieces = self.load_pieces_from_db(order_p1, order_p2)
-        if not self.pieces: return
+        board = self.load_pieces_from_db(order_p1, order_p2)
+        if board is None or not board.pieces: return
         
-        self.turn = "player1"
-        self.capture_count = {"player1": 0, "player2": 0}
+        self.board = board
         self.winner = None
-        self.turn_count = 0
-        self.position_history = {}
+        self.finish_record()
+        try:
+            from game_record import RecordWriter
+            self.recorder = RecordWriter(RECORDS_PATH, p1_university, p2_university, board)
+        except OSError as e:
+            print(f"棋譜を保存できません: {e}")
+        if self.game_mode == "online":
+            # 手の送受信と、相手との局面の食い違いの検出・同期はホスト（対戦サーバー経由ならサーバー）の局面を正とする
+            from protocol import MatchSync
+            authoritative = self.player_role == "player1" and not self.dedicated_server
+            on_update = None
+            if authoritative:
+                # ホストは観戦を受け付け、盤面が変わるたびに観戦者へ流す
+                from spectate import SpectatorHub
+                self.spectators = SpectatorHub(self.shared_data, board, p1_university, p2_university)
+                on_update = self.spectators.publish
+            self.match = MatchSync(board, self.player_role, self.client.send, authoritative=authoritative, on_update=on_update)
+        if self.game_mode == "spectate":
+            # 観戦者は自分では指さず、ホストから届いた手と局面を反映するだけ（最初の局面が届くまで待つ）
+            from protocol import MatchSync
+            self.match = MatchSync(board, None, self.client.send, authoritative=False)
+            self.match.awaiting_snapshot = True
+        if self.game_mode == "cpu":
+            # 探索用のプロセスはCPU対戦を始めるときに初めて用意する
+            from engine_service import EngineService
+            self.stop_engine()
+            self.engine = EngineService()
 
     def draw_text(self, text, font, color, center_pos):
-        """画面に中央揃えのテキストを描画する"""
-        text_surface = font.render(text, True, color)
+        """画面に中央揃えのテキストを描画する（同じ文字列の描画結果は使い回す）"""
+        text_surface = self.text_cache.render(text, font, color)
         text_rect = text_surface.get_rect(center=center_pos)
         self.screen.blit(text_surface, text_rect)
\ No newline at end of file
@@ -0,0 +1,310 @@
+# src/game_record.py
+# 棋譜の保存形式。1つのファイルに対局を次々に追記していく。
+#
+#   対局 = ヘッダー + グループ + グループ + ...
+#   グループ = その時点の局面（Board.snapshot()） + 最大 interval 個の手（2バイト固定）
+#
+# どのグループも同じ大きさなので、n番目の手の位置は計算で求まり、
+# 局面を頭から再生しなくても「直前の局面を復元して最大 interval-1 手進める」だけで任意の手へ飛べる。
+# 手は1手ごとにファイルへ書き出し、ヘッダーの手数と結果は対局が終わったときに書き換える。
+# 途中で落ちた対局（手数が未確定）は、次に追記するときに途中まで書かれた手を切り捨てて手数を確定させる。
+#
+# 書き込み中は「棋譜ファイル名.tail」を排他ロックし、そこに最後の対局の先頭の位置を書いておく。
+# 追記を始めるときは最後の対局だけを確かめればよいので、対局数が増えても待たない。
+# 同じPCで2つ目のゲームを起動したときは、ロックできる別のファイル（games.2.usr など）に書く。
+
+import glob
+import mmap
+import os
+import struct
+
+from settings import RECORD_SNAPSHOT_INTERVAL
+from rules import SNAPSHOT_HEADER, CAPTURED
+
+RECORD_MAGIC = b"USRK"
+RECORD_VERSION = 1
+# 識別子, 形式のバージョン, 局面を挟む間隔, 駒の数, 結果, 記録した手の数, player1の大学, player2の大学
+RECORD_HEADER = struct.Struct("<4sBBBBH16s16s")
+RESULT_OFFSET = 7  # ヘッダー内の「結果」と「手の数」の位置（終局時に書き換える）
+ENTRY = struct.Struct("<BB")  # 駒のID, 移動先のマス
+NO_MOVE = 0xFF  # 局面が手以外で変わった（オンライン対戦の同期）ときに、グループの残りを埋める印
+UNFINISHED = 0xFFFF  # 手の数がまだ確定していない
+
+# ヘッダーに1バイトで記録する結果（0は不明。中断した対局など）
+RESULTS = (None, "player1", "player2", "Draw (Repetition)", "Draw (Turn Limit)", "Draw (Disconnected)")
+TAIL = struct.Struct("<Q")  # .tail ファイルの中身（最後の対局の先頭の位置）
+
+
+class RecordFormatError(ValueError):
+    """棋譜ファイルとして読めない"""
+
+
+class GameRecord:
+    """棋譜ファイル中の1局（ファイルの内容を読むだけで、コピーはしない）"""
+
+    __slots__ = ("data", "offset", "interval", "piece_count", "snapshot_size", "group_size", "result", "entry_count",
+                 "p1_university", "p2_university")
+
+    def __init__(self, data, offset):
+        if len(data) - offset < RECORD_HEADER.size:
+            raise RecordFormatError("ヘッダーが途中で切れています")
+        magic, version, interval, piece_count, result, entries, p1, p2 = RECORD_HEADER.unpack_from(data, offset)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION or interval == 0:
+            raise RecordFormatError(f"棋譜ではないデータです（位置 {offset}）")
+        self.data = data
+        self.offset = offset
+        self.interval = interval
+        self.piece_count = piece_count
+        self.snapshot_size = SNAPSHOT_HEADER.size + piece_count
+        self.group_size = self.snapshot_size + interval * ENTRY.size
+        self.result = RESULTS[result] if result < len(RESULTS) else None
+        self.p1_university = p1.rstrip(b"\0").decode("utf-8")
+        self.p2_university = p2.rstrip(b"\0").decode("utf-8")
+        # 手の数が確定していなければ、最後まで書き切れている手だけを数える
+        self.entry_count = entries if entries != UNFINISHED else self._complete_entries(len(data) - offset)
+
+    @property
+    def finished(self):
+        return RECORD_HEADER.unpack_from(self.data, self.offset)[5] != UNFINISHED
+
+    def byte_size(self):
+        """この対局がファイル上で占めるバイト数"""
+        groups, rest = divmod(self.entry_count, self.interval)
+        return RECORD_HEADER.size + groups * self.group_size + self.snapshot_size + rest * ENTRY.size
+
+    def _complete_entries(self, available):
+        """途中で途切れた対局の、最後まで書けている手の数"""
+        body = available - RECORD_HEADER.size - self.snapshot_size
+        if body < 0:
+            raise RecordFormatError("最初の局面が途中で切れています")
+        # 最初の局面のあとは「interval 個の手 + 局面」の繰り返し
+        full, rest = divmod(body, self.interval * ENTRY.size + self.snapshot_size)
+        entries = rest // ENTRY.size
+        if entries >= self.interval:
+            # グループの手は書き切ったが、次の局面が途中で切れている（最後の手は捨てる）
+            entries = self.interval - 1
+        return full * self.interval + entries
+
+    def _group_offset(self, group):
+        return self.offset + RECORD_HEADER.size + group * self.group_size
+
+    def entry(self, index):
+        """index番目の記録（駒のID, 移動先のマス）。手以外で局面が変わった印なら (NO_MOVE, NO_MOVE)"""
+        group, i = divmod(index, self.interval)
+        return ENTRY.unpack_from(self.data, self._group_offset(group) + self.snapshot_size + i * ENTRY.size)
+
+    def entry_bytes(self):
+        """全ての記録を、グループの間の局面を除いてつなげたbytes（2バイトずつ 駒のID, 移動先のマス）"""
+        parts = []
+        for group in range(-(-self.entry_count // self.interval)):
+            start = self._group_offset(group) + self.snapshot_size
+            size = min(self.interval, self.entry_count - group * self.interval) * ENTRY.size
+            parts.append(self.data[start:start + size])
+        return b"".join(parts)
+
+    def moves(self):
+        """記録した手を順に (駒のID, 移動先のマス) で返す（同期の印は除く）"""
+        for index in range(self.entry_count):
+            piece_id, to_sq = self.entry(index)
+            if piece_id != NO_MOVE:
+                yield piece_id, to_sq
+
+    def snapshot_at(self, group):
+        """group番目のグループの先頭の局面"""
+        start = self._group_offset(group)
+        return bytes(self.data[start:start + self.snapshot_size])
+
+    def seek(self, board, index):
+        """board（この対局と同じ駒編成）を、index個目の記録まで進めた局面にする。
+        直前の局面を復元して最大 interval-1 手進めるだけなので、手数によらずほぼ一定の時間で済む"""
+        from bitboard import pos_of
+        index = max(0, min(index, self.entry_count))
+        group = index // self.interval
+        board.restore(self.snapshot_at(group))
+        for i in range(group * self.interval, index):
+            piece_id, to_sq = self.entry(i)
+            if piece_id != NO_MOVE:
+                board.move_piece(piece_id, pos_of(to_sq))
+        return board
+
+
+def iter_records(data, start=0, end=None):
+    """棋譜ファイルの内容（bytes または mmap）に含まれる対局を順に返す。末尾の壊れた部分は無視する。
+    start には対局の先頭の位置を渡すと、そこから end の手前までに始まる対局だけを返す"""
+    offset = start
+    end = len(data) if end is None else end
+    while offset < end and offset + RECORD_HEADER.size <= len(data):
+        try:
+            record = GameRecord(data, offset)
+        except RecordFormatError:
+            return
+        yield record
+        offset += record.byte_size()
+
+
+def open_records(path):
+    """棋譜ファイルを読み取り専用でメモリに対応付け、(mmap, 対局のリスト) を返す（ファイルがなければ空）"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None, []
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return data, list(iter_records(data))
+
+
+def record_files(path):
+    """path と、同時に起動したゲームが書いた棋譜ファイル（games.2.usr など）のうち、存在するものを番号順に返す"""
+    stem, ext = os.path.splitext(path)
+    numbered = []
+    for other in glob.glob(f"{glob.escape(stem)}.*{ext}"):
+        number = other[len(stem) + 1:len(other) - len(ext)]
+        if number.isdigit():
+            numbered.append((int(number), other))
+    return [p for p in [path] + [other for _number, other in sorted(numbered)] if os.path.exists(p)]
+
+
+def _lock(f):
+    """ファイルを排他ロックする（他のプロセスがロックしていればFalse）。ロックはファイルを閉じると外れる"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _last_record(data, tail_offset):
+    """最後の対局（なければNone）。tail_offset の位置に対局がなければ、ヘッダーを先頭から順にたどる"""
+    if tail_offset is not None:
+        try:
+            record = GameRecord(data, tail_offset)
+        except RecordFormatError:
+            pass
+        else:
+            if record.offset + record.byte_size() >= len(data) or not record.finished:
+                return record
+    last = None
+    for last in iter_records(data):
+        pass
+    return last
+
+
+def repair_tail(path, tail_offset=None):
+    """途中で終わった最後の対局の手の数を確定させ、途中まで書かれた部分を切り捨てる。追記してよい位置を返す。
+    tail_offset に最後の対局の先頭の位置を渡すと、その対局だけを確かめる"""
+    if not os.path.exists(path):
+        return 0
+    end = 0
+    unfinished = None  # (対局の先頭の位置, 確定させる手の数)
+    data = None
+    if os.path.getsize(path):
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data is not None:
+        record = _last_record(data, tail_offset)
+        if record is not None:
+            if not record.finished:
+                unfinished = (record.offset, record.entry_count)
+            end = record.offset + record.byte_size()
+        data.close()
+    with open(path, "r+b") as f:
+        if unfinished is not None:
+            f.seek(unfinished[0] + RESULT_OFFSET)
+            f.write(struct.pack("<BH", 0, unfinished[1]))
+        f.truncate(end)
+    return end
+
+
+class RecordWriter:
+    """対局を棋譜ファイルの末尾に書いていく。update(board) を盤面が変わるたびに呼ぶと、
+    前の局面との差から指した手を求めて書く（手では説明できない変化は同期の印と新しい局面として残す）"""
+
+    def __init__(self, path, p1_university, p2_university, board, interval=RECORD_SNAPSHOT_INTERVAL):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.interval = interval
+        path, self.tail = self._open_tail(path)
+        self.path = path
+        data = self.tail.read(TAIL.size)
+        self.offset = repair_tail(path, TAIL.unpack(data)[0] if len(data) == TAIL.size else None)
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self.file.seek(self.offset)
+        self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, interval, len(board.pieces), 0, UNFINISHED,
+                                           p1_university.encode("utf-8"), p2_university.encode("utf-8")))
+        self.last_snapshot = board.snapshot()
+        self.file.write(self.last_snapshot)
+        self.file.flush()
+        self.tail.seek(0)
+        self.tail.write(TAIL.pack(self.offset))
+        self.tail.flush()
+        self.entry_count = 0
+
+    @staticmethod
+    def _open_tail(path):
+        """ロックできた棋譜ファイルと、その .tail ファイル（ロックを持ったまま開いておく）を返す。
+        path を別のゲームが書いていれば games.2.usr, games.3.usr ... の順に試す"""
+        stem, ext = os.path.splitext(path)
+        candidate, number = path, 1
+        while True:
+            tail_path = candidate + ".tail"
+            tail = open(tail_path, "r+b" if os.path.exists(tail_path) else "w+b")
+            if _lock(tail):
+                return candidate, tail
+            tail.close()
+            number += 1
+            candidate = f"{stem}.{number}{ext}"
+
+    def update(self, board):
+        """盤面の変化を記録する"""
+        snapshot = board.snapshot()
+        move = _single_move(self.last_snapshot, snapshot)
+        self.last_snapshot = snapshot
+        if move is not None:
+            self._write_entry(*move, snapshot)
+            return
+        # 手では説明できない変化: グループの残りを印で埋め、次のグループの先頭に新しい局面を置く
+        while True:
+            self._write_entry(NO_MOVE, NO_MOVE, snapshot)
+            if self.entry_count % self.interval == 0:
+                break
+        self.file.flush()
+
+    def _write_entry(self, piece_id, to_sq, snapshot):
+        self.file.write(ENTRY.pack(piece_id, to_sq))
+        self.entry_count += 1
+        if self.entry_count % self.interval == 0:
+            self.file.write(snapshot)
+        if piece_id != NO_MOVE:
+            self.file.flush()
+
+    def finish(self, winner):
+        """手の数と結果をヘッダーに書き、ファイルを閉じる"""
+        result = RESULTS.index(winner) if winner in RESULTS else 0
+        self.file.seek(self.offset + RESULT_OFFSET)
+        self.file.write(struct.pack("<BH", result, self.entry_count))
+        self.file.close()
+        self.tail.close()
+
+
+def _single_move(before, after):
+    """2つの局面の差が1手分（ターン数が1つ進み、駒が1つ動き、取られた駒があればその移動先にいた駒だけ）なら
+    (駒のID, 移動先のマス) を返す"""
+    if SNAPSHOT_HEADER.unpack_from(after)[3] != SNAPSHOT_HEADER.unpack_from(before)[3] + 1:
+        return None
+    moved = None
+    captured_from = None
+    for i in range(SNAPSHOT_HEADER.size, len(after)):
+        old, new = before[i], after[i]
+        if old == new:
+            continue
+        if old == CAPTURED or (new == CAPTURED and captured_from is not None) or (new != CAPTURED and moved is not None):
+            return None
+        if new == CAPTURED:
+            captured_from = old
+        else:
+            moved = (i - SNAPSHOT_HEADER.size, new)
+    if moved is None or captured_from not in (None, moved[1]):
+        return None
+    return moved
@@ -0,0 +1,212 @@
+# src/loadgen.py
+# 対戦サーバーに多数の模擬クライアントをつなぎ、同時対局数・1秒あたりの手数・手の中継にかかる時間を測る
+# 使い方: python loadgen.py --clients 200 --duration 10
+# （--server を省略すると、別プロセスで対戦サーバーを起動して計測する）
+
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+from settings import UNIVERSITY_DATA, DB_PATH, TEAMS
+from rules import Board, load_piece_definitions
+from transport import ReliableEndpoint
+from network import SharedData, EndpointDriver
+import protocol
+
+
+class SimulatedClient:
+    """対戦サーバーにつなぎ、対局が終わるたびに次の対局を申し込み、ランダムな手を指し続けるクライアント"""
+
+    def __init__(self, generator, server_address, rng):
+        self.generator = generator
+        self.server_address = server_address
+        self.rng = rng
+        self.endpoint = ReliableEndpoint(0, '127.0.0.1')
+        self.driver = EndpointDriver(generator.shared_data.loop, self.endpoint, self.on_messages, self.on_disconnect)
+        self.reset()
+
+    def reset(self):
+        self.team = None
+        self.match_id = None
+        self.my_choice = None
+        self.opponent_choice = None
+        self.sync = None
+        self.play_scheduled = False
+
+    def start(self):
+        self.driver.send(protocol.Hello(), self.server_address)
+
+    def send(self, message):
+        self.driver.send(message, self.server_address)
+
+    def on_messages(self, messages):
+        for message, _addr in messages:
+            kind = type(message)
+            if kind is protocol.Matched:
+                self.reset()
+                self.team = TEAMS[message.team]
+                self.match_id = message.match_id
+                self.my_choice = self.rng.choice(list(UNIVERSITY_DATA))
+                self.send(protocol.Choice(self.my_choice))
+            elif kind is protocol.Choice:
+                self.opponent_choice = message.university
+                p1, p2 = (self.my_choice, self.opponent_choice) if self.team == "player1" else (self.opponent_choice, self.my_choice)
+                board = Board.from_orders(UNIVERSITY_DATA[p1], UNIVERSITY_DATA[p2], self.generator.piece_definitions)
+                self.sync = protocol.MatchSync(board, self.team, self.send, authoritative=False)
+            elif kind is protocol.Resign:
+                self.finish()
+                continue
+            elif self.sync is not None:
+                if kind is protocol.Move:
+                    self.generator.record_delivery(self.match_id, message.ply)
+                self.sync.receive(message)
+            self.after_update()
+
+    def on_disconnect(self, _addr):
+        self.generator.stats["disconnects"] += 1
+
+    def after_update(self):
+        """対局が終わっていれば次を申し込み、自分の手番なら手を指す予定を入れる"""
+        if self.sync is None:
+            return
+        if self.sync.board.winner is not None:
+            self.finish()
+        elif self.sync.can_play() and not self.play_scheduled:
+            self.play_scheduled = True
+            self.generator.shared_data.loop.call_at(time.monotonic() + self.generator.think_time, self.play)
+
+    def play(self):
+        self.play_scheduled = False
+        if self.sync is None or not self.sync.can_play():
+            return None
+        moves = self.sync.board.legal_moves()
+        if not moves:
+            return None
+        self.generator.record_send(self.match_id, self.sync.board.turn_count)
+        self.sync.play(*self.rng.choice(moves))
+        self.after_update()
+        return None
+
+    def finish(self):
+        if self.sync is not None:
+            self.generator.stats["games"] += 1
+        self.reset()
+        self.start()
+
+
+class LoadGenerator:
+    """模擬クライアントをまとめて動かし、計測値を集める（クライアントの処理は全て通信ループのスレッド1つで行う）"""
+
+    def __init__(self, server_address, clients, think_time, seed=None):
+        self.piece_definitions = load_piece_definitions(DB_PATH)
+        self.shared_data = SharedData()
+        self.think_time = think_time
+        self.sent_at = {}  # (対局番号, 手数) -> 送った時刻
+        self.latencies = []
+        self.measuring = False
+        self.stats = {"games": 0, "moves": 0, "disconnects": 0}
+        rng = random.Random(seed)
+        self.clients = [SimulatedClient(self, server_address, random.Random(rng.random())) for _ in range(clients)]
+
+    def record_send(self, match_id, ply):
+        self.sent_at[(match_id, ply)] = time.monotonic()
+
+    def record_delivery(self, match_id, ply):
+        sent = self.sent_at.pop((match_id, ply), None)
+        if sent is not None and self.measuring:
+            self.latencies.append(time.monotonic() - sent)
+            self.stats["moves"] += 1
+
+    def run(self, duration, warmup):
+        """warmup 秒だけ動かしてから duration 秒間計測し、結果の辞書を返す"""
+        for client in self.clients:
+            client.start()
+        time.sleep(warmup)
+        self.stats.update(games=0, moves=0)
+        self.latencies = []
+        self.measuring = True
+        samples = []
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            time.sleep(min(0.5, duration))
+            samples.append(sum(1 for c in self.clients if c.sync is not None and c.sync.board.winner is None) / 2)
+        elapsed = time.monotonic() - start
+        self.measuring = False
+        self.shared_data.stop()
+
+        latencies = sorted(self.latencies)
+        return {
+            "clients": len(self.clients),
+            "duration_s": elapsed,
+            "matches_in_progress_avg": sum(samples) / len(samples) if samples else 0.0,
+            "matches_in_progress_min": min(samples, default=0),
+            "games_finished": self.stats["games"],
+            "moves": self.stats["moves"],
+            "moves_per_s": self.stats["moves"] / elapsed,
+            "move_latency_ms": {
+                "p50": _percentile(latencies, 0.50) * 1000,
+                "p99": _percentile(latencies, 0.99) * 1000,
+                "max": (latencies[-1] if latencies else 0.0) * 1000,
+            },
+            "disconnects": self.stats["disconnects"],
+        }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _run_server(conn, stop_event):
+    """別プロセスで対戦サーバーを動かし、使っているポートと最後に集計を返す"""
+    from match_server import MatchServer
+    server = MatchServer(0, broadcast=False)
+    conn.send(server.port)
+    stop_event.wait()
+    conn.send(dict(server.stats))
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="対戦サーバーに負荷をかけて、同時対局数・手数/秒・中継の遅延を測る")
+    parser.add_argument("--clients", type=int, default=100, help="模擬クライアントの数（2人で1局）")
+    parser.add_argument("--duration", type=float, default=10.0, help="計測する時間（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="計測を始める前に動かしておく時間（秒）")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="各クライアントが手を指すまでの待ち時間（ミリ秒）")
+    parser.add_argument("--server", default=None, help="計測する対戦サーバー（ホスト:ポート）。省略すると自分で起動する")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--json", default=None, help="結果を書き出すJSONファイル")
+    args = parser.parse_args()
+
+    server_process = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        server_address = (host, int(port))
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        stop_event = ctx.Event()
+        server_process = ctx.Process(target=_run_server, args=(child_conn, stop_event), daemon=True)
+        server_process.start()
+        server_address = ("127.0.0.1", parent_conn.recv())
+
+    result = LoadGenerator(server_address, args.clients, args.think_ms / 1000, args.seed).run(args.duration, args.warmup)
+    if server_process is not None:
+        stop_event.set()
+        result["server_stats"] = parent_conn.recv()
+        server_process.join()
+
+    latency = result["move_latency_ms"]
+    print(f"クライアント {result['clients']} / 同時対局 平均{result['matches_in_progress_avg']:.1f} (最小{result['matches_in_progress_min']:.1f}) / "
+          f"終局 {result['games_finished']} / {result['moves_per_s']:.0f} 手/秒 / "
+          f"中継の遅延 p50 {latency['p50']:.2f}ms p99 {latency['p99']:.2f}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
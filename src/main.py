@@ -1,7 +1,12 @@
+import time
+
+# 起動時間の計測はモジュールの読み込みより前から始める
+START_TIME = time.perf_counter()
+
 from game_logic import Game
 
 if __name__ == "__main__":
     # Gameクラスのインスタンスを作成
-    game_instance = Game()
+    game_instance = Game(start_time=START_TIME)
     # ゲームのメインループを開始
     game_instance.run()
\ No newline at end of file
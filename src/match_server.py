@@ -0,0 +1,165 @@
+# src/match_server.py
+# 画面を持たない対戦サーバー。多数の対局を同時に進め、到着順に対局相手を決め、手を検証してから相手に中継する
+# 使い方: python match_server.py --port 60002
+
+import argparse
+import collections
+import time
+
+from settings import MATCH_SERVER_PORT, DISCOVERY_KIND_SERVER, UNIVERSITY_DATA, DB_PATH, TEAMS
+from rules import Board, load_piece_definitions
+from bitboard import pos_of
+from transport import ReliableEndpoint
+from network import SharedData, EndpointDriver, broadcast_presence
+import protocol
+
+STATS_INTERVAL = 5.0  # 集計を表示する間隔（秒）
+
+
+class Match:
+    """サーバー上の1局。両者の大学が決まると盤面を作る"""
+
+    __slots__ = ("match_id", "players", "choices", "board")
+
+    def __init__(self, match_id, players):
+        self.match_id = match_id
+        self.players = players  # [player1のアドレス, player2のアドレス]
+        self.choices = [None, None]
+        self.board = None
+
+    def team_of(self, addr):
+        return self.players.index(addr)
+
+    def opponent_of(self, addr):
+        return self.players[1 - self.players.index(addr)]
+
+
+class MatchServer:
+    """対戦サーバー本体。ソケット1つと通信ループ1つで全ての対局を扱う（盤面の処理もループのスレッドで行う）"""
+
+    def __init__(self, port=MATCH_SERVER_PORT, piece_definitions=None, broadcast=True):
+        self.piece_definitions = piece_definitions if piece_definitions is not None else load_piece_definitions(DB_PATH)
+        self.shared_data = SharedData()
+        self.endpoint = ReliableEndpoint(port)
+        self.port = self.endpoint.port
+        self.driver = EndpointDriver(self.shared_data.loop, self.endpoint, self.on_messages, self.on_disconnect)
+        self.waiting = collections.deque()  # 対局相手を待っているプレイヤーのアドレス
+        self.matches = {}  # プレイヤーのアドレス -> Match
+        self.next_match_id = 1
+        self.stats = collections.Counter()
+        if broadcast:
+            broadcast_presence(self.shared_data, self.port, DISCOVERY_KIND_SERVER)
+
+    def serve_forever(self):
+        """Ctrl+C で止めるまで動かし、一定間隔で集計を表示する"""
+        print(f"対戦サーバーをポート {self.port} で起動しました。")
+        last = dict(self.stats)
+        try:
+            while self.shared_data.is_running:
+                time.sleep(STATS_INTERVAL)
+                moves = self.stats["moves"] - last.get("moves", 0)
+                last = dict(self.stats)
+                print(f"対局中 {self.active_matches()} / 待機 {len(self.waiting)} / "
+                      f"終局 {self.stats['finished']} / {moves / STATS_INTERVAL:.0f} 手/秒 / 不正な手 {self.stats['rejected']}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.shared_data.stop()
+
+    def active_matches(self):
+        return len(self.matches) // 2
+
+    def on_messages(self, messages):
+        for message, addr in messages:
+            kind = type(message)
+            if kind is protocol.Hello:
+                self._enqueue(addr)
+                continue
+            match = self.matches.get(addr)
+            if match is None:
+                continue
+            if kind is protocol.Move:
+                self._handle_move(match, addr, message)
+            elif kind is protocol.Choice:
+                self._handle_choice(match, addr, message)
+            elif kind is protocol.SyncRequest:
+                if match.board is not None:
+                    self.driver.send(protocol.snapshot_of(match.board), addr)
+            elif kind is protocol.Resign:
+                self.driver.send(message, match.opponent_of(addr))
+                self._finish(match)
+
+    def on_disconnect(self, addr):
+        """切断したプレイヤーは投了したものとして相手に知らせる"""
+        if addr in self.waiting:
+            self.waiting.remove(addr)
+        match = self.matches.get(addr)
+        if match is not None:
+            self.driver.send(protocol.Resign(), match.opponent_of(addr))
+            self._finish(match)
+        self.stats["disconnects"] += 1
+
+    def _enqueue(self, addr):
+        """到着順に2人ずつ対局を組む（先に来た方が player1）"""
+        if addr in self.matches or addr in self.waiting:
+            return
+        if not self.waiting:
+            self.waiting.append(addr)
+            return
+        players = [self.waiting.popleft(), addr]
+        match = Match(self.next_match_id, players)
+        self.next_match_id += 1
+        for team, player in enumerate(players):
+            self.matches[player] = match
+            self.driver.send(protocol.Matched(team, match.match_id), player)
+        self.stats["started"] += 1
+
+    def _handle_choice(self, match, addr, choice):
+        """大学の選択を相手に伝え、両者が決まったら盤面を作る"""
+        if choice.university not in UNIVERSITY_DATA:
+            return
+        match.choices[match.team_of(addr)] = choice.university
+        self.driver.send(choice, match.opponent_of(addr))
+        if match.board is None and None not in match.choices:
+            p1, p2 = match.choices
+            match.board = Board.from_orders(UNIVERSITY_DATA[p1], UNIVERSITY_DATA[p2], self.piece_definitions)
+
+    def _handle_move(self, match, addr, move):
+        """手を検証して盤面に反映し、サーバーの局面キーを付けて相手に中継する"""
+        board = match.board
+        if board is None or TEAMS[match.team_of(addr)] != board.turn or move.ply != board.turn_count \
+                or not protocol.is_legal_move(board, move):
+            # 食い違った側にはサーバーの局面を送って揃えさせる
+            self.stats["rejected"] += 1
+            if board is not None:
+                self.driver.send(protocol.snapshot_of(board), addr)
+            return
+        board.move_piece(move.piece_id, pos_of(move.to_sq))
+        self.stats["moves"] += 1
+        if board.zobrist_key != move.position_hash:
+            self.stats["resyncs"] += 1
+            self.driver.send(protocol.snapshot_of(board), addr)
+        self.driver.send(move._replace(position_hash=board.zobrist_key), match.opponent_of(addr))
+        if board.winner is not None:
+            self._finish(match)
+
+    def _finish(self, match):
+        for player in match.players:
+            if self.matches.get(player) is match:
+                del self.matches[player]
+        self.stats["finished"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大学将棋の対戦サーバー")
+    parser.add_argument("--port", type=int, default=MATCH_SERVER_PORT, help="待ち受けるポート")
+    parser.add_argument("--no-broadcast", action="store_true", help="LANへの存在通知をしない")
+    args = parser.parse_args()
+    MatchServer(args.port, broadcast=not args.no_broadcast).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
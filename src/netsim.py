@@ -0,0 +1,212 @@
+# src/netsim.py
+# パケットロスと遅延のある回線を localhost 上で再現し、transport の配送遅延とオーバーヘッドを測る
+# 使い方: python netsim.py --loss 0.2 --delay 30 --jitter 10 --messages 500
+
+import argparse
+import heapq
+import json
+import random
+import socket
+import struct
+import threading
+import time
+
+from transport import ReliableEndpoint, MAX_PACKET_SIZE
+
+# 計測用のメッセージ（番号, 送信時刻）。後ろを埋めて実際のMOVEメッセージ程度の大きさにする
+PROBE = struct.Struct("!Id")
+PROBE_SIZE = 16
+
+
+class LossyLink:
+    """2つの端点の間に入り、パケットを確率で捨てたり遅らせたりして中継する。
+    side_a に送ったパケットは side_b から b_addr へ、side_b に送ったパケットは side_a から a_addr へ届く"""
+
+    def __init__(self, loss, delay, jitter, seed=None):
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.side_a = self._bind()
+        self.side_b = self._bind()
+        self.a_addr = None
+        self.b_addr = None
+        self.pending = []  # (届ける時刻, 通し番号, 送るソケット, パケット, 宛先)
+        self.counter = 0
+        self.dropped = 0
+        self.forwarded = 0
+        self.running = True
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._receive, args=(self.side_a, True), daemon=True),
+                        threading.Thread(target=self._receive, args=(self.side_b, False), daemon=True),
+                        threading.Thread(target=self._deliver, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def address_for_a(self):
+        """端点Aが相手として使うアドレス"""
+        return self.side_a.getsockname()
+
+    def address_for_b(self):
+        """端点Bが相手として使うアドレス"""
+        return self.side_b.getsockname()
+
+    def close(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.side_a.close()
+        self.side_b.close()
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(0.05)
+        return sock
+
+    def _receive(self, sock, from_a):
+        while self.running:
+            try:
+                packet, addr = sock.recvfrom(MAX_PACKET_SIZE)
+            except socket.timeout:
+                continue
+            with self.lock:
+                if from_a:
+                    self.a_addr = addr
+                    out_sock, dest = self.side_b, self.b_addr
+                else:
+                    self.b_addr = addr
+                    out_sock, dest = self.side_a, self.a_addr
+                if dest is None or self.rng.random() < self.loss:
+                    self.dropped += 1
+                    continue
+                due = time.monotonic() + max(0.0, self.delay + self.rng.uniform(-self.jitter, self.jitter))
+                self.counter += 1
+                heapq.heappush(self.pending, (due, self.counter, out_sock, packet, dest))
+
+    def _deliver(self):
+        while self.running:
+            now = time.monotonic()
+            ready = []
+            with self.lock:
+                while self.pending and self.pending[0][0] <= now:
+                    ready.append(heapq.heappop(self.pending))
+            for _due, _n, sock, packet, dest in ready:
+                sock.sendto(packet, dest)
+                self.forwarded += 1
+            time.sleep(0.001)
+
+
+def _pump(endpoint, stop, on_payload):
+    """受信と再送を回し続ける（network.Server.receive_loop と同じ動き）"""
+    while not stop.is_set():
+        payloads, _addr = endpoint.recv_once(0.01)
+        for payload in payloads:
+            on_payload(payload)
+        endpoint.tick()
+
+
+def run_simulation(messages, interval, loss, delay, jitter, seed=None, settle_timeout=10.0):
+    """Aから messages 個のメッセージを interval 秒ごとに送り、Bでの到着を計測して結果の辞書を返す"""
+    link = LossyLink(loss, delay, jitter, seed)
+    a = ReliableEndpoint(0, '127.0.0.1')
+    b = ReliableEndpoint(0, '127.0.0.1')
+    # 中継先は最初から決めておく（片方が送るまで反対向きの宛先がわからない状態を避ける）
+    link.b_addr = b.sock.getsockname()
+    link.a_addr = a.sock.getsockname()
+
+    received = []
+    stop = threading.Event()
+
+    def on_b(payload):
+        index, sent_at = PROBE.unpack_from(payload)
+        received.append((index, time.monotonic() - sent_at))
+
+    pumps = [threading.Thread(target=_pump, args=(a, stop, lambda payload: None), daemon=True),
+             threading.Thread(target=_pump, args=(b, stop, on_b), daemon=True)]
+    for thread in pumps:
+        thread.start()
+
+    peer = link.address_for_a()
+    start = time.monotonic()
+    for i in range(messages):
+        payload = PROBE.pack(i, time.monotonic()).ljust(PROBE_SIZE, b"\0")
+        a.send(payload, peer)
+        time.sleep(interval)
+    deadline = time.monotonic() + settle_timeout
+    while len(received) < messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    for thread in pumps:
+        thread.join()
+    link.close()
+    channel_a = next(iter(a.channels.values()), None)
+    channel_b = next(iter(b.channels.values()), None)
+    a.close()
+    b.close()
+
+    latencies = sorted(latency for _index, latency in received)
+    stats_a = channel_a.stats if channel_a else None
+    stats_b = channel_b.stats if channel_b else None
+    wire_bytes = (stats_a.bytes_sent if stats_a else 0) + (stats_b.bytes_sent if stats_b else 0)
+    payload_bytes = stats_a.payload_bytes_sent if stats_a else 0
+    return {
+        "messages": messages,
+        "delivered": len(received),
+        "in_order": [index for index, _latency in received] == list(range(len(received))),
+        "loss": loss,
+        "delay_ms": delay * 1000,
+        "jitter_ms": jitter * 1000,
+        "elapsed_s": elapsed,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50) * 1000,
+            "p95": _percentile(latencies, 0.95) * 1000,
+            "p99": _percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        "retransmissions": stats_a.retransmissions if stats_a else 0,
+        "duplicates_dropped": stats_b.duplicates if stats_b else 0,
+        "packets_on_wire": (stats_a.packets_sent if stats_a else 0) + (stats_b.packets_sent if stats_b else 0),
+        "dropped_by_link": link.dropped,
+        "overhead_ratio": wire_bytes / payload_bytes if payload_bytes else 0.0,
+    }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ロス・遅延のある回線で transport の配送遅延とオーバーヘッドを測る")
+    parser.add_argument("--messages", type=int, default=300, help="送るメッセージの数")
+    parser.add_argument("--interval", type=float, default=5.0, help="送信間隔（ミリ秒）")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.1, 0.3], help="パケットロス率（複数指定可）")
+    parser.add_argument("--delay", type=float, default=20.0, help="片道の遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=5.0, help="遅延の揺らぎ（ミリ秒）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--json", default=None, help="結果を書き出すJSONファイル")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'ロス率':>6} {'到着':>9} {'順序':>4} {'p50':>8} {'p99':>8} {'最大':>8} {'再送':>6} {'オーバーヘッド':>8}")
+    for loss in args.loss:
+        result = run_simulation(args.messages, args.interval / 1000, loss, args.delay / 1000, args.jitter / 1000, args.seed)
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"{loss:>6.0%} {result['delivered']:>4}/{result['messages']:<4} {'OK' if result['in_order'] else 'NG':>4} "
+              f"{latency['p50']:>6.1f}ms {latency['p99']:>6.1f}ms {latency['max']:>6.1f}ms "
+              f"{result['retransmissions']:>6} {result['overhead_ratio']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if any(result["delivered"] < result["messages"] or not result["in_order"] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
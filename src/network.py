@@ -1,96 +1,319 @@
 # network.py
 
+import heapq
+import selectors
 import socket
 import threading
 import queue
 import time
-from settings import DISCOVERY_PORT, GAME_PORT, DISCOVERY_MESSAGE
+from settings import DISCOVERY_PORT, GAME_PORT, DISCOVERY_MESSAGE, DISCOVERY_KIND_HOST
+from transport import ReliableEndpoint
+import protocol
+
+# 自分の存在を知らせるブロードキャストの間隔（秒）
+BROADCAST_INTERVAL = 1.0
+# 探索用のソケットを片付けるか確認する間隔（秒）
+DISCOVERY_CHECK_INTERVAL = 0.5
+
+class NetworkLoop:
+    """探索用と対局用のソケットを1つのスレッドの selectors でまとめて待つ。
+    ソケットの読み込みとタイマーの呼び出しは全てこのスレッドで行い、stop() ですぐに止まる"""
+
+    def __init__(self, shared_data):
+        self.shared_data = shared_data
+        self.selector = selectors.DefaultSelector()
+        # stop() や別スレッドからの登録のときに、select で眠っているループを起こすためのソケット
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, self._drain_wakeup)
+        self.lock = threading.Lock()
+        self.timers = []  # (呼ぶ時刻, 通し番号, 関数)
+        self.timer_counter = 0
+        self.sockets = []
+        self.thread = None
+
+    def add_reader(self, sock, callback):
+        """sock にデータが届いたら callback(sock) を呼ぶ。sock は stop() のときに閉じる"""
+        sock.setblocking(False)
+        with self.lock:
+            self.sockets.append(sock)
+            self.selector.register(sock, selectors.EVENT_READ, callback)
+        self._start()
+        self.wake()
+
+    def remove_reader(self, sock):
+        """sock の監視をやめて閉じる"""
+        with self.lock:
+            if sock in self.sockets:
+                self.sockets.remove(sock)
+                self.selector.unregister(sock)
+                sock.close()
+
+    def call_at(self, when, callback):
+        """time.monotonic() が when になったら callback() を呼ぶ。callback が時刻を返すと、その時刻にまた呼ぶ"""
+        with self.lock:
+            self.timer_counter += 1
+            heapq.heappush(self.timers, (when, self.timer_counter, callback))
+        self._start()
+        self.wake()
+
+    def call_soon(self, callback):
+        """次のループで callback() を呼ぶ（別スレッドの処理を通信ループに任せるとき用）"""
+        self.call_at(time.monotonic(), callback)
+
+    def wake(self):
+        """select で待っているループを起こす（ループのスレッド自身から呼んだときは何もしない）"""
+        if self.thread is threading.current_thread():
+            return
+        try:
+            self.wakeup_send.send(b"\0")
+        except OSError:
+            # 送信バッファが一杯なら、未読の通知が残っているので起こす必要はない
+            pass
+
+    def stop(self):
+        """ループを止め、登録された全てのソケットを閉じる（ループのスレッドの終了を待つ）"""
+        self.shared_data.is_running = False
+        self.wake()
+        if self.thread is None:
+            self._close()
+        elif self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _drain_wakeup(self, sock):
+        try:
+            while sock.recv(64):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _run(self):
+        while self.shared_data.is_running:
+            with self.lock:
+                next_due = self.timers[0][0] if self.timers else None
+            timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+            for key, _mask in self.selector.select(timeout):
+                if not self.shared_data.is_running:
+                    break
+                try:
+                    key.data(key.fileobj)
+                except OSError as e:
+                    print(f"通信エラー: {e}")
+            self._run_timers()
+        self._close()
+
+    def _run_timers(self):
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.timers and self.timers[0][0] <= now:
+                due.append(heapq.heappop(self.timers)[2])
+        for callback in due:
+            if not self.shared_data.is_running:
+                return
+            next_time = callback()
+            if next_time is not None:
+                with self.lock:
+                    self.timer_counter += 1
+                    heapq.heappush(self.timers, (next_time, self.timer_counter, callback))
+
+    def _close(self):
+        with self.lock:
+            for sock in self.sockets:
+                self.selector.unregister(sock)
+                sock.close()
+            self.sockets.clear()
+            self.timers.clear()
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
+        print("通信ループを停止しました。")
+
+class EndpointDriver:
+    """ReliableEndpoint を通信ループにつなぐ。届いたメッセージは解釈して on_messages([(メッセージ, 送信元), ...]) にまとめて渡し、
+    切断とみなした相手のアドレスは on_disconnect に渡す。再送・PINGは必要になる時刻にだけ行う"""
+
+    def __init__(self, loop, endpoint, on_messages, on_disconnect):
+        self.loop = loop
+        self.endpoint = endpoint
+        self.on_messages = on_messages
+        self.on_disconnect = on_disconnect
+        self.tick_due = None
+        loop.add_reader(endpoint.sock, self.on_readable)
+
+    def send(self, message, addr):
+        """protocol のメッセージを確実に届ける（どのスレッドから呼んでもよい）"""
+        self.schedule_tick(self.endpoint.send(protocol.encode(message), addr))
+
+    def on_readable(self, _sock):
+        """届いているパケットを全て処理し、メッセージをまとめて渡す"""
+        messages = []
+        for data, addr in self.endpoint.recv_ready():
+            try:
+                messages.append((protocol.decode(data), addr))
+            except protocol.ProtocolError as e:
+                print(f"受信したメッセージを解釈できません: {e}")
+        if messages:
+            self.on_messages(messages)
+        # 受信で予定が早まることはない（ACKやPINGは時刻を後ろにずらすだけ）ので、
+        # 予定がないとき（初めての相手から届いたとき）だけ全ての通信路を調べる
+        if self.tick_due is None:
+            self.schedule_tick()
+
+    def schedule_tick(self, deadline=None):
+        """次の再送・PING・切断判定の時刻にtickが呼ばれるようにする。
+        deadline を省略すると全ての通信路を調べて決める"""
+        if deadline is None:
+            deadline = self.endpoint.next_deadline()
+        if deadline is not None and (self.tick_due is None or deadline < self.tick_due):
+            self.tick_due = deadline
+            self.loop.call_at(deadline, lambda: self._on_timer(deadline))
+
+    def _on_timer(self, deadline):
+        # 後からもっと早い予定を入れ直した場合、古いタイマーは何もしない
+        if deadline == self.tick_due:
+            self.tick()
+
+    def tick(self):
+        """再送とPINGを送り、切断した相手を知らせる"""
+        self.tick_due = None
+        for addr in self.endpoint.tick():
+            self.on_disconnect(addr)
+        self.schedule_tick()
 
 class SharedData:
     def __init__(self):
-        self.found_hosts = {}
+        self.found_hosts = {}  # (IP, ポート) -> 種類（DISCOVERY_KIND_*）
         self.is_running = True
         self.connection_established = False
+        # 通信は全てこのループ（スレッド1つ）で処理する
+        self.loop = NetworkLoop(self)
+
+    def stop(self):
+        """通信を全て止める"""
+        self.loop.stop()
 
 class Server:
-    def __init__(self, q: queue.Queue, client_instance, shared_data: SharedData, port: int):
+    def __init__(self, q: queue.Queue, client_instance, shared_data: SharedData, port: int, on_message=None):
         self.q = q
+        # メッセージを受け取るたびに呼ぶ関数（メインループを起こすため）
+        self.on_message = on_message
         self.client = client_instance
         self.shared_data = shared_data
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(('0.0.0.0', port))
-        
-        # ★★★ 1秒のタイムアウトを設定 ★★★
-        # これにより、recvfromが永遠に待機するのを防ぎ、is_runningフラグを確認できるようになる
-        self.sock.settimeout(1.0)
-
-        self.my_port = self.sock.getsockname()[1]
-        self.thread = threading.Thread(target=self.receive_loop, daemon=True)
-        self.thread.start()
-
-    def receive_loop(self):
-        while self.shared_data.is_running:
-            try:
-                msg_bytes, cli_addr = self.sock.recvfrom(1024)
-                msg_str = msg_bytes.decode('utf-8')
-                
-                if self.client.target_address is None and msg_str.startswith("HELLO:"):
-                    try:
-                        client_listening_port = int(msg_str.split(':')[1])
-                        self.client.target_address = (cli_addr[0], client_listening_port)
-                        self.shared_data.connection_established = True
-                        self.q.put("CONNECTION_OK")
-                    except (ValueError, IndexError):
-                        print(f"不正なHELLOメッセージ: {msg_str}")
-                else:
-                    self.q.put(msg_str)
-            
-            except socket.timeout:
-                # タイムアウトは正常。ループを続けて is_running をチェックする
-                continue
-            except Exception:
-                break
-        self.sock.close()
-        print("サーバーソケットを閉じました。")
+        # 対局中は1つのソケットで送受信する（ACK・再送・重複除去・切断検知は transport が行う）
+        self.endpoint = ReliableEndpoint(port)
+        self.sock = self.endpoint.sock
+        self.driver = EndpointDriver(shared_data.loop, self.endpoint, self.on_messages, self.on_disconnect)
+        self.client.driver = self.driver
+
+        self.my_port = self.endpoint.port
+
+    def on_messages(self, messages):
+        """届いたメッセージをキューに入れ、メインループは1回だけ起こす"""
+        delivered = False
+        for message, cli_addr in messages:
+            delivered |= self.handle_message(message, cli_addr)
+        if delivered and self.on_message:
+            self.on_message()
+
+    def on_disconnect(self, addr):
+        """対戦相手（または対戦サーバー）が切断していれば知らせる"""
+        if addr == self.client.target_address:
+            self.q.put("DISCONNECTED")
+            if self.on_message:
+                self.on_message()
+
+    def handle_message(self, message, cli_addr):
+        """メッセージをキューに入れる。キューに入れたらTrueを返す"""
+        if self.client.target_address is None and isinstance(message, protocol.Hello):
+            # 相手は送信と受信に同じソケットを使うので、送信元のアドレスにそのまま返信する
+            self.client.target_address = cli_addr
+            self.shared_data.connection_established = True
+            self.q.put("CONNECTION_OK")
+        elif cli_addr == self.client.target_address:
+            self.q.put(message)
+        else:
+            # 対戦相手以外からのパケットは無視し、通信路も残さない
+            self.endpoint.forget(cli_addr)
+            return False
+        return True
 
 class Client:
     def __init__(self, q: queue.Queue, target_address=None):
         self.q = q
         self.target_address = target_address
+        # Serverを作ると、そのソケットで送受信する EndpointDriver が設定される
+        self.driver = None
 
-    def send(self, msg: str):
-        if self.target_address:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.sendto(msg.encode('utf-8'), self.target_address)
+    def send(self, message):
+        """protocol のメッセージを相手に送る"""
+        if self.target_address and self.driver:
+            self.driver.send(message, self.target_address)
 
-def broadcast_presence(shared_data: SharedData):
+def broadcast_presence(shared_data: SharedData, port=GAME_PORT, kind=DISCOVERY_KIND_HOST, until_connected=True):
+    """自分の存在を一定間隔でブロードキャストする（通信ループのタイマーで動く）。
+    until_connected が真なら接続されたところで、偽なら通信を止めるまで続ける"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     broadcast_address = ('<broadcast>', DISCOVERY_PORT)
-    while shared_data.is_running and not shared_data.connection_established:
-        message = f"{DISCOVERY_MESSAGE}:{GAME_PORT}".encode('utf-8')
-        sock.sendto(message, broadcast_address)
-        time.sleep(1)
-    sock.close()
-    print("ブロードキャストスレッドを停止しました。")
+    message = f"{DISCOVERY_MESSAGE}:{port}:{kind}".encode('utf-8')
+
+    def discard(_sock):
+        # 送信専用なので、届いたものは読み捨てる（残すと select が返り続ける）
+        try:
+            while sock.recv(1024):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    # 接続前に stop() されても閉じられるように、通信ループに登録しておく
+    shared_data.loop.add_reader(sock, discard)
+
+    def send_presence():
+        if until_connected and shared_data.connection_established:
+            shared_data.loop.remove_reader(sock)
+            print("ブロードキャストを停止しました。")
+            return None
+        try:
+            sock.sendto(message, broadcast_address)
+        except OSError as e:
+            print(f"ブロードキャストエラー: {e}")
+        return time.monotonic() + BROADCAST_INTERVAL
+
+    shared_data.loop.call_at(time.monotonic(), send_presence)
 
 def listen_for_hosts(shared_data: SharedData):
+    """ホストのブロードキャストを受け取り、found_hosts に記録する（通信ループで動く）"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(('0.0.0.0', DISCOVERY_PORT))
-    sock.settimeout(1.0)
-    while shared_data.is_running and not shared_data.connection_established:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = data.decode('utf-8')
+
+    def on_readable(_sock):
+        while True:
+            try:
+                data, addr = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            message = data.decode('utf-8', errors='replace')
             if message.startswith(DISCOVERY_MESSAGE):
                 parts = message.split(':')
-                port = int(parts[1])
-                host_ip = addr[0]
-                shared_data.found_hosts[host_ip] = port
-        except socket.timeout:
-            continue
-        except Exception as e:
-            print(f"探索エラー: {e}")
-            break
-    sock.close()
-    print("ホスト探索スレッドを停止しました。")
\ No newline at end of file
+                try:
+                    kind = parts[2] if len(parts) > 2 else DISCOVERY_KIND_HOST
+                    shared_data.found_hosts[(addr[0], int(parts[1]))] = kind
+                except (ValueError, IndexError):
+                    print(f"不正な探索メッセージ: {message}")
+
+    def close_when_connected():
+        if shared_data.connection_established:
+            shared_data.loop.remove_reader(sock)
+            print("ホスト探索を停止しました。")
+            return None
+        return time.monotonic() + DISCOVERY_CHECK_INTERVAL
+
+    shared_data.loop.add_reader(sock, on_readable)
+    shared_data.loop.call_at(time.monotonic() + DISCOVERY_CHECK_INTERVAL, close_when_connected)
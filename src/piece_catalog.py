@@ -0,0 +1,80 @@
+# src/piece_catalog.py
+
+import os
+import sqlite3
+import threading
+
+import pygame
+
+from settings import DB_PATH, PROJECT_ROOT, CELL_SIZE, MARGIN
+from rules import load_piece_definitions
+from sprites import SpriteCache
+
+
+class PieceCatalog:
+    """pieces.db の駒の定義と駒画像をプロセス内で一度だけ読み込んで保持する。
+    pieces.db の更新日時が変わったときだけ読み直す"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.piece_definitions = None
+        self.raw_images = {}  # 文字 -> 読み込んだだけの画像（変換・縮小前）
+        self.sprites = None
+        self.warm_thread = None
+
+    def definitions(self):
+        """駒の定義 {名前: (move_list文字列, 画像パス)} を返す"""
+        with self.lock:
+            self._refresh()
+            return self.piece_definitions
+
+    def sprite_cache(self):
+        """全ての駒の色付け・回転済み画像を返す（初回だけ作る）"""
+        with self.lock:
+            self._refresh()
+            if self.sprites is None:
+                self._load_raw_images()
+                piece_size = CELL_SIZE - 2 * MARGIN
+                self.sprites = SpriteCache({name: pygame.transform.scale(image.convert_alpha(), (piece_size, piece_size))
+                                            for name, image in self.raw_images.items()})
+            return self.sprites
+
+    def warm_up_async(self):
+        """メニュー表示中に、駒の定義と画像の読み込みを裏のスレッドで済ませておく"""
+        if self.warm_thread is None or not self.warm_thread.is_alive():
+            self.warm_thread = threading.Thread(target=self._warm_up, daemon=True)
+            self.warm_thread.start()
+
+    def _warm_up(self):
+        try:
+            with self.lock:
+                self._refresh()
+                self._load_raw_images()
+        except (sqlite3.Error, OSError, pygame.error) as e:
+            print(f"駒データの事前読み込みに失敗しました: {e}")
+
+    def _refresh(self):
+        """pieces.db が更新されていれば読み直す（ロックを取った状態で呼ぶ）"""
+        try:
+            mtime = os.path.getmtime(self.db_path)
+        except OSError:
+            mtime = None
+        if self.piece_definitions is None or mtime != self.mtime:
+            self.piece_definitions = load_piece_definitions(self.db_path)
+            self.mtime = mtime
+            self.raw_images = {}
+            self.sprites = None
+
+    def _load_raw_images(self):
+        """まだ読み込んでいない駒画像を読み込む（ロックを取った状態で呼ぶ）"""
+        for name, (_move_str, image_path) in self.piece_definitions.items():
+            if name not in self.raw_images:
+                # pieces.db のパスはWindowsの区切り文字で保存されているため、OSに合わせて直す
+                relative_path = os.path.join(*image_path.replace("\\", "/").split("/"))
+                self.raw_images[name] = pygame.image.load(os.path.join(PROJECT_ROOT, relative_path))
+
+
+# プロセス全体で共有するインスタンス
+piece_catalog = PieceCatalog()
@@ -0,0 +1,190 @@
+# src/protocol.py
+
+import struct
+from collections import namedtuple
+
+from bitboard import square_of, pos_of
+
+# 形式を変えたら上げる（違うバージョン同士では通信しない）
+PROTOCOL_VERSION = 3
+
+HEADER = struct.Struct("!BB")  # バージョン, 種類
+MOVE_BODY = struct.Struct("!HBBQ")  # 手数, 駒のID, 移動先のマス, 指した後の局面キー
+PLY_BODY = struct.Struct("!H")
+HISTORY_ENTRY = struct.Struct("!QB")  # 局面キー, 出現回数
+MATCHED_BODY = struct.Struct("!BI")  # チーム, 対局番号
+MATCH_INFO_BODY = struct.Struct("!IB")  # 配信の番号, player1の大学名のバイト数
+
+# メッセージの種類
+HELLO, CHOICE, MOVE, RESIGN, SYNC_REQUEST, SNAPSHOT, MATCHED, MATCH_INFO, GAME_OVER = range(1, 10)
+
+Hello = namedtuple("Hello", [])
+Choice = namedtuple("Choice", ["university"])
+Move = namedtuple("Move", ["ply", "piece_id", "to_sq", "position_hash"])
+Resign = namedtuple("Resign", [])
+SyncRequest = namedtuple("SyncRequest", ["ply"])
+Snapshot = namedtuple("Snapshot", ["board_snapshot", "history"])  # history は (局面キー, 出現回数) のタプル
+Matched = namedtuple("Matched", ["team", "match_id"])  # 対戦サーバーが対局相手を決めたときに送る（team は 0/1）
+MatchInfo = namedtuple("MatchInfo", ["stream_id", "p1_university", "p2_university"])  # 観戦者に配信の番号と対局の大学を知らせる
+GameOver = namedtuple("GameOver", ["winner"])  # 観戦者に決着を知らせる
+
+
+class ProtocolError(ValueError):
+    """受け取ったデータが解釈できない（バージョン違い・壊れている）"""
+
+
+def encode(message):
+    """メッセージをbytesにする"""
+    kind = type(message)
+    if kind is Move:
+        return HEADER.pack(PROTOCOL_VERSION, MOVE) + MOVE_BODY.pack(*message)
+    if kind is Choice:
+        return HEADER.pack(PROTOCOL_VERSION, CHOICE) + message.university.encode("utf-8")
+    if kind is Hello:
+        return HEADER.pack(PROTOCOL_VERSION, HELLO)
+    if kind is Resign:
+        return HEADER.pack(PROTOCOL_VERSION, RESIGN)
+    if kind is SyncRequest:
+        return HEADER.pack(PROTOCOL_VERSION, SYNC_REQUEST) + PLY_BODY.pack(message.ply)
+    if kind is Snapshot:
+        history = b"".join(HISTORY_ENTRY.pack(key, min(count, 255)) for key, count in message.history)
+        return HEADER.pack(PROTOCOL_VERSION, SNAPSHOT) + bytes([len(message.board_snapshot)]) + message.board_snapshot + history
+    if kind is Matched:
+        return HEADER.pack(PROTOCOL_VERSION, MATCHED) + MATCHED_BODY.pack(*message)
+    if kind is MatchInfo:
+        p1, p2 = message.p1_university.encode("utf-8"), message.p2_university.encode("utf-8")
+        return HEADER.pack(PROTOCOL_VERSION, MATCH_INFO) + MATCH_INFO_BODY.pack(message.stream_id, len(p1)) + p1 + p2
+    if kind is GameOver:
+        return HEADER.pack(PROTOCOL_VERSION, GAME_OVER) + message.winner.encode("utf-8")
+    raise TypeError(f"送れないメッセージです: {message!r}")
+
+
+def decode(data):
+    """bytesをメッセージに戻す。解釈できなければ ProtocolError"""
+    if len(data) < HEADER.size:
+        raise ProtocolError("短すぎるメッセージ")
+    version, kind = HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"プロトコルのバージョンが違います（相手: {version}, 自分: {PROTOCOL_VERSION}）")
+    body = data[HEADER.size:]
+    try:
+        if kind == MOVE:
+            return Move(*MOVE_BODY.unpack(body))
+        if kind == CHOICE:
+            return Choice(body.decode("utf-8"))
+        if kind == HELLO:
+            return Hello()
+        if kind == RESIGN:
+            return Resign()
+        if kind == SYNC_REQUEST:
+            return SyncRequest(*PLY_BODY.unpack(body))
+        if kind == SNAPSHOT:
+            size = body[0]
+            board_snapshot = bytes(body[1:1 + size])
+            entries = body[1 + size:]
+            if len(board_snapshot) != size or len(entries) % HISTORY_ENTRY.size:
+                raise ProtocolError("壊れたSNAPSHOTメッセージ")
+            return Snapshot(board_snapshot, tuple(HISTORY_ENTRY.iter_unpack(entries)))
+        if kind == MATCHED:
+            return Matched(*MATCHED_BODY.unpack(body))
+        if kind == MATCH_INFO:
+            stream_id, size = MATCH_INFO_BODY.unpack_from(body)
+            names = bytes(body[MATCH_INFO_BODY.size:])
+            return MatchInfo(stream_id, names[:size].decode("utf-8"), names[size:].decode("utf-8"))
+        if kind == GAME_OVER:
+            return GameOver(body.decode("utf-8"))
+    except (struct.error, UnicodeDecodeError, IndexError) as e:
+        raise ProtocolError(f"壊れたメッセージ: {e}") from e
+    raise ProtocolError(f"不明なメッセージの種類: {kind}")
+
+
+def snapshot_of(board):
+    """盤面の局面を丸ごと送るためのメッセージを作る"""
+    return Snapshot(board.snapshot(), tuple(board.position_history.counts.items()))
+
+
+def is_legal_move(board, move):
+    """手番側の駒の合法手か（駒のIDや移動先が範囲外でもFalseを返す）"""
+    if board.winner is not None or not 0 <= move.piece_id < len(board.pieces):
+        return False
+    piece = board.pieces[move.piece_id]
+    if piece.sq is None or piece.team_name != board.turn:
+        return False
+    return pos_of(move.to_sq) in board.get_move_targets(move.piece_id)
+
+
+class MatchSync:
+    """オンライン対局の片側。自分の手を送り、届いた手を検証して盤面に反映する。
+    届いた手の手数・合法性・指した後の局面キーのどれかが食い違ったら、
+    authoritative 側（P2P対戦ではホスト、対戦サーバー経由ではサーバー）の局面を丸ごと送って両者を揃える"""
+
+    def __init__(self, board, team, send, authoritative, on_update=None):
+        self.board = board
+        self.team = team  # 観戦者は None（自分では指さない）
+        self.send = send
+        self.authoritative = authoritative
+        # 盤面が変わるたびに、その変化を表すメッセージ（指した後の局面キー付きのMove、またはSnapshot）を渡す
+        self.on_update = on_update
+        self.awaiting_snapshot = False  # 食い違いを見つけ、ホストからの局面を待っている
+        self.resyncs = 0
+
+    def can_play(self):
+        """いま自分が手を指してよいか"""
+        return self.board.turn == self.team and self.board.winner is None and not self.awaiting_snapshot
+
+    def play(self, piece_id, target_pos):
+        """自分の手を盤面に反映して相手に送る。駒を取った場合はTrueを返す"""
+        ply = self.board.turn_count
+        captured = self.board.move_piece(piece_id, target_pos)
+        move = Move(ply, piece_id, square_of(*target_pos), self.board.zobrist_key)
+        self.send(move)
+        self._updated(move)
+        return captured
+
+    def receive(self, message):
+        """相手からのメッセージを処理する。盤面が変わったらTrueを返す"""
+        kind = type(message)
+        if kind is Move:
+            return self._receive_move(message)
+        if kind is SyncRequest:
+            if self.authoritative:
+                self.send(self.snapshot())
+            return False
+        if kind is Snapshot and not self.authoritative:
+            self.board.restore(message.board_snapshot, message.history)
+            self.awaiting_snapshot = False
+            self.resyncs += 1
+            self._updated(message)
+            return True
+        return False
+
+    def snapshot(self):
+        """いまの局面を送るためのメッセージを作る"""
+        return snapshot_of(self.board)
+
+    def _receive_move(self, move):
+        board = self.board
+        if self.awaiting_snapshot or move.ply < board.turn_count:
+            # 局面の到着待ち、または反映済みの手
+            return False
+        if move.ply != board.turn_count or board.turn == self.team or not is_legal_move(board, move):
+            self._diverged()
+            return False
+        board.move_piece(move.piece_id, pos_of(move.to_sq))
+        if board.zobrist_key != move.position_hash:
+            self._diverged()
+        self._updated(move._replace(position_hash=board.zobrist_key))
+        return True
+
+    def _updated(self, message):
+        if self.on_update:
+            self.on_update(message)
+
+    def _diverged(self):
+        """相手と局面が食い違った。authoritative なら自分の局面を送り、そうでなければ相手に局面を求める"""
+        if self.authoritative:
+            self.resyncs += 1
+            self.send(self.snapshot())
+        else:
+            self.awaiting_snapshot = True
+            self.send(SyncRequest(self.board.turn_count))
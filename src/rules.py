@@ -0,0 +1,222 @@
+# src/rules.py
+
+import sqlite3
+import struct
+
+from settings import ROWS, COLS, MAX_TURNS, DB_PATH, TEAMS
+from bitboard import NUM_SQUARES, attack_table, neighbor_table, parse_move_mask, square_of, pos_of
+from zobrist import SIDE_KEY, piece_key, RepetitionTable
+
+
+def torus_wrap(r, c):
+    """座標が盤面からはみ出た場合に、反対側につなげる（トーラス）"""
+    return r % ROWS, c % COLS
+
+
+def opponent_of(team):
+    """相手チーム名を返す"""
+    return "player2" if team == "player1" else "player1"
+
+
+def load_piece_definitions(db_path=DB_PATH):
+    """データベースから駒の定義を読み込み、{名前: (move_list文字列, 画像パス)} を返す"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT name, move_list, image_path FROM piece_definitions")
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return {name: (move_list, image_path) for name, move_list, image_path in rows}
+
+
+# スナップショットの先頭部分（手番, player1の撃破数, player2の撃破数, ターン数）
+SNAPSHOT_HEADER = struct.Struct("<BBBH")
+CAPTURED = 0xFF  # スナップショットで盤外の駒を表すマス番号
+
+
+class Piece:
+    """駒1枚分のルール上の状態。画像は持たず、描画側が (文字, チーム) で引く"""
+
+    __slots__ = ("name", "team", "move_mask", "sq")
+
+    def __init__(self, name, team, move_mask, sq):
+        self.name = name            # 駒の文字
+        self.team = team            # 0: player1, 1: player2
+        self.move_mask = move_mask  # 動ける方向のビットマスク（ビットiがDIRECTIONS[i]に対応）
+        self.sq = sq                # マス番号（取られた駒はNone）
+
+    @property
+    def pos(self):
+        """(行, 列)。取られた駒はNone"""
+        return None if self.sq is None else pos_of(self.sq)
+
+    @property
+    def team_name(self):
+        """チーム名（"player1" / "player2"）"""
+        return TEAMS[self.team]
+
+
+class Board:
+    """pygameに依存しない盤面クラス。駒の配置、手番、撃破数、終局判定を管理する。
+    piecesのインデックスは駒のIDとして対局中ずっと変わらない（取られた駒はsqがNoneになる）"""
+
+    def __init__(self):
+        """空の盤面を作る"""
+        self.pieces = []
+        self.square_index = [None] * NUM_SQUARES  # マス番号 -> そのマスにある駒のID
+        self.occupancy = [0, 0]
+        self.turn = "player1"
+        self.capture_count = {"player1": 0, "player2": 0}
+        self.turn_count = 0
+        self.zobrist_key = 0
+        self.position_history = RepetitionTable()
+        self.winner = None
+
+    @classmethod
+    def from_orders(cls, order_p1, order_p2, piece_definitions):
+        """大学の駒編成（文字のリスト）から初期配置の盤面を生成する"""
+        board = cls()
+        for i, name in enumerate(order_p1):
+            if name.strip() == "" or name not in piece_definitions:
+                continue
+            board.add_piece(name, piece_definitions[name][0], "player1", (5, i))
+
+        for i, name in enumerate(order_p2):
+            if name.strip() == "" or name not in piece_definitions:
+                continue
+            col = COLS - 1 - i
+            board.add_piece(name, piece_definitions[name][0], "player2", (1, col))
+        return board
+
+    def add_piece(self, name, move_str, team, pos):
+        """駒を盤上に置き、その駒のIDを返す"""
+        piece_id = len(self.pieces)
+        team_index = TEAMS.index(team)
+        sq = square_of(*pos)
+        self.pieces.append(Piece(name, team_index, parse_move_mask(move_str), sq))
+        self.square_index[sq] = piece_id
+        self.occupancy[team_index] |= 1 << sq
+        self.zobrist_key ^= piece_key(name, team_index, sq)
+        return piece_id
+
+    def copy(self):
+        """シミュレーション用に盤面を複製する"""
+        board = Board()
+        board.pieces = [Piece(p.name, p.team, p.move_mask, p.sq) for p in self.pieces]
+        board.square_index = self.square_index[:]
+        board.occupancy = self.occupancy[:]
+        board.turn = self.turn
+        board.capture_count = dict(self.capture_count)
+        board.turn_count = self.turn_count
+        board.zobrist_key = self.zobrist_key
+        board.position_history = self.position_history.copy()
+        board.winner = self.winner
+        return board
+
+    def snapshot(self):
+        """駒の配置・手番・撃破数・ターン数を数十バイトのbytesにまとめる（駒の種類は対局中変わらないので含めない）"""
+        header = SNAPSHOT_HEADER.pack(TEAMS.index(self.turn), self.capture_count["player1"], self.capture_count["player2"], self.turn_count)
+        return header + bytes(CAPTURED if p.sq is None else p.sq for p in self.pieces)
+
+    def restore(self, snapshot, history=None):
+        """snapshotで保存した局面に戻す（同じ駒編成の盤面に対してのみ使える）。
+        history（局面キー -> 出現回数）を渡すと千日手の記録をそれで置き換え、渡さなければこの局面だけから数え直す。
+        どちらの場合も決着しているかを判定し直す"""
+        turn_index, captures_p1, captures_p2, self.turn_count = SNAPSHOT_HEADER.unpack_from(snapshot)
+        self.turn = TEAMS[turn_index]
+        self.capture_count = {"player1": captures_p1, "player2": captures_p2}
+        self.square_index = [None] * NUM_SQUARES
+        self.occupancy = [0, 0]
+        self.zobrist_key = SIDE_KEY if turn_index == 1 else 0
+        for piece_id, (piece, sq) in enumerate(zip(self.pieces, snapshot[SNAPSHOT_HEADER.size:])):
+            if sq == CAPTURED:
+                piece.sq = None
+                continue
+            piece.sq = sq
+            self.square_index[sq] = piece_id
+            self.occupancy[piece.team] |= 1 << sq
+            self.zobrist_key ^= piece_key(piece.name, piece.team, sq)
+        if history is not None:
+            self.position_history = RepetitionTable(dict(history))
+        else:
+            # 前の局面の記録が残ると、戻したあとに同じ手を指し直したときに千日手と誤判定する
+            self.position_history = RepetitionTable()
+            self.position_history.push(self.zobrist_key)
+        self.winner = self.end_condition(self.position_history.count(self.zobrist_key))
+
+    def piece_at(self, pos):
+        """指定したマスにある駒のIDを返す（なければNone）"""
+        return self.square_index[square_of(*pos)]
+
+    def active_pieces(self):
+        """盤上に残っている駒を (ID, 駒) の組で返す"""
+        return [(i, p) for i, p in enumerate(self.pieces) if p.sq is not None]
+
+    def get_move_targets(self, piece_index):
+        """指定した駒が移動できるマスを、移動先の表と味方の占有マスクから計算する"""
+        if piece_index is None: return []
+        piece = self.pieces[piece_index]
+        own = self.occupancy[piece.team]
+        return [pos_of(t) for t in neighbor_table(piece.move_mask, piece.team)[piece.sq] if not own >> t & 1]
+
+    def has_legal_move(self):
+        """手番側に動かせる駒があるかどうか（合法手を全て並べずに、1つ見つかった時点で返す）"""
+        turn_index = TEAMS.index(self.turn)
+        own = self.occupancy[turn_index]
+        for piece in self.pieces:
+            if piece.team == turn_index and piece.sq is not None and attack_table(piece.move_mask, turn_index)[piece.sq] & ~own:
+                return True
+        return False
+
+    def legal_moves(self):
+        """手番側の合法手を (駒のID, 移動先) のリストで返す"""
+        moves = []
+        turn_index = TEAMS.index(self.turn)
+        for i, piece in self.active_pieces():
+            if piece.team == turn_index:
+                moves.extend((i, target) for target in self.get_move_targets(i))
+        return moves
+
+    def move_piece(self, piece_index, target_pos):
+        """駒を動かし、ターンを進め、ゲーム終了条件をチェックする。駒を取った場合はTrueを返す"""
+        moving_piece = self.pieces[piece_index]
+        team_index = moving_piece.team
+        from_sq, target_sq = moving_piece.sq, square_of(*target_pos)
+        target_bit = 1 << target_sq
+        captured = False
+        if self.occupancy[1 - team_index] & target_bit:
+            # 取られた駒はリストから消さず、IDを保ったまま盤外（sq=None）にする
+            captured_piece = self.pieces[self.square_index[target_sq]]
+            captured_piece.sq = None
+            self.occupancy[1 - team_index] ^= target_bit
+            self.zobrist_key ^= piece_key(captured_piece.name, 1 - team_index, target_sq)
+            self.capture_count[TEAMS[team_index]] += 1
+            captured = True
+        self.square_index[from_sq] = None
+        self.square_index[target_sq] = piece_index
+        self.occupancy[team_index] ^= (1 << from_sq) | target_bit
+        self.zobrist_key ^= piece_key(moving_piece.name, team_index, from_sq) ^ piece_key(moving_piece.name, team_index, target_sq) ^ SIDE_KEY
+        moving_piece.sq = target_sq
+        self.turn = opponent_of(self.turn)
+        self.turn_count += 1
+        self.check_game_end_conditions()
+        return captured
+
+    def check_game_end_conditions(self):
+        """各種のゲーム終了条件をチェックし、決着していればwinnerを設定する"""
+        self.winner = self.end_condition(self.position_history.push(self.zobrist_key))
+
+    def end_condition(self, repetitions):
+        """撃破数・現在の局面の出現回数・ターン数から決着の結果を返す（決着していなければNone）。
+        手番側に動かせる駒がなければ手番側の負け（エンジン・終盤データベース・自己対戦も同じ規則で判定する）"""
+        for team, count in self.capture_count.items():
+            if count >= 3:
+                return team
+        if not self.has_legal_move():
+            return opponent_of(self.turn)
+        if repetitions >= 3:
+            return "Draw (Repetition)"
+        if self.turn_count >= MAX_TURNS:
+            return "Draw (Turn Limit)"
+        return None
@@ -1,9 +1,15 @@
+import pygame
+
 # すべてのシーンの基底クラス
 class BaseScene:
     # シーンの初期化処理
     def __init__(self, game):
         self.game = game
         self.next_scene = self
+        # 再描画が必要かどうか。dirty_rectsがNoneなら画面全体を反映する
+        self.dirty = True
+        self.dirty_rects = None
+        self.hovered_rect = None
 
     # ユーザーからの入力を処理
     def process_input(self, events, pressed_keys):
@@ -19,4 +25,33 @@ class BaseScene:
 
     # 次のシーンに切り替えるための処理
     def switch_to_scene(self, next_scene):
-        self.next_scene = next_scene
\ No newline at end of file
+        self.next_scene = next_scene
+
+    # 再描画が必要なことを記録する（rectを渡すとその範囲だけを画面に反映する）
+    def mark_dirty(self, rect=None):
+        if rect is None:
+            self.dirty_rects = None
+        elif not self.dirty:
+            self.dirty_rects = [rect]
+        elif self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
+        self.dirty = True
+
+    # 描画して画面に反映したあとに呼ぶ
+    def clear_dirty(self):
+        self.dirty = False
+        self.dirty_rects = None
+
+    # Trueのあいだはメインループがイベントを待って眠ってよい（探索中など毎フレーム確認が必要なときはFalse）
+    def is_idle(self):
+        return True
+
+    # マウスが乗っているボタンが変わったら、そのボタン（影を含む）の範囲だけ再描画を要求する
+    def update_hover(self, rects):
+        mouse_pos = pygame.mouse.get_pos()
+        hovered = next((rect for rect in rects if rect.collidepoint(mouse_pos)), None)
+        if hovered != self.hovered_rect:
+            for rect in (self.hovered_rect, hovered):
+                if rect is not None:
+                    self.mark_dirty(rect.union(rect.move(5, 5)))
+            self.hovered_rect = hovered
@@ -2,10 +2,14 @@
 
 import pygame
 import random
-import os
+import time
 from .scene_base import BaseScene
 from .scene_gameover import GameOverScene
 from settings import *
+from bitboard import Position, pos_of
+from rules import opponent_of
+from protocol import Resign, Hello, SyncRequest, MatchInfo, GameOver
+from tablebase import load_tablebase
 
 class GameScene(BaseScene):
     """メインの対局画面の処理を担当するクラス"""
@@ -16,32 +20,48 @@ class GameScene(BaseScene):
         self.selected_index = None
         self.is_flipped = False
         
-        try:
-            background_path = os.path.join(PROJECT_ROOT, 'images', 'wood_background.jpg')
-            self.background_image = pygame.image.load(background_path).convert()
-        except pygame.error:
-            self.background_image = None
+        self.background_image = self.game.assets.background()
             
         btn_w, btn_h = 200, 60
         btn_x = WIDTH + (INFO_PANEL_WIDTH - btn_w) / 2
         btn_y = HEIGHT - btn_h - 40
         self.ingame_menu_button = pygame.Rect(btn_x, btn_y, btn_w, btn_h)
+        self.shown_engine_depth = None
+        self.last_spectate_request = 0.0  # 観戦者が最後に参加・同期を頼んだ時刻
+        self.show_hint = True  # 終盤データベースの最善手を表示するか（Hキーで切り替え）
+        self.hint = None
+        self.hint_key = None
 
     def process_input(self, events, pressed_keys):
         """ユーザーの入力（クリック、キー入力）を処理する"""
-        if self.game.game_mode == "online" and self.game.turn != self.game.player_role:
+        self.update_hover([self.ingame_menu_button])
+        board = self.game.board
+        if self.game.game_mode == "spectate":
+            # 観戦中はメニューへ戻るボタンだけ使える
+            for event in events:
+                if event.type == pygame.MOUSEBUTTONDOWN and self.ingame_menu_button.collidepoint(event.pos):
+                    self.switch_to_scene(self.game.go_to_menu())
+                    return
+            return
+        if self.game.game_mode in ("online", "cpu") and board.turn != self.game.player_role:
+            return
+        if self.game.game_mode == "online" and not self.game.match.can_play():
+            # 局面の同期を待っている間は指せない
             return
 
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r and self.game.game_mode == "local":
                     self.is_flipped = not self.is_flipped
+                if event.key == pygame.K_h:
+                    self.show_hint = not self.show_hint
+                    self.mark_dirty()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if self.ingame_menu_button.collidepoint(event.pos):
                     if self.game.game_mode == "online":
                         self.game.winner = "player2" if self.game.player_role == "player1" else "player1"
-                        self.game.client.send("RESIGN")
+                        self.game.client.send(Resign())
                     else:
                         self.switch_to_scene(self.game.go_to_menu())
                     return
@@ -54,39 +74,88 @@ class GameScene(BaseScene):
                 clicked_row_logical, clicked_col_logical = self._visual_to_logical(clicked_row_visual, clicked_col_visual)
                 clicked_cell = (clicked_row_logical, clicked_col_logical)
 
-                clicked_piece_index = None
-                for i, piece in enumerate(self.game.pieces):
-                    if piece["pos"] == clicked_cell and piece["team"] == self.game.turn:
-                        clicked_piece_index = i
-                        break
+                clicked_piece_index = board.piece_at(clicked_cell)
+                if clicked_piece_index is not None and board.pieces[clicked_piece_index].team_name != board.turn:
+                    clicked_piece_index = None
                 
                 move_targets = self._get_move_targets()
                 if clicked_piece_index is not None:
                     self.selected_index = None if self.selected_index == clicked_piece_index else clicked_piece_index
                 elif self.selected_index is not None and clicked_cell in move_targets:
-                    original_index = self.selected_index
+                    if self.game.engine:
+                        self.game.engine.cancel()
                     self.move_piece(self.selected_index, clicked_cell)
-                    if self.game.game_mode == 'online':
-                        self.game.client.send(f"MOVE,{original_index},{clicked_row_logical},{clicked_col_logical}")
 
     def update(self):
-        """ゲーム状態の更新（相手の通信処理、勝敗判定）"""
-        if self.game.game_mode == 'online' and self.game.q and not self.game.q.empty():
-            msg = self.game.q.get()
-            parts = msg.split(',')
-            command = parts[0]
-            if command == "MOVE":
-                try:
-                    s_idx, r, c = map(int, parts[1:])
-                    self.move_piece(s_idx, (r, c))
-                except (ValueError, IndexError):
-                    print(f"不正なMOVEメッセージを受信: {msg}")
-            elif command == "RESIGN":
-                self.game.winner = self.game.player_role
+        """ゲーム状態の更新（相手の通信処理、CPUの手番、勝敗判定）"""
+        if self.game.game_mode == "cpu" and self.game.winner is None and self.game.board.turn != self.game.player_role:
+            # 探索は別プロセスで行い、ここでは結果が届いているかを確認するだけにする
+            engine = self.game.engine
+            if not engine.is_searching():
+                engine.start_search(Position.from_board(self.game.board))
+            best_move = engine.poll()
+            # 探索の深さの表示が変わったら情報パネルだけ描き直す
+            depth = engine.latest[2] if engine.latest else None
+            if depth != self.shown_engine_depth:
+                self.shown_engine_depth = depth
+                self.mark_dirty(pygame.Rect(WIDTH, 0, INFO_PANEL_WIDTH, HEIGHT))
+            if best_move is not None:
+                from_sq, to_sq = best_move
+                self.move_piece(self.game.board.piece_at(pos_of(from_sq)), pos_of(to_sq))
+            elif not engine.is_searching():
+                # 探索が手を返さずに終わった（指せる手がない）。探索し直し続けないよう、規則どおり手番側の負けにする
+                self.game.winner = opponent_of(self.game.board.turn)
+
+        if self.game.game_mode == 'online':
+            # 1フレームに届いたメッセージは全て処理する（決着したらそこでやめる）
+            for msg in self.game.network_messages():
+                if isinstance(msg, Resign):
+                    self.game.winner = self.game.player_role
+                elif msg == "DISCONNECTED":
+                    print("対戦相手との通信が途切れました。")
+                    self.game.winner = "Draw (Disconnected)"
+                elif self.game.match.receive(msg):
+                    # 相手の手、または同期のために送られてきた局面を反映した
+                    self.on_board_changed()
+                self.mark_dirty()
+                if self.game.winner is not None:
+                    break
+
+        if self.game.game_mode == "spectate":
+            self._update_spectator()
 
         if self.game.winner is not None:
+            if self.game.spectators:
+                self.game.spectators.publish(GameOver(self.game.winner))
+            self.game.finish_record()
             self.switch_to_scene(GameOverScene(self.game))
 
+    def _update_spectator(self):
+        """観戦中: ホストから届いた手と局面を反映する。最初の局面が届かない・取りこぼしたときは一定間隔で頼み直す"""
+        for msg in self.game.network_messages():
+            if isinstance(msg, MatchInfo):
+                if self.game.match is None:
+                    self.game.setup_game(msg.p1_university, msg.p2_university)
+            elif isinstance(msg, GameOver):
+                self.game.winner = msg.winner
+                return
+            elif self.game.match is not None and self.game.match.receive(msg):
+                self.on_board_changed()
+            self.mark_dirty()
+            if self.game.winner is not None:
+                return
+        match = self.game.match
+        now = time.monotonic()
+        if (match is None or match.awaiting_snapshot) and now - self.last_spectate_request >= SPECTATE_RETRY_INTERVAL:
+            self.last_spectate_request = now
+            self.game.client.send(Hello() if match is None else SyncRequest(match.board.turn_count))
+
+    def is_idle(self):
+        """CPUの探索結果や、観戦で最初の局面を待っている間は、毎フレーム確認する"""
+        if self.game.game_mode == "spectate" and (self.game.match is None or self.game.match.awaiting_snapshot):
+            return False
+        return not (self.game.engine and self.game.engine.is_searching())
+
     def _visual_to_logical(self, r_vis, c_vis):
         """見た目の座標を、内部的な論理座標に変換する"""
         is_p2_online_view = (self.game.game_mode == "online" and self.game.player_role == "player2")
@@ -110,52 +179,47 @@ class GameScene(BaseScene):
         if self.background_image: screen.blit(self.background_image, (0, 0))
         else: screen.fill((210, 180, 140))
 
+        board = self.game.board
         move_targets = self._get_move_targets()
         
-        show_highlight = self.game.game_mode == "local" or (self.game.game_mode == "online" and self.game.turn == self.game.player_role)
+        show_highlight = self.game.game_mode == "local" or (self.game.game_mode in ("online", "cpu") and board.turn == self.game.player_role)
         if self.selected_index is not None and show_highlight:
-            selected_pos_logical = self.game.pieces[self.selected_index]["pos"]
-            selected_pos_display = self._get_display_pos(*selected_pos_logical)
-            move_targets_display = {self._get_display_pos(*pos) for pos in move_targets}
-            for r_vis in range(ROWS):
-                for c_vis in range(COLS):
-                    rect = pygame.Rect(c_vis * CELL_SIZE, r_vis * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                    if (r_vis, c_vis) == selected_pos_display: pygame.draw.rect(screen, HIGHLIGHT_YELLOW, rect)
-                    elif (r_vis, c_vis) in move_targets_display: pygame.draw.rect(screen, HIGHLIGHT_GREEN, rect)
+            selected_pos_logical = board.pieces[self.selected_index].pos
+            # 選択中の駒のマスと、移動先の表で引いたマスだけを塗る
+            r_vis, c_vis = self._get_display_pos(*selected_pos_logical)
+            pygame.draw.rect(screen, HIGHLIGHT_YELLOW, (c_vis * CELL_SIZE, r_vis * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+            for pos in move_targets:
+                r_vis, c_vis = self._get_display_pos(*pos)
+                pygame.draw.rect(screen, HIGHLIGHT_GREEN, (c_vis * CELL_SIZE, r_vis * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+
+        hint = self._tablebase_hint()
+        if hint is not None and hint[2] != "draw":
+            # 最善手の駒と移動先を枠で囲む
+            for pos in (board.pieces[hint[0]].pos, hint[1]):
+                r_display, c_display = self._get_display_pos(*pos)
+                pygame.draw.rect(screen, HINT_ORANGE, (c_display * CELL_SIZE, r_display * CELL_SIZE, CELL_SIZE, CELL_SIZE), 5)
 
         for x in range(COLS + 1): pygame.draw.line(screen, GRID_COLOR, (x * CELL_SIZE, 0), (x * CELL_SIZE, HEIGHT), 2)
         for y in range(ROWS + 1): pygame.draw.line(screen, GRID_COLOR, (0, y * CELL_SIZE), (WIDTH, y * CELL_SIZE), 2)
         
-        for piece in self.game.pieces:
-            r_logical, c_logical = piece["pos"]
-            r_display, c_display = self._get_display_pos(r_logical, c_logical)
-            
-
-            # 元の画像を変更しないようにコピーを作成
-            img_to_draw = piece["img"].copy()
-            
-            # チームに応じて色を上乗せ（ティント）する
-            if piece["team"] == "player1":
-                img_to_draw.fill((50, 0, 0), special_flags=pygame.BLEND_RGB_ADD)
-            else: # player2
-                img_to_draw.fill((0, 0, 50), special_flags=pygame.BLEND_RGB_ADD)
-            
-            # 視点に応じて画像を180度回転させる
-            perspective_team = "player1"
-            if (self.game.game_mode == "online" and self.game.player_role == "player2") or \
-               (self.game.game_mode == "local" and self.is_flipped):
-                perspective_team = "player2"
-            
-            if piece["team"] != perspective_team:
-                img_to_draw = pygame.transform.rotate(img_to_draw, 180)
-            # ★★★ 修正ここまで ★★★
+        # 視点に応じて、相手側の駒は180度回転した画像を使う
+        perspective_team = 0
+        if (self.game.game_mode == "online" and self.game.player_role == "player2") or \
+           (self.game.game_mode == "local" and self.is_flipped):
+            perspective_team = 1
 
+        sprite_cache = self.game.sprite_cache
+        for _piece_id, piece in board.active_pieces():
+            r_logical, c_logical = piece.pos
+            r_display, c_display = self._get_display_pos(r_logical, c_logical)
+            # 色付け・回転済みの画像をキャッシュから取り出して貼るだけにする
+            img_to_draw = sprite_cache.get(piece.name, piece.team, piece.team != perspective_team)
             screen.blit(img_to_draw, (c_display * CELL_SIZE + MARGIN, r_display * CELL_SIZE + MARGIN))
         
-        self._draw_info_panel(screen)
+        self._draw_info_panel(screen, hint)
 
-    def _draw_info_panel(self, screen):
-        """情報パネルを描画する"""
+    def _draw_info_panel(self, screen, hint):
+        """情報パネルを描画する（hint は _tablebase_hint() の結果）"""
         panel_rect = pygame.Rect(WIDTH, 0, INFO_PANEL_WIDTH, HEIGHT)
         panel_bg_surface = pygame.Surface(panel_rect.size, pygame.SRCALPHA)
         panel_bg_surface.fill((0, 0, 0, 80))
@@ -164,21 +228,37 @@ class GameScene(BaseScene):
         info_panel_center_x = WIDTH + (INFO_PANEL_WIDTH / 2)
         y_pos = 100
         text_color = WHITE
+        board = self.game.board
         
         self.game.draw_text("撃破数", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 50
-        self.game.draw_text(f"Player1: {self.game.capture_count['player1']}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 40
-        self.game.draw_text(f"Player2: {self.game.capture_count['player2']}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
-        self.game.draw_text(f"ターン数: {self.game.turn_count}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        self.game.draw_text(f"Player1: {board.capture_count['player1']}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 40
+        self.game.draw_text(f"Player2: {board.capture_count['player2']}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        self.game.draw_text(f"ターン数: {board.turn_count}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
 
-        if self.game.game_mode == "online": turn_text = "あなたのターン" if self.game.turn == self.game.player_role else "相手のターン"
-        else: turn_text = f"{self.game.turn.replace('player', 'Player ')} のターン"
+        if self.game.game_mode in ("online", "spectate") and (self.game.match is None or self.game.match.awaiting_snapshot): turn_text = "局面を同期中..."
+        elif self.game.game_mode == "spectate": turn_text = f"{board.turn.replace('player', 'Player ')} のターン"
+        elif self.game.game_mode == "online": turn_text = "あなたのターン" if board.turn == self.game.player_role else "相手のターン"
+        elif self.game.game_mode == "cpu": turn_text = "あなたのターン" if board.turn == self.game.player_role else self._cpu_thinking_text()
+        else: turn_text = f"{board.turn.replace('player', 'Player ')} のターン"
         self.game.draw_text(f"{turn_text}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
         
-        if self.game.game_mode == "online":
+        if self.game.game_mode == "spectate":
+            self.game.draw_text("観戦中", self.game.font_game, text_color, (info_panel_center_x, y_pos))
+        elif self.game.game_mode in ("online", "cpu"):
             self.game.draw_text(f"あなたは {self.game.player_role.replace('player', 'Player ')}", self.game.font_game, text_color, (info_panel_center_x, y_pos))
         else:
             self.game.draw_text("Rキー: 視点反転", self.game.font_game, text_color, (info_panel_center_x, y_pos))
+        y_pos += 50
 
+        if hint is not None:
+            _piece_id, _target, result, distance = hint
+            hint_text = {"win": f"{distance}手で勝ち", "loss": f"{distance}手で負け", "draw": "引き分け"}[result]
+            self.game.draw_text(f"終盤DB: {hint_text}", self.game.font_game, text_color, (info_panel_center_x, y_pos))
+
+        self._draw_menu_button(screen)
+
+    def _draw_menu_button(self, screen):
+        """情報パネルの「メニューへ」ボタンを描画する"""
         mouse_pos = pygame.mouse.get_pos()
         is_hovering = self.ingame_menu_button.collidepoint(mouse_pos)
         btn_color = (210, 180, 140) if is_hovering else (196, 164, 132)
@@ -188,60 +268,46 @@ class GameScene(BaseScene):
         pygame.draw.rect(screen, btn_color, self.ingame_menu_button, border_radius=10)
         self.game.draw_text("メニューへ", self.game.font_game, btn_text_color, self.ingame_menu_button.center)
 
+    def _tablebase_hint(self):
+        """終盤データベースに載っている局面なら、手番側の最善手を (駒のID, 移動先, 結果, 手数) で返す。
+        盤面が変わったときだけ引き直す。対戦相手が人のオンライン対戦と観戦では出さない"""
+        board = self.game.board
+        if not (self.game.game_mode == "local" or (self.game.game_mode == "cpu" and board.turn == self.game.player_role)):
+            return None
+        tablebase = load_tablebase()
+        if tablebase is None or not self.show_hint or self.game.winner is not None:
+            return None
+        key = (board.zobrist_key, board.turn_count)
+        if key != self.hint_key:
+            self.hint_key = key
+            self.hint = tablebase.best_move(board)
+        return self.hint
+
+    def _cpu_thinking_text(self):
+        """CPUの手番に表示する文字列（探索の途中経過があれば深さも出す）"""
+        latest = self.game.engine.latest if self.game.engine else None
+        if latest is None:
+            return "CPUのターン"
+        return f"CPU思考中 (深さ{latest[2]})"
+
     def _get_move_targets(self):
         """選択中の駒が移動できるマスを計算する"""
-        if self.selected_index is None: return []
-        targets = []
-        piece = self.game.pieces[self.selected_index]
-        r0, c0 = piece["pos"]
-        for i, move in enumerate(piece["move_list"]):
-            if move:
-                dr, dc = self.game.directions[i]
-                if piece["team"] == "player2": dr *= -1; dc *= -1
-                tr, tc = self.torus_wrap(r0 + dr, c0 + dc)
-                is_target_vacant = True
-                for p in self.game.pieces:
-                    if p["pos"] == (tr, tc) and p["team"] == piece["team"]: is_target_vacant = False; break
-                if is_target_vacant: targets.append((tr, tc))
-        return targets
+        return self.game.board.get_move_targets(self.selected_index)
 
     def move_piece(self, piece_index, target_pos):
-        """駒を動かし、ターンを進め、ゲーム終了条件をチェックする"""
-        current_moving_piece_team = self.game.pieces[piece_index]["team"]
-        for i, p in enumerate(list(self.game.pieces)):
-            if p["pos"] == target_pos:
-                self.game.pieces.pop(i)
-                self.game.capture_count[current_moving_piece_team] += 1
-                if i < piece_index:
-                    piece_index -= 1
-                break
-        self.game.pieces[piece_index]["pos"] = target_pos
+        """駒を動かし（オンライン対戦では相手にも送る）、盤面の終局判定の結果をゲームに反映する"""
+        if self.game.game_mode == "online":
+            self.game.match.play(piece_index, target_pos)
+        else:
+            self.game.board.move_piece(piece_index, target_pos)
+        self.on_board_changed()
+
+    def on_board_changed(self):
+        """盤面が変わったあとの共通処理（選択の解除、描き直し、決着の反映）"""
+        board = self.game.board
         self.selected_index = None
-        self.game.turn = "player2" if self.game.turn == "player1" else "player1"
-        self.game.turn_count += 1
-        self._check_game_end_conditions()
-
-    def torus_wrap(self, r, c):
-        """座標が盤面からはみ出た場合に、反対側につなげる（トーラス）"""
-        return r % ROWS, c % COLS
-
-    def get_board_signature(self):
-        """現在の盤面を識別するための一意の署名（文字列）を生成する"""
-        state = sorted((p["team"], p["pos"]) for p in self.game.pieces)
-        return (str(state), self.game.turn, self.is_flipped)
-
-    def _check_game_end_conditions(self):
-        """各種のゲーム終了条件をチェックする"""
-        for team, count in self.game.capture_count.items():
-            if count >= 3:
-                self.game.winner = team
-                return
-        sig = self.get_board_signature()
-        history = self.game.position_history
-        history[sig] = history.get(sig, 0) + 1
-        if history[sig] >= 3:
-            self.game.winner = "Draw (Repetition)"
-            return
-        if self.game.turn_count >= MAX_TURNS:
-            self.game.winner = "Draw (Turn Limit)"
-            return
\ No newline at end of file
+        self.mark_dirty()
+        if self.game.recorder:
+            self.game.recorder.update(board)
+        if board.winner is not None:
+            self.game.winner = board.winner
@@ -1,7 +1,6 @@
 # scenes/scene_gameover.py
 
 import pygame
-import os
 from .scene_base import BaseScene
 from settings import *
 
@@ -13,11 +12,7 @@ class GameOverScene(BaseScene):
         super().__init__(game)
         
         # --- UI用の画像とフォントを準備 ---
-        try:
-            background_path = os.path.join(PROJECT_ROOT, 'images', 'wood_background.jpg')
-            self.background_image = pygame.image.load(background_path).convert()
-        except pygame.error:
-            self.background_image = None
+        self.background_image = self.game.assets.background()
         
         self.title_font = self.game.font_large
         self.winner_font = self.game.font_medium
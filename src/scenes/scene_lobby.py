@@ -2,11 +2,12 @@
 
 import pygame
 import queue
-import os
 from .scene_base import BaseScene
 from .scene_university_select import UniversitySelectScene
+from .scene_game import GameScene
 from settings import *
 from network import Client, Server
+from protocol import Hello, Matched
 
 class LobbyScene(BaseScene):
     """オンライン対戦の待合室画面"""
@@ -17,12 +18,7 @@ class LobbyScene(BaseScene):
         print(f"{self.game.player_role} としてロビーに入室しました。")
         
         # --- UI用の画像とフォントを準備 ---
-        try:
-            background_path = os.path.join(PROJECT_ROOT, 'images', 'wood_background.jpg')
-            self.background_image = pygame.image.load(background_path).convert()
-            self.background_image = pygame.transform.scale(self.background_image, (WIDTH + INFO_PANEL_WIDTH, HEIGHT))
-        except pygame.error:
-            self.background_image = None
+        self.background_image = self.game.assets.background()
 
         self.title_font = self.game.font_large
         self.prompt_font = self.game.font_medium
@@ -33,9 +29,16 @@ class LobbyScene(BaseScene):
         self.button_hover_color = (210, 180, 140)
         self.button_text_color = (50, 25, 0)
         self.button_text_white = WHITE
+        self.shown_hosts = {}
+        # 対戦サーバーに接続し、対局相手が決まるのを待っている
+        self.waiting_for_match = False
 
     def process_input(self, events, pressed_keys):
         """入力処理。戻るボタンやホスト選択ボタンの判定"""
+        hover_targets = [self.game.back_button]
+        if self.game.player_role == "player2" and not self.waiting_for_match:
+            hover_targets += [button_rect for button_rect, _, _ in self._host_buttons()]
+        self.update_hover(hover_targets)
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
                 # 戻るボタンのクリック判定
@@ -43,28 +46,62 @@ class LobbyScene(BaseScene):
                     self.switch_to_scene(self.game.go_to_menu())
                     return
 
-                # 【参加者側】ホスト選択のクリック判定
-                if self.game.player_role == "player2":
-                    for i, (host_ip, port) in enumerate(self.game.shared_data.found_hosts.items()):
-                        button_width = 500
-                        button_x = (WIDTH + INFO_PANEL_WIDTH) / 2 - button_width / 2
-                        button_rect = pygame.Rect(button_x, 150 + i*100, button_width, 80)
+                # 【参加者側】ホスト（または対戦サーバー）選択のクリック判定
+                if self.game.player_role == "player2" and not self.waiting_for_match:
+                    for button_rect, target_address, kind in self._host_buttons():
                         if button_rect.collidepoint(event.pos):
-                            target_address = (host_ip, port)
                             self.game.q = queue.Queue()
+                            if kind == DISCOVERY_KIND_SPECTATE:
+                                # 観戦: 対局者の通信路は使わず、ホストのマルチキャストを受け取る
+                                from spectate import SpectatorClient
+                                self.game.game_mode = "spectate"
+                                self.game.client = SpectatorClient(self.game.shared_data, self.game.q, target_address, on_message=self.game.wake)
+                                self.game.client.send(Hello())
+                                self.game.shared_data.connection_established = True
+                                self.switch_to_scene(GameScene(self.game))
+                                return
                             self.game.client = Client(self.game.q, target_address)
-                            self.game.server = Server(self.game.q, self.game.client, self.game.shared_data, 0)
-                            my_listening_port = self.game.server.my_port
-                            self.game.client.send(f"HELLO:{my_listening_port}")
+                            self.game.server = Server(self.game.q, self.game.client, self.game.shared_data, 0, on_message=self.game.wake)
+                            self.game.client.send(Hello())
                             self.game.shared_data.connection_established = True
-                            self.switch_to_scene(UniversitySelectScene(self.game))
+                            if kind == DISCOVERY_KIND_SERVER:
+                                # 対戦サーバーでは、先手・後手はサーバーが対局を組んだときに決まる
+                                self.game.dedicated_server = True
+                                self.waiting_for_match = True
+                                self.mark_dirty()
+                            else:
+                                self.switch_to_scene(UniversitySelectScene(self.game))
                             return
 
+    def _host_buttons(self):
+        """見つかったホストごとの (ボタンの範囲, (IP, ポート), 種類) を返す"""
+        button_width = 500
+        button_x = (WIDTH + INFO_PANEL_WIDTH) / 2 - button_width / 2
+        return [(pygame.Rect(button_x, 150 + i*100, button_width, 80), address, kind)
+                for i, (address, kind) in enumerate(list(self.game.shared_data.found_hosts.items()))]
+
     def update(self):
-        """【ホスト側】参加者からの接続を待つ"""
+        """【ホスト側】参加者からの接続を待つ。【参加者側】見つかったホストが変わったら描き直す"""
+        if self.waiting_for_match:
+            for msg in self.game.network_messages():
+                if isinstance(msg, Matched):
+                    self.game.player_role = TEAMS[msg.team]
+                    self.switch_to_scene(UniversitySelectScene(self.game))
+                    return
+                if msg == "DISCONNECTED":
+                    print("対戦サーバーとの通信が途切れました。")
+                    self.switch_to_scene(self.game.go_to_menu())
+                    return
+        elif self.game.player_role == "player2":
+            found_hosts = dict(self.game.shared_data.found_hosts)
+            if found_hosts != self.shown_hosts:
+                self.shown_hosts = found_hosts
+                self.mark_dirty()
         if self.game.player_role == "player1":
-            if self.game.q and not self.game.q.empty() and self.game.q.get() == "CONNECTION_OK":
-                self.switch_to_scene(UniversitySelectScene(self.game))
+            for msg in self.game.network_messages():
+                if msg == "CONNECTION_OK":
+                    self.switch_to_scene(UniversitySelectScene(self.game))
+                    return
 
     def draw(self, screen):
         """待合室の画面を描画する"""
@@ -78,19 +115,22 @@ class LobbyScene(BaseScene):
         is_hovering_back = self.game.back_button.collidepoint(mouse_pos)
         self._draw_button(screen, self.game.back_button, "← 戻る", is_hovering_back)
 
-        if self.game.player_role == "player1":
+        if self.game.player_role == "player1" or self.waiting_for_match:
             self.game.draw_text("対戦相手を待っています...", self.prompt_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, HEIGHT/2))
         else:
             self.game.draw_text("参加可能なゲーム", self.title_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, 80))
             if not self.game.shared_data.found_hosts:
                 self.game.draw_text("ゲームが見つかりません", self.prompt_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, HEIGHT/2))
             else:
-                for i, (host_ip, port) in enumerate(self.game.shared_data.found_hosts.items()):
-                    button_width = 500
-                    button_x = (WIDTH + INFO_PANEL_WIDTH) / 2 - button_width / 2
-                    button_rect = pygame.Rect(button_x, 150 + i*100, button_width, 80)
+                for button_rect, (host_ip, port), kind in self._host_buttons():
                     is_hovering = button_rect.collidepoint(mouse_pos)
-                    self._draw_button(screen, button_rect, f"{host_ip} に参加", is_hovering, is_join_button=True)
+                    if kind == DISCOVERY_KIND_SERVER:
+                        label = f"{host_ip} の対戦サーバー"
+                    elif kind == DISCOVERY_KIND_SPECTATE:
+                        label = f"{host_ip} の対局を観戦"
+                    else:
+                        label = f"{host_ip} に参加"
+                    self._draw_button(screen, button_rect, label, is_hovering, is_join_button=True)
 
     def _draw_button(self, screen, rect, text, is_hovering, is_join_button=False):
         """統一感のあるボタンを描画するヘルパー関数"""
@@ -1,14 +1,9 @@
 # scenes/scene_menu.py
 
 import pygame
-import threading
 import queue
-import os
 from .scene_base import BaseScene
-from .scene_lobby import LobbyScene
-from .scene_university_select import UniversitySelectScene
 from settings import *
-from network import Client, Server, broadcast_presence, listen_for_hosts
 
 class MenuScene(BaseScene):
     # ... (__init__は変更なし) ...
@@ -16,12 +11,7 @@ class MenuScene(BaseScene):
         super().__init__(game)
         # player_roleはここでリセットせず、reset_game_stateに任せる
         
-        try:
-            background_path = os.path.join(PROJECT_ROOT, 'images', 'wood_background.jpg')
-            self.background_image = pygame.image.load(background_path).convert()
-            self.background_image = pygame.transform.scale(self.background_image, (WIDTH + INFO_PANEL_WIDTH, HEIGHT))
-        except pygame.error:
-            self.background_image = None
+        self.background_image = self.game.assets.background()
         
         self.title_font = self.game.font_large
         self.button_font = self.game.font_game
@@ -31,8 +21,13 @@ class MenuScene(BaseScene):
 
     def process_input(self, events, pressed_keys):
         """ボタンのクリックを処理する"""
+        self.update_hover([self.game.local_play_button, self.game.host_button, self.game.join_button, self.game.cpu_button, self.game.replay_button])
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
+                # 起動を速くするため、ほかのシーンや通信まわりはボタンが押されたときに初めて読み込む
+                from .scene_lobby import LobbyScene
+                from .scene_university_select import UniversitySelectScene
+                from network import SharedData, Client, Server, broadcast_presence, listen_for_hosts
                 # ★★★ いずれかのボタンが押されたら、まずゲーム状態をリセットする ★★★
                 if self.game.local_play_button.collidepoint(event.pos):
                     self.game.reset_game_state() # ★リセット
@@ -43,19 +38,33 @@ class MenuScene(BaseScene):
                     self.game.reset_game_state() # ★リセット
                     self.game.game_mode = "online"
                     self.game.player_role = "player1"
+                    self.game.shared_data = SharedData()
                     self.game.q = queue.Queue()
                     self.game.client = Client(self.game.q)
-                    self.game.server = Server(self.game.q, self.game.client, self.game.shared_data, GAME_PORT)
-                    threading.Thread(target=broadcast_presence, args=(self.game.shared_data,), daemon=True).start()
+                    self.game.server = Server(self.game.q, self.game.client, self.game.shared_data, GAME_PORT, on_message=self.game.wake)
+                    broadcast_presence(self.game.shared_data)
                     self.switch_to_scene(LobbyScene(self.game))
 
                 elif self.game.join_button.collidepoint(event.pos):
                     self.game.reset_game_state() # ★リセット
                     self.game.game_mode = "online"
                     self.game.player_role = "player2"
-                    threading.Thread(target=listen_for_hosts, args=(self.game.shared_data,), daemon=True).start()
+                    self.game.shared_data = SharedData()
+                    listen_for_hosts(self.game.shared_data)
                     self.switch_to_scene(LobbyScene(self.game))
 
+                elif self.game.cpu_button.collidepoint(event.pos):
+                    self.game.reset_game_state() # ★リセット
+                    self.game.game_mode = "cpu"
+                    self.game.player_role = "player1"
+                    self.switch_to_scene(UniversitySelectScene(self.game))
+
+                elif self.game.replay_button.collidepoint(event.pos):
+                    from .scene_replay import ReplayScene
+                    self.game.reset_game_state() # ★リセット
+                    self.game.game_mode = "replay"
+                    self.switch_to_scene(ReplayScene(self.game))
+
     # ... (update, drawメソッドは変更なし) ...
     def update(self):
         pass
@@ -71,7 +80,9 @@ class MenuScene(BaseScene):
         buttons_to_draw = {
             "二人で対戦 (オフライン)": self.game.local_play_button,
             "オンライン対戦 (ホスト)": self.game.host_button,
-            "オンライン対戦 (参加)": self.game.join_button
+            "オンライン対戦 (参加)": self.game.join_button,
+            "CPUと対戦": self.game.cpu_button,
+            "棋譜を見る": self.game.replay_button
         }
         
         mouse_pos = pygame.mouse.get_pos()
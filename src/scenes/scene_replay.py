@@ -0,0 +1,114 @@
+# scenes/scene_replay.py
+
+import pygame
+from .scene_game import GameScene
+from settings import *
+from rules import Board
+from game_record import open_records, record_files
+
+class ReplayScene(GameScene):
+    """保存した棋譜を再生する画面。←→で1手ずつ進め・戻し、↑↓で対局を切り替え、
+    バーをクリックするとその手まで一気に飛ぶ（棋譜の途中の局面から進めるので、手数が多くても待たない）"""
+
+    def __init__(self, game):
+        """初期化処理"""
+        super().__init__(game)
+        # 同時に起動したゲームが別のファイルに書いた棋譜も並べる
+        self.data, self.records = [], []
+        for path in record_files(RECORDS_PATH):
+            data, records = open_records(path)
+            if data is not None:
+                self.data.append(data)
+                self.records.extend(records)
+        self.seek_bar = pygame.Rect(WIDTH + 30, HEIGHT - 150, INFO_PANEL_WIDTH - 60, 20)
+        self.record_index = len(self.records) - 1  # 新しい対局から見る
+        self.position = 0
+        self.playable = False
+        if self.records:
+            self._load_record()
+
+    @property
+    def record(self):
+        return self.records[self.record_index] if self.records else None
+
+    def _load_record(self):
+        """選んだ対局の盤面を作り、最後の局面を表示する"""
+        record = self.record
+        board = self.game.load_pieces_from_db(UNIVERSITY_DATA.get(record.p1_university, []), UNIVERSITY_DATA.get(record.p2_university, []))
+        # 駒の定義が変わって駒の数が合わない棋譜は再生できない
+        self.playable = board is not None and len(board.pieces) == record.piece_count
+        self.game.board = board if self.playable else Board()
+        self._seek(record.entry_count)
+
+    def _seek(self, index):
+        """index個目の記録まで進めた局面を表示する"""
+        record = self.record
+        self.position = max(0, min(index, record.entry_count))
+        if self.playable:
+            record.seek(self.game.board, self.position)
+        self.mark_dirty()
+
+    def process_input(self, events, pressed_keys):
+        """キー入力とクリックで再生位置・対局を変える"""
+        self.update_hover([self.ingame_menu_button])
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if self.ingame_menu_button.collidepoint(event.pos):
+                    self.switch_to_scene(self.game.go_to_menu())
+                    return
+                if self.record and self.seek_bar.inflate(0, 20).collidepoint(event.pos):
+                    fraction = (event.pos[0] - self.seek_bar.x) / self.seek_bar.width
+                    self._seek(round(fraction * self.record.entry_count))
+
+            if event.type == pygame.KEYDOWN and self.record:
+                if event.key == pygame.K_RIGHT: self._seek(self.position + 1)
+                elif event.key == pygame.K_LEFT: self._seek(self.position - 1)
+                elif event.key == pygame.K_HOME: self._seek(0)
+                elif event.key == pygame.K_END: self._seek(self.record.entry_count)
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    step = -1 if event.key == pygame.K_UP else 1
+                    self.record_index = (self.record_index + step) % len(self.records)
+                    self._load_record()
+
+    def update(self):
+        """状態更新（この画面では何もしない）"""
+        pass
+
+    def _draw_info_panel(self, screen, _hint):
+        """棋譜の情報と再生位置を描画する（再生中は終盤データベースのヒントを出さない）"""
+        panel_rect = pygame.Rect(WIDTH, 0, INFO_PANEL_WIDTH, HEIGHT)
+        panel_bg_surface = pygame.Surface(panel_rect.size, pygame.SRCALPHA)
+        panel_bg_surface.fill((0, 0, 0, 80))
+        screen.blit(panel_bg_surface, panel_rect.topleft)
+
+        info_panel_center_x = WIDTH + (INFO_PANEL_WIDTH / 2)
+        y_pos = 60
+        text_color = WHITE
+        record = self.record
+        if record is None:
+            self.game.draw_text("棋譜がありません", self.game.font_game, text_color, (info_panel_center_x, HEIGHT / 2))
+            self._draw_menu_button(screen)
+            return
+
+        board = self.game.board
+        self.game.draw_text(f"棋譜 {self.record_index + 1}/{len(self.records)}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        self.game.draw_text(f"P1: {record.p1_university}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 40
+        self.game.draw_text(f"P2: {record.p2_university}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        if self.playable:
+            self.game.draw_text(f"撃破数 {board.capture_count['player1']} - {board.capture_count['player2']}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 40
+            self.game.draw_text(f"ターン数: {board.turn_count}", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        else:
+            self.game.draw_text("再生できません", self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 100
+        result = (record.result or "結果不明").replace("player", "Player ")
+        self.game.draw_text(result, self.game.font_game, text_color, (info_panel_center_x, y_pos)); y_pos += 60
+        self.game.draw_text("←→ 1手  ↑↓ 対局", self.game.font_game, text_color, (info_panel_center_x, y_pos))
+
+        # 再生位置のバー
+        pygame.draw.rect(screen, (196, 164, 132), self.seek_bar, border_radius=8)
+        if record.entry_count:
+            filled = self.seek_bar.copy()
+            filled.width = round(self.seek_bar.width * self.position / record.entry_count)
+            pygame.draw.rect(screen, BLUE, filled, border_radius=8)
+        self.game.draw_text(f"{self.position} / {record.entry_count}", self.game.font_game, text_color, (info_panel_center_x, self.seek_bar.y - 25))
+
+        self._draw_menu_button(screen)
@@ -1,10 +1,11 @@
 # scenes/scene_university_select.py
 
 import pygame
-import os
+import random
 from .scene_base import BaseScene
 from .scene_game import GameScene
 from settings import *
+from protocol import Choice
 
 class UniversitySelectScene(BaseScene):
     """大学を選択する画面。オフライン・オンライン両対応。"""
@@ -13,12 +14,7 @@ class UniversitySelectScene(BaseScene):
         """初期化処理"""
         super().__init__(game)
         
-        try:
-            background_path = os.path.join(PROJECT_ROOT, 'images', 'wood_background.jpg')
-            self.background_image = pygame.image.load(background_path).convert()
-            self.background_image = pygame.transform.scale(self.background_image, (WIDTH + INFO_PANEL_WIDTH, HEIGHT))
-        except pygame.error:
-            self.background_image = None
+        self.background_image = self.game.assets.background()
 
         self.title_font = self.game.font_medium
         self.button_font = self.game.font_game
@@ -45,6 +41,7 @@ class UniversitySelectScene(BaseScene):
 
     def process_input(self, events, pressed_keys):
         """クリックイベントを処理して大学を選択、または戻る"""
+        self.update_hover([self.game.back_button] + list(self.buttons.values()))
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
                 # ★★★ 戻るボタンのクリック判定を先頭に追加 ★★★
@@ -58,6 +55,8 @@ class UniversitySelectScene(BaseScene):
                     if button_rect.collidepoint(event.pos):
                         if self.game.game_mode == "local":
                             self._handle_local_selection(uni_name)
+                        elif self.game.game_mode == "cpu":
+                            self._handle_cpu_selection(uni_name)
                         elif self.game.game_mode == "online":
                             self._handle_online_selection(uni_name)
                         return
@@ -72,19 +71,32 @@ class UniversitySelectScene(BaseScene):
             self.game.setup_game(self.p1_choice, self.p2_choice)
             self.switch_to_scene(GameScene(self.game))
 
+    def _handle_cpu_selection(self, uni_name):
+        """CPU対戦での選択処理（CPUの大学はランダムに決める）"""
+        self.p1_choice = uni_name
+        self.p2_choice = random.choice(list(UNIVERSITY_DATA))
+        self.game.setup_game(self.p1_choice, self.p2_choice)
+        self.switch_to_scene(GameScene(self.game))
+
     def _handle_online_selection(self, uni_name):
         """オンラインモードでの選択処理"""
         if not self.my_choice:
             self.my_choice = uni_name
-            self.game.client.send(f"CHOICE:{uni_name}")
+            self.game.client.send(Choice(uni_name))
 
     def update(self):
         """オンラインモードで相手の選択を待つ処理"""
         if self.game.game_mode == "online":
-            if self.game.q and not self.game.q.empty():
-                msg = self.game.q.get()
-                if msg.startswith("CHOICE:"):
-                    self.opponent_choice = msg.split(':')[1]
+            for msg in self.game.network_messages():
+                if isinstance(msg, Choice):
+                    self.opponent_choice = msg.university
+                    self.mark_dirty()
+                    # 続くメッセージ（相手の最初の手など）は対局画面で受け取る
+                    break
+                elif msg == "DISCONNECTED":
+                    print("対戦相手との通信が途切れました。")
+                    self.switch_to_scene(self.game.go_to_menu())
+                    return
             
             if self.my_choice and self.opponent_choice:
                 p1_uni = self.my_choice if self.game.player_role == "player1" else self.opponent_choice
@@ -114,6 +126,13 @@ class UniversitySelectScene(BaseScene):
                 is_hovering = button_rect.collidepoint(mouse_pos)
                 self._draw_button(screen, button_rect, uni_name, is_hovering, is_selected)
         
+        elif self.game.game_mode == "cpu":
+            self.game.draw_text("使用する大学を選択してください", self.title_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, 100))
+            self.game.draw_text("CPUの大学はランダムに決まります", self.info_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, 150))
+            for uni_name, button_rect in self.buttons.items():
+                is_hovering = button_rect.collidepoint(mouse_pos)
+                self._draw_button(screen, button_rect, uni_name, is_hovering, False)
+
         elif self.game.game_mode == "online":
             self.game.draw_text("使用する大学を選択してください", self.title_font, self.button_text_color, ((WIDTH + INFO_PANEL_WIDTH)/2, 100))
             if not self.opponent_choice:
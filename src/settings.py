@@ -7,6 +7,9 @@ from enum import Enum
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(SRC_DIR)
 DB_PATH = os.path.join(PROJECT_ROOT, 'pieces.db')
+FONT_CACHE_PATH = os.path.join(PROJECT_ROOT, '.cache', 'font_cache.json')
+RECORDS_PATH = os.path.join(PROJECT_ROOT, 'records', 'games.usr')  # 対局の棋譜（game_record.py の形式で追記していく）
+TABLEBASE_PATH = os.path.join(PROJECT_ROOT, '.cache', 'tablebase.bin')  # 終盤データベース（tablebase.py で作る）
 
 # --- 大学ごとの駒編成データ ---
 UNIVERSITY_DATA = {
@@ -25,11 +28,22 @@ HEIGHT = CELL_SIZE * ROWS
 MARGIN = 5
 INFO_PANEL_WIDTH = 300
 MAX_TURNS = 100
+FPS = 60
+IDLE_WAIT_MS = 250  # 画面に変化がないとき、イベントを待って眠る最大時間（ミリ秒）
+CPU_TIME_LIMIT = 1.0  # CPUが1手に使う時間（秒）
+CPU_USE_TABLEBASE = False  # CPUの探索で終盤データベース（tablebase.py で作る）を引くかどうか
+TEXT_CACHE_SIZE = 256  # 描画済みの文字列を保持する最大数
+RECORD_SNAPSHOT_INTERVAL = 16  # 棋譜に局面を挟む間隔（手数）。任意の手へ飛ぶときに進める手は最大でこの数-1
+
+# --- 駒の移動方向（move_listの並び順と対応）---
+DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+TEAMS = ("player1", "player2")
 # --- 色の定数 ---
 WHITE = (255, 255, 255)
 GRID_COLOR = (0, 0, 0)
 HIGHLIGHT_YELLOW = (230, 200, 100)
 HIGHLIGHT_GREEN = (170, 210, 170)
+HINT_ORANGE = (240, 140, 40)  # 終盤データベースの最善手の枠
 BLUE = (100, 100, 255)
 GRAY = (200, 200, 200)
 BLACK = (0, 0, 0)
@@ -37,7 +51,17 @@ BLACK = (0, 0, 0)
 # --- ネットワーク設定 ---
 DISCOVERY_PORT = 60000
 GAME_PORT = 60001
+MATCH_SERVER_PORT = 60002
 DISCOVERY_MESSAGE = "PYGAME_SHOGI_DISCOVERY_V1"
+# 探索メッセージ "DISCOVERY_MESSAGE:ポート:種類" の種類
+DISCOVERY_KIND_HOST = "host"      # 対戦相手を待っているプレイヤー
+DISCOVERY_KIND_SERVER = "server"  # 対戦サーバー（match_server.py）
+DISCOVERY_KIND_SPECTATE = "spectate"  # 観戦を受け付けている対局中のホスト
+# 観戦者への配信（局面の変化は1回のマルチキャスト送信で全員に届ける）
+SPECTATE_GROUP = "239.255.60.3"
+SPECTATE_PORT = 60003
+SPECTATE_REPEAT_INTERVAL = 1.0  # 最新の変化を送り直す間隔（取りこぼした観戦者のため）
+SPECTATE_RETRY_INTERVAL = 0.5   # 観戦者が参加・同期の依頼を送り直す間隔
 
 # --- ゲーム状態 ---
 class GameState(Enum):
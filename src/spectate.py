@@ -0,0 +1,156 @@
+# src/spectate.py
+# 対局の観戦。ホストは局面の変化を1回のマルチキャスト送信で観戦者全員に届け、
+# 参加したばかりの観戦者や取りこぼした観戦者には、頼まれたときだけ局面を丸ごと送る
+
+import random
+import socket
+import struct
+import time
+
+from settings import (SPECTATE_GROUP, SPECTATE_PORT, SPECTATE_REPEAT_INTERVAL, DISCOVERY_KIND_SPECTATE)
+from transport import MAX_PACKET_SIZE
+from network import broadcast_presence
+import protocol
+
+# マルチキャストの各パケットの先頭に付ける配信の番号（同じLANの別の対局の配信と区別する）
+STREAM_HEADER = struct.Struct("!I")
+
+
+class SpectatorHub:
+    """ホスト側。観戦の申し込みを受け付け、局面の変化をマルチキャストで流す。
+    publish() はゲームのスレッドから呼んでよい（送信は通信ループのスレッドで行うので、観戦者が増えても対局者の処理は待たない）"""
+
+    def __init__(self, shared_data, board, p1_university, p2_university):
+        self.loop = shared_data.loop
+        self.board = board
+        self.stream_id = random.getrandbits(32)
+        self.info = protocol.encode(protocol.MatchInfo(self.stream_id, p1_university, p2_university))
+        # 以下は通信ループのスレッドだけが触る
+        self.snapshot = protocol.encode(protocol.snapshot_of(board))
+        self.latest = None  # 最後に流したパケット（取りこぼした観戦者のために一定間隔で送り直す）
+        self.group = (SPECTATE_GROUP, SPECTATE_PORT)
+
+        self.multicast_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.multicast_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        self.multicast_sock.setblocking(False)
+        # 観戦の申し込み（Hello）と同期の依頼（SyncRequest）を受け付けるソケット
+        self.request_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.request_sock.bind(('0.0.0.0', 0))
+        self.port = self.request_sock.getsockname()[1]
+
+        self.loop.add_reader(self.request_sock, self._on_request)
+        self.loop.add_reader(self.multicast_sock, lambda _sock: None)  # stop() で閉じるために登録しておく
+        self.loop.call_at(time.monotonic() + SPECTATE_REPEAT_INTERVAL, self._repeat)
+        broadcast_presence(shared_data, self.port, DISCOVERY_KIND_SPECTATE, until_connected=False)
+
+    def publish(self, message):
+        """盤面の変化（MatchSync.on_update が渡す Move / Snapshot）や GameOver を観戦者に流す"""
+        data = STREAM_HEADER.pack(self.stream_id) + protocol.encode(message)
+        snapshot = protocol.encode(protocol.snapshot_of(self.board))
+        self.loop.call_soon(lambda: self._fan_out(data, snapshot))
+
+    def _fan_out(self, data, snapshot):
+        self.snapshot = snapshot
+        self.latest = data
+        self._send(self.multicast_sock, data, self.group)
+
+    def _repeat(self):
+        if self.latest is not None:
+            self._send(self.multicast_sock, self.latest, self.group)
+        return time.monotonic() + SPECTATE_REPEAT_INTERVAL
+
+    def _on_request(self, sock):
+        while True:
+            try:
+                data, addr = sock.recvfrom(MAX_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError, ConnectionResetError):
+                return
+            try:
+                message = protocol.decode(data)
+            except protocol.ProtocolError:
+                continue
+            if isinstance(message, protocol.Hello):
+                self._send(sock, self.info, addr)
+                self._send(sock, self.snapshot, addr)
+            elif isinstance(message, protocol.SyncRequest):
+                self._send(sock, self.snapshot, addr)
+
+    @staticmethod
+    def _send(sock, data, addr):
+        try:
+            sock.sendto(data, addr)
+        except OSError as e:
+            print(f"観戦者への送信エラー: {e}")
+
+
+class SpectatorClient:
+    """観戦者側。ホストのマルチキャストを受け取ってキューに入れる。
+    send() はホストへの申し込み・同期の依頼に使う（network.Client と同じ使い方）"""
+
+    def __init__(self, shared_data, q, target_address, on_message=None):
+        self.q = q
+        self.target_address = target_address
+        self.on_message = on_message
+        self.stream_id = None  # ホストから MatchInfo が届くまでは、マルチキャストを受け取らない
+        # マルチキャストを受け取るソケット（同じPCで複数の観戦者が受け取れるように、ポートを共有する）
+        self.multicast_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.multicast_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.multicast_sock.bind(('', SPECTATE_PORT))
+        membership = struct.pack("4s4s", socket.inet_aton(SPECTATE_GROUP), socket.inet_aton("0.0.0.0"))
+        self.multicast_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        # ホストとのやり取り用のソケット（共有したポートに返信すると、どの観戦者に届くか決まらないため分ける）
+        self.request_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.request_sock.bind(('0.0.0.0', 0))
+        shared_data.loop.add_reader(self.multicast_sock, self._on_multicast)
+        shared_data.loop.add_reader(self.request_sock, self._on_reply)
+
+    def send(self, message):
+        try:
+            self.request_sock.sendto(protocol.encode(message), self.target_address)
+        except OSError as e:
+            print(f"観戦の通信エラー: {e}")
+
+    def _on_reply(self, sock):
+        """ホストからの返信（MatchInfo と Snapshot）"""
+        messages = []
+        for data in self._receive_all(sock):
+            message = self._decode(data)
+            if isinstance(message, protocol.MatchInfo):
+                self.stream_id = message.stream_id
+            if message is not None:
+                messages.append(message)
+        self._deliver(messages)
+
+    def _on_multicast(self, sock):
+        """マルチキャストで流れてきた変化（同じLANで別の対局が配信されていることもあるので、配信の番号で見分ける）"""
+        messages = []
+        for data in self._receive_all(sock):
+            if self.stream_id is None or len(data) < STREAM_HEADER.size or STREAM_HEADER.unpack_from(data)[0] != self.stream_id:
+                continue
+            message = self._decode(data[STREAM_HEADER.size:])
+            if message is not None:
+                messages.append(message)
+        self._deliver(messages)
+
+    @staticmethod
+    def _receive_all(sock):
+        while True:
+            try:
+                data, _addr = sock.recvfrom(MAX_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError, ConnectionResetError):
+                return
+            yield data
+
+    @staticmethod
+    def _decode(data):
+        try:
+            return protocol.decode(data)
+        except protocol.ProtocolError as e:
+            print(f"受信したメッセージを解釈できません: {e}")
+            return None
+
+    def _deliver(self, messages):
+        for message in messages:
+            self.q.put(message)
+        if messages and self.on_message:
+            self.on_message()
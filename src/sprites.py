@@ -0,0 +1,24 @@
+# src/sprites.py
+
+import pygame
+
+# チーム（0: player1, 1: player2）ごとに駒画像へ上乗せする色
+TEAM_TINTS = ((50, 0, 0), (0, 0, 50))
+
+
+class SpriteCache:
+    """色付け・回転済みの駒画像を (文字, チーム, 向き) ごとに一度だけ作って使い回す"""
+
+    def __init__(self, piece_images):
+        """piece_images: {文字: 縮小済みの元画像}"""
+        self.sprites = {}
+        for name, image in piece_images.items():
+            for team, tint in enumerate(TEAM_TINTS):
+                tinted = image.copy()
+                tinted.fill(tint, special_flags=pygame.BLEND_RGB_ADD)
+                self.sprites[(name, team, False)] = tinted
+                self.sprites[(name, team, True)] = pygame.transform.rotate(tinted, 180)
+
+    def get(self, name, team, rotated):
+        """描画する駒画像を返す（teamは0/1、rotatedがTrueなら180度回転した画像）"""
+        return self.sprites[(name, team, rotated)]
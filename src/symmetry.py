@@ -0,0 +1,90 @@
+# src/symmetry.py
+# 盤の対称性で局面をまとめる。
+#   * 盤はトーラスなので、全ての駒を同じだけ平行移動しても駒の動きは変わらない（ROWS*COLS 通り）
+#   * player2 は向きが反転しているので、盤を180度回してチームを入れ替え、手番と撃破数も入れ替えると同じ局面になる
+# これらで移り合う局面は同じ結果になるので、1つの代表（標準形）にまとめて表やキャッシュの項目を共有できる。
+# 千日手の判定はルール上「同じ配置」が対象なので、ここでまとめたキーは使わない。
+
+from settings import ROWS, COLS
+from bitboard import NUM_SQUARES, square_of, pos_of, iter_bits
+from zobrist import piece_keys
+
+# SHIFT[a][b]: マスaが0番のマスに来るように盤を平行移動したときの、マスbの移動先
+SHIFT = [[square_of((rb - ra) % ROWS, (cb - ca) % COLS) for rb, cb in map(pos_of, range(NUM_SQUARES))]
+         for ra, ca in map(pos_of, range(NUM_SQUARES))]
+# UNSHIFT[a][b]: SHIFT[a] の逆（0番のマスをマスaに戻す平行移動）
+UNSHIFT = [[square_of((rb + ra) % ROWS, (cb + ca) % COLS) for rb, cb in map(pos_of, range(NUM_SQUARES))]
+           for ra, ca in map(pos_of, range(NUM_SQUARES))]
+# ROTATE[a]: 盤を180度回したときの、マスaの移動先（2回回すと元に戻る）
+ROTATE = [square_of(-r % ROWS, -c % COLS) for r, c in map(pos_of, range(NUM_SQUARES))]
+
+
+class Symmetry:
+    """元の局面から標準形への変換（チームを入れ替えるか、どのマスを原点に平行移動するか）"""
+
+    __slots__ = ("swapped", "origin")
+
+    def __init__(self, swapped, origin):
+        self.swapped = swapped
+        self.origin = origin
+
+    def apply(self, sq):
+        """元の局面のマスを、標準形でのマスにする"""
+        return SHIFT[self.origin][ROTATE[sq] if self.swapped else sq]
+
+    def invert(self, sq):
+        """標準形でのマスを、元の局面のマスに戻す"""
+        sq = UNSHIFT[self.origin][sq]
+        return ROTATE[sq] if self.swapped else sq
+
+
+def _canonicalize(pieces, side):
+    """標準形への変換を選び、(手番をplayer1にそろえた駒の並び, Symmetry, 標準形の Zobrist キー) を返す"""
+    swapped = side == 1
+    if swapped:
+        pieces = [(1 - team, letter, ROTATE[sq]) for team, letter, sq in pieces]
+    if not pieces:
+        return pieces, Symmetry(swapped, 0), 0
+
+    # 原点にする駒の候補は、最も数の少ない種類（チームと文字の組）の駒だけに絞る（種類ごとの数は平行移動で変わらない）
+    groups = {}
+    for team, letter, sq in pieces:
+        groups.setdefault((team, letter), []).append(sq)
+    _count, _kind, anchors = min((len(squares), kind, squares) for kind, squares in groups.items())
+
+    # 候補の中で、平行移動した局面の Zobrist キーが最も小さいものを代表にする（並べ替えて比べるより速い）
+    keys = [(piece_keys(letter, team), sq) for team, letter, sq in pieces]
+    best_key, best_origin = None, None
+    for origin in anchors:
+        shift = SHIFT[origin]
+        key = 0
+        for table, sq in keys:
+            key ^= table[shift[sq]]
+        if best_key is None or key < best_key:
+            best_key, best_origin = key, origin
+    return pieces, Symmetry(swapped, best_origin), best_key
+
+
+def canonical_form(pieces, side, captures):
+    """pieces は (チーム, 文字, マス) の並び、side は手番（0/1）、captures は両者の撃破数。
+    対称性で移り合う局面の中から1つの代表を選び、(駒の並び, 撃破数, Symmetry) を返す。
+    代表は必ず player1 の手番で、駒の並びは (チーム, 文字, マス) を小さい順に並べたタプル"""
+    pieces, symmetry, _key = _canonicalize(pieces, side)
+    shift = SHIFT[symmetry.origin]
+    form = tuple(sorted([(team, letter, shift[sq]) for team, letter, sq in pieces]))
+    return form, (captures[1], captures[0]) if side == 1 else (captures[0], captures[1]), symmetry
+
+
+def symmetric_key(pieces, side):
+    """対称性で移り合う局面どうしで同じ値になる64ビットのキー（標準形の Zobrist キー。手番は標準形でそろうので含めない）"""
+    return _canonicalize(pieces, side)[2]
+
+
+def position_pieces(position):
+    """bitboard.Position の駒を (チーム, 文字, マス) の並びにする"""
+    return [(team, position.letters[sq], sq) for team in (0, 1) for sq in iter_bits(position.occupancy[team])]
+
+
+def board_pieces(board):
+    """rules.Board の駒を (チーム, 文字, マス) の並びにする"""
+    return [(piece.team, piece.name, piece.sq) for _piece_id, piece in board.active_pieces()]
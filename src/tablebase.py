@@ -0,0 +1,389 @@
+# src/tablebase.py
+# 駒の少ない局面を後退解析で全て解いた表（終盤データベース）。作った表はメモリに対応付けて引くので、全体は読み込まない
+# 使い方: python tablebase.py --max-pieces 3   （途中で止めても、もう一度実行すると続きから作る）
+#
+# 局面は「駒の文字の組（player1, player2）」と「あと何枚取れば勝ちか（両者）」ごとの表に分ける。
+# 盤はトーラスで、平行移動しても駒の動きは変わらないので、先頭の駒が0番のマスに来るように平行移動した形で表す。
+# 表には player1 の手番の局面だけを置き、player2 の手番の局面は盤を180度回してチームを入れ替えた局面として引く（symmetry.py）。
+# 表の値は手番側から見た結果と、決着までの手数（1バイト）。千日手と手数制限は考えない（DRAW は「どちらも勝ちを強制できない」）。
+# 動かせる手がない側は負け（rules.Board.end_condition と同じ規則）。
+
+import argparse
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from collections import defaultdict
+
+from settings import DB_PATH, TABLEBASE_PATH, MAX_TURNS, TEAMS
+from rules import load_piece_definitions
+from bitboard import NUM_SQUARES, attack_table, parse_move_mask, iter_bits
+from symmetry import SHIFT, ROTATE, position_pieces, board_pieces
+
+TABLEBASE_MAGIC = b"USTB"
+TABLEBASE_VERSION = 2
+FILE_HEADER = struct.Struct("<4sBI")  # 識別子, 形式のバージョン, 索引（JSON）のバイト数
+
+# 表の値: 0 は引き分け、1〜127 は手番側の勝ち（その手数で決着）、128+n は手番側の負け（n手で決着）、255 は駒が重なった無効な局面
+DRAW = 0
+LOSS = 128
+INVALID = 255
+MAX_DISTANCE = 126
+WIN_CAPTURES = 3  # この枚数を取ると勝ち（Board.end_condition と同じ）
+
+
+def needed_captures(captures, enemy_pieces):
+    """勝つまでにあと何枚取ればよいか（相手の駒を全て取っても、相手は動けずに負けるので同じこと）"""
+    return min(WIN_CAPTURES - captures, enemy_pieces)
+
+
+def table_name(p1_letters, p2_letters, n1, n2):
+    return f"{p1_letters}_{p2_letters}_{n1}{n2}"
+
+
+def table_index(squares, side=0):
+    """表の中の位置。squares は表の駒の並び（player1の文字順、player2の文字順）でのマス番号。
+    side=1 は後退解析の途中で使う、player2 の手番の局面の位置（ファイルには残さない）"""
+    origin = SHIFT[squares[0]]
+    index = side
+    for sq in squares[1:]:
+        index = index * NUM_SQUARES + origin[sq]
+    return index
+
+
+def table_squares(index, count):
+    """table_index の逆（手番を除いた位置から、駒の並びでのマス番号を求める）"""
+    digits = []
+    for _ in range(count - 1):
+        index, sq = divmod(index, NUM_SQUARES)
+        digits.append(sq)
+    return [0] + digits[::-1]
+
+
+def swap_teams(squares, split):
+    """盤を180度回してチームを入れ替えた局面での駒の並び（元の player2 の駒が先に来る）。split は player1 の駒の数"""
+    return [ROTATE[sq] for sq in squares[split:]] + [ROTATE[sq] for sq in squares[:split]]
+
+
+def stored_entry(p1_letters, p2_letters, n1, n2, squares, side):
+    """局面を引く表と、表の中の位置を ((player1の文字, player2の文字, n1, n2), 位置) で返す"""
+    if side == 1:
+        squares = swap_teams(squares, len(p1_letters))
+        p1_letters, p2_letters, n1, n2 = p2_letters, p1_letters, n2, n1
+    return (p1_letters, p2_letters, n1, n2), table_index(squares)
+
+
+def decode(value):
+    """表の値を、手番側から見た ("win" / "loss" / "draw", 決着までの手数) にする（無効な局面はNone）"""
+    if value == INVALID:
+        return None
+    if value == DRAW:
+        return "draw", 0
+    if value >= LOSS:
+        return "loss", value - LOSS
+    return "win", value
+
+
+class Tablebase:
+    """作った表をメモリに対応付けて引く。1つの局面を引くのは、索引の辞書を1回と1バイトの読み出しだけ"""
+
+    def __init__(self, path=TABLEBASE_PATH):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_size = FILE_HEADER.unpack_from(self.data)
+        if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION:
+            raise ValueError(f"終盤データベースの形式が違います: {path}")
+        index = json.loads(self.data[FILE_HEADER.size:FILE_HEADER.size + index_size])
+        base = FILE_HEADER.size + index_size
+        self.max_pieces = index["max_pieces"]
+        self.tables = {}
+        for name, offset in index["tables"].items():
+            p1_letters, p2_letters, needed = name.split("_")
+            self.tables[(p1_letters, p2_letters, int(needed[0]), int(needed[1]))] = base + offset
+
+    def probe(self, pieces, side, captures):
+        """pieces は (チーム, 文字, マス) のリスト、side は手番（0/1）、captures は両者の撃破数。
+        表にある局面なら手番側から見た (結果, 手数) を、なければNoneを返す"""
+        if len(pieces) > self.max_pieces:
+            return None
+        pieces = sorted(pieces)
+        counts = [0, 0]
+        for team, _letter, _sq in pieces:
+            counts[team] += 1
+        if 0 in counts:
+            return None
+        n1, n2 = needed_captures(captures[0], counts[1]), needed_captures(captures[1], counts[0])
+        if n1 <= 0 or n2 <= 0:
+            return None
+        p1_letters = "".join(letter for team, letter, _sq in pieces if team == 0)
+        p2_letters = "".join(letter for team, letter, _sq in pieces if team == 1)
+        key, index = stored_entry(p1_letters, p2_letters, n1, n2, [sq for _team, _letter, sq in pieces], side)
+        offset = self.tables.get(key)
+        if offset is None:
+            return None
+        return decode(self.data[offset + index])
+
+    def probe_position(self, position):
+        """bitboard.Position の局面を引く"""
+        occupied = position.occupancy[0] | position.occupancy[1]
+        if occupied.bit_count() > self.max_pieces:
+            return None
+        return self.probe(position_pieces(position), position.side, position.captures)
+
+    def probe_board(self, board):
+        """rules.Board の局面を引く"""
+        pieces = board_pieces(board)
+        if len(pieces) > self.max_pieces:
+            return None
+        return self.probe(pieces, TEAMS.index(board.turn), [board.capture_count[team] for team in TEAMS])
+
+    def best_move(self, board):
+        """手番側の最善手を (駒のID, 移動先, 結果, 手数) で返す（表にない局面ならNone）。
+        勝ちなら最短で、負けなら最も長く粘る手を選ぶ。手数制限までに決着しない勝ちは引き分けとして扱う"""
+        if self.probe_board(board) is None:
+            return None
+        best, best_rank = None, None
+        for piece_id, target in board.legal_moves():
+            child = board.copy()
+            child.move_piece(piece_id, target)
+            if child.winner == board.turn:
+                result, distance = "win", 1
+            else:
+                hit = self.probe_board(child)
+                if hit is None:
+                    continue
+                child_result, child_distance = hit
+                result = {"win": "loss", "loss": "win", "draw": "draw"}[child_result]
+                distance = child_distance + 1 if result != "draw" else 0
+            if result != "draw" and board.turn_count + distance > MAX_TURNS:
+                result, distance = "draw", 0
+            rank = (0, distance) if result == "win" else (1, 0) if result == "draw" else (2, -distance)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = (piece_id, target, result, distance), rank
+        return best
+
+
+_loaded = {}
+
+
+def load_tablebase(path=TABLEBASE_PATH):
+    """終盤データベースを開く（プロセスごとに1回だけ）。まだ作っていなければNone"""
+    if path not in _loaded:
+        try:
+            _loaded[path] = Tablebase(path)
+        except (OSError, ValueError):
+            _loaded[path] = None
+    return _loaded[path]
+
+
+# --- 表の生成 ---
+
+_move_masks = None  # 文字 -> 動ける方向のビットマスク
+_parts_dir = None
+_lower_tables = {}  # 1つ少ない駒数の表（ワーカーごとに読み込んで使い回す）
+
+
+def _init_worker(db_path, parts_dir):
+    global _move_masks, _parts_dir
+    _move_masks = {name: parse_move_mask(move_str) for name, (move_str, _image_path) in load_piece_definitions(db_path).items()}
+    _parts_dir = parts_dir
+
+
+def _part_path(parts_dir, name):
+    return os.path.join(parts_dir, name + ".bin")
+
+
+def _lower_value(key, index):
+    """駒を1枚取ったあとの局面の値を、1つ少ない駒数の表から引く（stored_entry の結果を渡す）"""
+    table = _lower_tables.get(key)
+    if table is None:
+        with open(_part_path(_parts_dir, table_name(*key)), "rb") as f:
+            table = _lower_tables[key] = f.read()
+    return table[index]
+
+
+def solve_table(p1_letters, p2_letters, n1, n2):
+    """1つの表を後退解析で解き、値の bytearray を返す（前半が player1、後半が player2 の手番の局面）。
+    駒を取る手の先は1つ少ない駒数の表で引き、それ以外は決着した局面から1手ずつさかのぼって決めていく"""
+    letters = list(p1_letters) + list(p2_letters)
+    teams = [0] * len(p1_letters) + [1] * len(p2_letters)
+    count = len(letters)
+    forward = [attack_table(_move_masks[letter], team) for letter, team in zip(letters, teams)]
+    # 逆向きの動き（player2の表は向きが反転しているので、反対のチームの表がちょうど逆向きになる）
+    backward = [attack_table(_move_masks[letter], 1 - team) for letter, team in zip(letters, teams)]
+    needed = (n1, n2)
+    per_side = NUM_SQUARES ** (count - 1)
+    size = 2 * per_side
+
+    values = bytearray(size)
+    decided = bytearray(size)
+    remaining = [0] * size     # まだ結果がわからない手の数（相手の勝ちになる手を引いていく）
+    capture_max = [0] * size   # 相手の勝ちになる「取る手」の中で、決着までが最も長いもの
+    buckets = defaultdict(list)  # 決着までの手数 -> [(局面, 勝ちか)]
+
+    for index in range(size):
+        side, rest = divmod(index, per_side)
+        squares = table_squares(rest, count)
+        if len(set(squares)) < count:
+            values[index] = INVALID
+            decided[index] = 1
+            continue
+        masks = [0, 0]
+        for sq, team in zip(squares, teams):
+            masks[team] |= 1 << sq
+        moves = 0
+        opponent_wins = 0
+        best_win = None
+        longest = -1
+        for i in range(count):
+            if teams[i] != side:
+                continue
+            for target in iter_bits(forward[i][squares[i]] & ~masks[side]):
+                moves += 1
+                if not masks[1 - side] >> target & 1:
+                    continue
+                # 駒を取る手: 勝ちが決まるか、1つ少ない駒数の表で引く
+                if needed[side] == 1:
+                    best_win = 1
+                    continue
+                victim = squares.index(target)
+                child_squares = [target if j == i else sq for j, sq in enumerate(squares) if j != victim]
+                child_letters = [letters[j] for j in range(count) if j != victim]
+                child_teams = [teams[j] for j in range(count) if j != victim]
+                child_p1 = "".join(l for l, t in zip(child_letters, child_teams) if t == 0)
+                child_p2 = "".join(l for l, t in zip(child_letters, child_teams) if t == 1)
+                child_needed = list(needed)
+                child_needed[side] = min(needed[side] - 1, len(child_p2 if side == 0 else child_p1))
+                value = _lower_value(*stored_entry(child_p1, child_p2, *child_needed, child_squares, 1 - side))
+                if LOSS <= value < INVALID:
+                    distance = value - LOSS + 1
+                    best_win = distance if best_win is None else min(best_win, distance)
+                elif DRAW < value < LOSS:
+                    opponent_wins += 1
+                    longest = max(longest, value)
+        remaining[index] = moves - opponent_wins
+        capture_max[index] = longest
+        if best_win is not None:
+            buckets[best_win].append((index, True))
+        elif remaining[index] == 0:
+            buckets[longest + 1 if moves else 0].append((index, False))
+
+    distance = 0
+    while buckets and distance <= MAX_DISTANCE:
+        for index, is_win in buckets.pop(distance, ()):
+            if decided[index]:
+                continue
+            decided[index] = 1
+            values[index] = distance if is_win else LOSS + distance
+            # この局面に1手で来られる局面（直前に指した側の駒を1つ戻す）
+            side, rest = divmod(index, per_side)
+            squares = table_squares(rest, count)
+            occupied = 0
+            for sq in squares:
+                occupied |= 1 << sq
+            for i in range(count):
+                if teams[i] == side:
+                    continue
+                for origin in iter_bits(backward[i][squares[i]] & ~occupied):
+                    previous = squares[:]
+                    previous[i] = origin
+                    parent = table_index(previous, 1 - side)
+                    if decided[parent]:
+                        continue
+                    if not is_win:
+                        buckets[distance + 1].append((parent, True))
+                    else:
+                        remaining[parent] -= 1
+                        if remaining[parent] == 0:
+                            buckets[max(distance, capture_max[parent]) + 1].append((parent, False))
+        distance += 1
+    return values
+
+
+def _write_part(name, values):
+    # 書き終えてから名前を付けるので、途中で止めても壊れた表は残らない
+    path = _part_path(_parts_dir, name)
+    with open(path + ".tmp", "wb") as f:
+        f.write(values)
+    os.replace(path + ".tmp", path)
+
+
+def solve_material(task):
+    """駒の組の表を、あと何枚取れば勝ちかの組み合わせごとに解いて保存する（プロセスプールの1タスク）。
+    解いた表の player2 の手番の半分は、チームを入れ替えた駒の組の表としてそのまま保存する"""
+    p1_letters, p2_letters = task
+    count = len(p1_letters) + len(p2_letters)
+    for n1 in range(1, min(WIN_CAPTURES, len(p2_letters)) + 1):
+        for n2 in range(1, min(WIN_CAPTURES, len(p1_letters)) + 1):
+            name = table_name(p1_letters, p2_letters, n1, n2)
+            swapped_name = table_name(p2_letters, p1_letters, n2, n1)
+            if os.path.exists(_part_path(_parts_dir, name)) and os.path.exists(_part_path(_parts_dir, swapped_name)):
+                continue
+            values = solve_table(p1_letters, p2_letters, n1, n2)
+            per_side = len(values) // 2
+            if swapped_name != name:
+                swapped = bytearray(per_side)
+                for index in range(per_side):
+                    swapped[table_index(swap_teams(table_squares(index, count), len(p1_letters)))] = values[per_side + index]
+                _write_part(swapped_name, swapped)
+            _write_part(name, values[:per_side])
+    return task
+
+
+def materials(letters, piece_count):
+    """駒の数が piece_count の、全ての駒の組（両者1枚以上）。チームを入れ替えただけの組は一緒に解くので片方だけ返す"""
+    for p1_count in range(1, piece_count):
+        for p1 in itertools.combinations_with_replacement(letters, p1_count):
+            for p2 in itertools.combinations_with_replacement(letters, piece_count - p1_count):
+                if "".join(p1) <= "".join(p2):
+                    yield "".join(p1), "".join(p2)
+
+
+def generate(max_pieces, workers=None, path=TABLEBASE_PATH, db_path=DB_PATH):
+    """駒の少ない順に全ての表を作り、1つのファイルにまとめる。作り終えた表は飛ばすので、途中から再開できる"""
+    parts_dir = f"{path}.v{TABLEBASE_VERSION}.parts"  # 形式の違う古い表と混ざらないように分ける
+    os.makedirs(parts_dir, exist_ok=True)
+    letters = sorted(load_piece_definitions(db_path))
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(db_path, parts_dir)) as pool:
+        # 駒が1つ少ない表を引くので、駒数ごとに全て作り終えてから次へ進む
+        for piece_count in range(2, max_pieces + 1):
+            tasks = list(materials(letters, piece_count))
+            started = time.perf_counter()
+            for done, _task in enumerate(pool.imap_unordered(solve_material, tasks), 1):
+                if done % 100 == 0 or done == len(tasks):
+                    print(f"駒{piece_count}枚: {done}/{len(tasks)} 組 ({time.perf_counter() - started:.0f} 秒)")
+
+    names = sorted(name[:-4] for name in os.listdir(parts_dir) if name.endswith(".bin")
+                   and sum(len(part) for part in name.split("_")[:2]) <= max_pieces)
+    offsets, offset = {}, 0
+    for name in names:
+        offsets[name] = offset
+        offset += os.path.getsize(_part_path(parts_dir, name))
+    index = json.dumps({"max_pieces": max_pieces, "tables": offsets}).encode("utf-8")
+    with open(path + ".tmp", "wb") as out:
+        out.write(FILE_HEADER.pack(TABLEBASE_MAGIC, TABLEBASE_VERSION, len(index)))
+        out.write(index)
+        for name in names:
+            with open(_part_path(parts_dir, name), "rb") as f:
+                out.write(f.read())
+    os.replace(path + ".tmp", path)
+    return len(names), os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="駒の少ない局面を全て解いた終盤データベースを作る")
+    parser.add_argument("--max-pieces", type=int, default=3, help="盤上の駒の数の上限（4枚以上は時間と容量が大きく増える）")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPUのコア数）")
+    parser.add_argument("--output", default=TABLEBASE_PATH, help="書き出すファイル")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables, size = generate(args.max_pieces, args.workers, args.output)
+    print(f"{tables} 個の表 / {size / 1e6:.1f} MB / {time.perf_counter() - started:.0f} 秒 -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
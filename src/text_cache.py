@@ -0,0 +1,36 @@
+# src/text_cache.py
+
+from collections import OrderedDict
+
+from settings import TEXT_CACHE_SIZE
+
+
+class TextCache:
+    """描画済みの文字列のSurfaceを (文字列, フォント, 色) ごとに保持する（古いものから捨てるLRU方式）"""
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font, color):
+        """文字列のSurfaceを返す。初めての組み合わせのときだけfont.renderを呼ぶ"""
+        key = (text, font, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """キャッシュと集計をリセットする"""
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,15 @@
+# src/text_format.py
+# コマンドラインの道具（tournament.py、analyze_records.py など）で共有する、表の文字列の整形
+
+import unicodedata
+
+
+def display_width(text):
+    """全角文字を2桁として数えた、端末での表示幅"""
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def pad_text(text, width, align_right=True):
+    """表示幅がwidthになるよう空白で埋める（全角文字は2桁として数える）"""
+    padding = " " * max(width - display_width(text), 0)
+    return padding + text if align_right else text + padding
@@ -0,0 +1,154 @@
+# src/tournament.py
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from settings import UNIVERSITY_DATA, DB_PATH
+from rules import Board, load_piece_definitions
+from bitboard import Position, build_attack_tables
+from engine import Engine
+from text_format import pad_text
+
+RESULT_KEYS = ("player1", "player2", "Draw (Repetition)", "Draw (Turn Limit)")
+
+_piece_definitions = None
+_tables = None
+
+
+def _init_worker(db_path):
+    """ワーカーごとに一度だけ駒の定義と移動先の表を読み込む"""
+    global _piece_definitions, _tables
+    _piece_definitions = load_piece_definitions(db_path)
+    _tables = build_attack_tables(_piece_definitions)
+
+
+def initial_position(p1_university, p2_university):
+    """Game.setup_game と同じ初期配置のビットボード盤面を作る"""
+    board = Board.from_orders(UNIVERSITY_DATA[p1_university], UNIVERSITY_DATA[p2_university], _piece_definitions)
+    return Position.from_board(board, _tables)
+
+
+def play_game(position, policy, rng, engine=None, opening_plies=0):
+    """1局を最後まで指し、(結果, 手数) を返す"""
+    while True:
+        winner = position.winner()
+        if winner is not None:
+            return winner, position.turn_count
+        # 動かせる駒がない局面は position.winner() が手番側の負けとして返すので、ここでは必ず手がある
+        moves = position.generate_moves()
+        if policy == "random" or position.turn_count < opening_plies:
+            move = rng.choice(moves)
+        else:
+            move = engine.search(position).best_move
+        position.make_move(move)
+
+
+def run_batch(task):
+    """同じ組み合わせの対局をまとめて行い、集計結果を返す（プロセスプールの1タスク）"""
+    p1_university, p2_university, games, seed, policy, depth, movetime, opening_plies, use_tablebase = task
+    rng = random.Random(seed)
+    engine = Engine(time_limit=movetime, max_depth=depth, use_tablebase=use_tablebase) if policy == "engine" else None
+    counts = dict.fromkeys(RESULT_KEYS, 0)
+    total_turns = 0
+    for _ in range(games):
+        winner, turns = play_game(initial_position(p1_university, p2_university), policy, rng, engine, opening_plies)
+        counts[winner] += 1
+        total_turns += turns
+        if engine is not None:
+            engine.tt.clear()
+    return p1_university, p2_university, counts, total_turns
+
+
+def make_tasks(universities, games, batch_size, seed, policy, depth, movetime, opening_plies, use_tablebase=False):
+    """全ての組み合わせ（先手・後手の入れ替えを含む）の対局をタスクに分割する"""
+    tasks = []
+    for p1_university, p2_university in itertools.product(universities, repeat=2):
+        remaining = games
+        while remaining > 0:
+            n = min(batch_size, remaining)
+            tasks.append((p1_university, p2_university, n, seed + len(tasks), policy, depth, movetime, opening_plies, use_tablebase))
+            remaining -= n
+    return tasks
+
+
+def run_tournament(universities, games, policy="random", workers=None, batch_size=50, seed=0,
+                   depth=2, movetime=10.0, opening_plies=4, use_tablebase=False, db_path=DB_PATH):
+    """総当たりの自己対戦を行い、組み合わせごとの集計と全体のスループットを返す"""
+    tasks = make_tasks(universities, games, batch_size, seed, policy, depth, movetime, opening_plies, use_tablebase)
+    results = {}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        for p1_university, p2_university, counts, total_turns in pool.imap_unordered(run_batch, tasks):
+            entry = results.setdefault((p1_university, p2_university), {"games": 0, "turns": 0, "results": dict.fromkeys(RESULT_KEYS, 0)})
+            entry["games"] += sum(counts.values())
+            entry["turns"] += total_turns
+            for key, value in counts.items():
+                entry["results"][key] += value
+    elapsed = time.perf_counter() - start
+    total_games = sum(entry["games"] for entry in results.values())
+    return {
+        "policy": policy,
+        "tablebase": use_tablebase,
+        "workers": workers or os.cpu_count(),
+        "games": total_games,
+        "seconds": elapsed,
+        "games_per_second": total_games / elapsed if elapsed > 0 else 0.0,
+        "pairings": [
+            {
+                "player1": p1_university,
+                "player2": p2_university,
+                "games": entry["games"],
+                "player1_win_rate": entry["results"]["player1"] / entry["games"],
+                "player2_win_rate": entry["results"]["player2"] / entry["games"],
+                "repetition_draw_rate": entry["results"]["Draw (Repetition)"] / entry["games"],
+                "turn_limit_draw_rate": entry["results"]["Draw (Turn Limit)"] / entry["games"],
+                "average_turns": entry["turns"] / entry["games"],
+            }
+            for (p1_university, p2_university), entry in sorted(results.items())
+        ],
+    }
+
+
+def print_report(report):
+    """集計結果を表形式で出力する"""
+    headers = [("先手", 9, False), ("後手", 9, False), ("対局数", 7, True), ("先手勝率", 9, True), ("後手勝率", 9, True),
+               ("千日手", 8, True), ("手数制限", 9, True), ("平均手数", 9, True)]
+    print("".join(pad_text(text, width, right) for text, width, right in headers))
+    for row in report["pairings"]:
+        print(f"{row['player1']:<9}{row['player2']:<9}{row['games']:>7}"
+              f"{row['player1_win_rate']:>9.1%}{row['player2_win_rate']:>9.1%}"
+              f"{row['repetition_draw_rate']:>8.1%}{row['turn_limit_draw_rate']:>9.1%}{row['average_turns']:>9.1f}")
+    print(f"\n合計 {report['games']} 局 / {report['seconds']:.1f} 秒 "
+          f"({report['games_per_second']:.1f} 局/秒, {report['workers']} プロセス, 方策: {report['policy']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大学ごとの駒編成の強さを自己対戦で比較する")
+    parser.add_argument("--games", type=int, default=1000, help="組み合わせごとの対局数")
+    parser.add_argument("--policy", choices=("random", "engine"), default="random", help="指し手の選び方")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPUのコア数）")
+    parser.add_argument("--batch-size", type=int, default=50, help="1タスクあたりの対局数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--depth", type=int, default=2, help="engine方策の探索の深さ")
+    parser.add_argument("--movetime", type=float, default=10.0, help="engine方策の1手あたりの上限時間（秒）")
+    parser.add_argument("--opening-plies", type=int, default=4, help="engine方策で最初にランダムに指す手数")
+    parser.add_argument("--tablebase", action="store_true", help="engine方策の探索で終盤データベースを引く（tablebase.py で作っておく）")
+    parser.add_argument("--universities", nargs="+", default=list(UNIVERSITY_DATA), choices=list(UNIVERSITY_DATA))
+    parser.add_argument("--json", metavar="PATH", help="集計結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    report = run_tournament(args.universities, args.games, args.policy, args.workers, args.batch_size, args.seed,
+                            args.depth, args.movetime, args.opening_plies, args.tablebase)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# src/transport.py
+
+import socket
+import struct
+import threading
+import time
+
+# パケットの種類
+DATA = 1  # 番号付きのデータ（相手はACKを返す）
+ACK = 2   # DATAを受け取ったことの通知
+PING = 3  # 送るものがないときの生存確認（ACKは返さない）
+
+HEADER = struct.Struct("!BI")  # 種類, 番号
+MAX_PACKET_SIZE = 1200
+
+INITIAL_RTO = 0.2         # 最初の再送待ち時間（秒）
+MIN_RTO = 0.05
+MAX_RTO = 1.0
+HEARTBEAT_INTERVAL = 1.0  # この時間なにも送っていなければPINGを送る
+HEARTBEAT_TIMEOUT = 5.0   # この時間なにも届かなければ切断とみなす
+
+
+class ChannelStats:
+    """通信路ごとの集計（オーバーヘッドや再送回数の計測用）"""
+
+    __slots__ = ("packets_sent", "bytes_sent", "payload_bytes_sent", "retransmissions", "duplicates")
+
+    def __init__(self):
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.payload_bytes_sent = 0
+        self.retransmissions = 0
+        self.duplicates = 0
+
+
+class ReliableChannel:
+    """1つの相手との信頼性のある通信路。番号付け、ACKと再送、重複の除去、順序どおりの受け渡しを行う。
+    ソケットは持たず、送るべきパケットを返すだけなので、どんなループからでも使える"""
+
+    def __init__(self, now):
+        self.next_seq = 1
+        self.unacked = {}        # 番号 -> [パケット, 最初に送った時刻, 最後に送った時刻, 再送回数]
+        self.expected_seq = 1    # 次にアプリに渡す番号
+        self.out_of_order = {}   # 先に届いた番号 -> データ
+        self.last_received = now
+        self.last_sent = now
+        self.srtt = None
+        self.rto = INITIAL_RTO
+        self.stats = ChannelStats()
+
+    def send(self, payload, now):
+        """データを番号付きのパケットにして返す（届くまでpollが再送する）"""
+        packet = HEADER.pack(DATA, self.next_seq) + payload
+        self.unacked[self.next_seq] = [packet, now, now, 0]
+        self.next_seq += 1
+        self.stats.payload_bytes_sent += len(payload)
+        return self._sent(packet, now)
+
+    def receive(self, packet, now):
+        """届いたパケットを処理し、(アプリに渡すデータのリスト, 返信するパケットのリスト) を返す"""
+        if len(packet) < HEADER.size:
+            return [], []
+        kind, seq = HEADER.unpack_from(packet)
+        self.last_received = now
+        if kind == ACK:
+            entry = self.unacked.pop(seq, None)
+            if entry is not None and entry[3] == 0:
+                self._update_rtt(now - entry[1])
+            return [], []
+        if kind != DATA:
+            return [], []
+
+        replies = [self._sent(HEADER.pack(ACK, seq), now)]
+        if seq < self.expected_seq or seq in self.out_of_order:
+            self.stats.duplicates += 1
+            return [], replies
+        self.out_of_order[seq] = packet[HEADER.size:]
+        delivered = []
+        while self.expected_seq in self.out_of_order:
+            delivered.append(self.out_of_order.pop(self.expected_seq))
+            self.expected_seq += 1
+        return delivered, replies
+
+    def poll(self, now):
+        """再送の時刻になったパケットと、必要ならPINGを返す"""
+        packets = []
+        for entry in self.unacked.values():
+            if now - entry[2] >= self.rto * (2 ** min(entry[3], 4)):
+                entry[2] = now
+                entry[3] += 1
+                self.stats.retransmissions += 1
+                packets.append(self._sent(entry[0], now))
+        if not packets and now - self.last_sent >= HEARTBEAT_INTERVAL:
+            packets.append(self._sent(HEADER.pack(PING, 0), now))
+        return packets
+
+    def is_dead(self, now):
+        """相手から一定時間なにも届いていないか"""
+        return now - self.last_received > HEARTBEAT_TIMEOUT
+
+    def next_deadline(self):
+        """次にpollで何かをする必要がある時刻（再送・PING・切断判定のうち最も早いもの）"""
+        deadline = min(self.last_sent + HEARTBEAT_INTERVAL, self.last_received + HEARTBEAT_TIMEOUT)
+        for _packet, _first_sent, last_sent, retries in self.unacked.values():
+            deadline = min(deadline, last_sent + self.rto * (2 ** min(retries, 4)))
+        return deadline
+
+    def _sent(self, packet, now):
+        self.last_sent = now
+        self.stats.packets_sent += 1
+        self.stats.bytes_sent += len(packet)
+        return packet
+
+    def _update_rtt(self, sample):
+        """往復時間を平滑化し、再送待ち時間を決める（再送したパケットの応答は使わない）"""
+        self.srtt = sample if self.srtt is None else 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(max(self.srtt * 2, MIN_RTO), MAX_RTO)
+
+
+class ReliableEndpoint:
+    """1つのUDPソケットを使い回し、相手ごとにReliableChannelを持つ窓口。
+    受信と再送はrecv_once/tickを呼ぶループ（通信スレッド）が行い、sendはどのスレッドからでも呼べる"""
+
+    def __init__(self, port=0, host='0.0.0.0'):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def send(self, payload, addr):
+        """相手にデータを確実に届ける（届かなければ再送される）。最初の再送の時刻を返す"""
+        now = time.monotonic()
+        with self.lock:
+            channel = self._channel(addr)
+            packet = channel.send(payload, now)
+            resend_at = now + channel.rto
+        self._sendto(packet, addr)
+        return resend_at
+
+    def handle_datagram(self, packet, addr):
+        """受け取ったパケットを処理し、順序どおりに届いたデータのリストを返す"""
+        with self.lock:
+            delivered, replies = self._channel(addr).receive(packet, time.monotonic())
+        for reply in replies:
+            self._sendto(reply, addr)
+        return delivered
+
+    def tick(self):
+        """再送とPINGを送り、切断とみなした相手のアドレスのリストを返す"""
+        now = time.monotonic()
+        outgoing, dead = [], []
+        with self.lock:
+            for addr, channel in list(self.channels.items()):
+                if channel.is_dead(now):
+                    del self.channels[addr]
+                    dead.append(addr)
+                    continue
+                outgoing.extend((packet, addr) for packet in channel.poll(now))
+        for packet, addr in outgoing:
+            self._sendto(packet, addr)
+        return dead
+
+    def next_deadline(self):
+        """次にtickを呼ぶべき時刻。相手がいなければNone"""
+        with self.lock:
+            return min((channel.next_deadline() for channel in self.channels.values()), default=None)
+
+    def recv_ready(self):
+        """すでに届いているパケットを待たずに全て処理し、(データ, 送信元) のリストを返す"""
+        self.sock.setblocking(False)
+        received = []
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return received
+            except ConnectionResetError:
+                # Windowsでは、相手のポートが閉じているとICMPの通知がここに届く
+                continue
+            received.extend((payload, addr) for payload in self.handle_datagram(packet, addr))
+
+    def recv_once(self, timeout):
+        """パケットを1つ待って (データのリスト, 送信元) を返す。時間切れなら ([], None)"""
+        self.sock.settimeout(timeout)
+        try:
+            packet, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
+        except socket.timeout:
+            return [], None
+        return self.handle_datagram(packet, addr), addr
+
+    def forget(self, addr):
+        """相手の通信路を破棄する"""
+        with self.lock:
+            self.channels.pop(addr, None)
+
+    def close(self):
+        self.sock.close()
+
+    def _channel(self, addr):
+        channel = self.channels.get(addr)
+        if channel is None:
+            channel = self.channels[addr] = ReliableChannel(time.monotonic())
+        return channel
+
+    def _sendto(self, packet, addr):
+        try:
+            self.sock.sendto(packet, addr)
+        except OSError as e:
+            print(f"送信エラー: {e}")
@@ -0,0 +1,70 @@
+# src/zobrist.py
+
+import random
+
+from settings import ROWS, COLS
+
+NUM_SQUARES = ROWS * COLS
+KEY_BITS = 64
+
+# 手番がplayer2のときにXORする値（プロセスをまたいでも同じ値になるよう固定シードで生成）
+SIDE_KEY = random.Random("side").getrandbits(KEY_BITS)
+
+_piece_keys = {}
+
+
+def piece_keys(letter, team_index):
+    """駒の文字とチームごとの、マス番号で引く乱数表を返す"""
+    keys = _piece_keys.get((letter, team_index))
+    if keys is None:
+        rng = random.Random(f"{letter}:{team_index}")
+        keys = tuple(rng.getrandbits(KEY_BITS) for _ in range(NUM_SQUARES))
+        _piece_keys[(letter, team_index)] = keys
+    return keys
+
+
+def piece_key(letter, team_index, sq):
+    """(駒の文字, チーム, マス) に対応する乱数を返す"""
+    return piece_keys(letter, team_index)[sq]
+
+
+def compute_key(placements, side):
+    """(文字, チーム, マス) の並びと手番から、局面のキーを一から計算する"""
+    key = SIDE_KEY if side == 1 else 0
+    for letter, team_index, sq in placements:
+        key ^= piece_key(letter, team_index, sq)
+    return key
+
+
+class RepetitionTable:
+    """局面キーごとの出現回数を数える表（千日手の判定用）"""
+
+    __slots__ = ("counts",)
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else {}
+
+    def push(self, key):
+        """局面を1回記録し、その局面の出現回数を返す"""
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        return count
+
+    def pop(self, key):
+        """pushした記録を1回分取り消す（探索で手を戻すとき用）"""
+        count = self.counts[key] - 1
+        if count:
+            self.counts[key] = count
+        else:
+            del self.counts[key]
+
+    def count(self, key):
+        """局面の出現回数を返す"""
+        return self.counts.get(key, 0)
+
+    def copy(self):
+        """表を複製する"""
+        return RepetitionTable(dict(self.counts))
+
+    def __len__(self):
+        return len(self.counts)